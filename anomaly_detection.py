@@ -1,23 +1,52 @@
-import pandas as pd
+import argparse
+
 import plotly.express as px
 
-# -----------------------------
-# Load enhanced synthetic logs
-# -----------------------------
-df = pd.read_csv(
-    "C:/Users/lavan/OneDrive/Desktop/EcommerceProject/synthetic_logs_enhanced.csv",
-    parse_dates=['timestamp']
-)
+import render
+from log_codec import expand_logs
+from log_store import default_source, load_logs
+from rollup import load_rollup
 
-# -----------------------------
-# Filter only anomalies
-# -----------------------------
-anomalies = df[df['anomaly_type'] != 'normal']
+parser = argparse.ArgumentParser(description="Summary and timeline of labelled anomalies.")
+parser.add_argument('--rollup', metavar='DIR',
+                    help="read the rollup cube (rollup.py) instead of the raw log; points become per-minute cells")
+render.add_arguments(parser)
+args = parser.parse_args()
 
-# -----------------------------
-# Aggregate anomaly counts per type
-# -----------------------------
-anomaly_counts = anomalies.groupby('anomaly_type').size().reset_index(name='count')
+if args.rollup:
+    # -----------------------------
+    # Daily cells for the counts, per-minute cells for the timeline
+    # -----------------------------
+    days = load_rollup(args.rollup, '1d', dimensions=['anomaly_type'])
+    anomaly_counts = (days[days['anomaly_type'] != 'normal']
+                      .groupby('anomaly_type', observed=True)['events'].sum()
+                      .rename('count').reset_index())
+    cells = load_rollup(args.rollup, '1min', dimensions=['ip_address', 'device_type', 'anomaly_type'])
+    cells = cells[cells['anomaly_type'] != 'normal']
+    anomalies = expand_logs(cells.assign(
+        timestamp=cells['bucket'],
+        count=cells['events'],
+        response_time=cells['rt_sum'] / cells['rt_count'],  # mean over the cell
+    ))
+    hover = ['count', 'ip_address', 'device_type', 'response_time']
+else:
+    # -----------------------------
+    # Load enhanced synthetic logs
+    # -----------------------------
+    df = load_logs(
+        default_source("C:/Users/lavan/OneDrive/Desktop/EcommerceProject/synthetic_logs_enhanced.csv")
+    )
+
+    # -----------------------------
+    # Filter only anomalies
+    # -----------------------------
+    anomalies = df[df['anomaly_type'] != 'normal']
+
+    # -----------------------------
+    # Aggregate anomaly counts per type
+    # -----------------------------
+    anomaly_counts = anomalies.groupby('anomaly_type').size().reset_index(name='count')
+    hover = ['user_id', 'ip_address', 'device_type', 'response_time']
 
 # Normalize counts for intensity (for color scaling)
 anomaly_counts['intensity'] = (anomaly_counts['count'] - anomaly_counts['count'].min()) / \
@@ -48,7 +77,7 @@ fig_bar.update_layout(
     title_x=0.5
 )
 
-fig_bar.show()
+render.output(fig_bar, args, 'anomaly_summary')
 
 # -----------------------------
 # Scatter plot: Anomalies over time
@@ -56,14 +85,17 @@ fig_bar.show()
 # Optional: size points by response_time if numeric
 size_col = 'response_time' if 'response_time' in anomalies.columns else None
 
-fig_scatter = px.scatter(
+fig_scatter = render.scatter(
     anomalies,
     x='timestamp',
     y='anomaly_type',
+    value=size_col,
+    max_points=args.max_points,
+    method=args.downsample,
     color='anomaly_type',
     size=size_col,
     title='Anomalies Over Time',
-    hover_data=['user_id', 'ip_address', 'device_type', 'response_time']
+    hover_data=hover
 )
 
 fig_scatter.update_layout(
@@ -72,7 +104,7 @@ fig_scatter.update_layout(
     title_x=0.5
 )
 
-fig_scatter.show()
+render.output(fig_scatter, args, 'anomalies_over_time')
 
 # -----------------------------
 # Save anomaly summary for dashboard
@@ -0,0 +1,77 @@
+# benchmarks/bench_blocklist.py
+# Lookup and snapshot speed of the IP blocklist.
+#
+#   python benchmarks/bench_blocklist.py --bans 100000 1000000 --lookups 5000000
+#
+# Per blocklist size: random host bans plus /24 and /16 network bans, then
+# single-address is_blocked() calls (int and dotted string), column lookups
+# with blocked() on uint32 addresses, and a snapshot save / load round trip.
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from blocklist import Blocklist  # noqa: E402
+from log_codec import int_to_ip  # noqa: E402
+
+SCALAR_LOOKUPS = 200_000
+
+
+def make_blocklist(n, rng):
+    hosts = rng.integers(0, 2**32, n, dtype=np.uint64).astype(np.uint32)
+    bl = Blocklist().ban_ips(hosts, rng.uniform(3600, 86400, n))
+    nets = rng.integers(0, 2**24, n // 100, dtype=np.uint64) << np.uint64(8)
+    wide = rng.integers(0, 2**16, n // 1000, dtype=np.uint64) << np.uint64(16)
+    ranges = np.concatenate([np.stack([nets, nets + 255], 1), np.stack([wide, wide + 65535], 1)])
+    return bl.ban(ranges.astype(np.uint32), 86400), hosts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="IP blocklist lookup throughput and snapshot round trip.")
+    parser.add_argument('--bans', type=int, nargs='+', default=[100_000, 1_000_000])
+    parser.add_argument('--lookups', type=int, default=5_000_000)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'bans':>10} {'intervals':>10} {'is_blocked int µs':>18} {'str µs':>8} {'blocked() lookups/s':>20}"
+          f" {'hit %':>6} {'save s':>7} {'load s':>7} {'MB':>6}")
+    for n in args.bans:
+        bl, hosts = make_blocklist(n, rng)
+        # half the lookups hit banned hosts
+        ips = np.where(rng.random(args.lookups) < 0.5, rng.choice(hosts, args.lookups),
+                       rng.integers(0, 2**32, args.lookups, dtype=np.uint64).astype(np.uint32))
+        bl.blocked(ips[:1])  # build the merged view
+
+        scalar = ips[:SCALAR_LOOKUPS].tolist()
+        t0 = time.perf_counter()
+        for ip in scalar:
+            bl.is_blocked(ip)
+        per_int = (time.perf_counter() - t0) / len(scalar) * 1e6
+        strings = int_to_ip(ips[:SCALAR_LOOKUPS // 4]).tolist()
+        t0 = time.perf_counter()
+        for ip in strings:
+            bl.is_blocked(ip)
+        per_str = (time.perf_counter() - t0) / len(strings) * 1e6
+
+        t0 = time.perf_counter()
+        hit = bl.blocked(ips)
+        vec = time.perf_counter() - t0
+
+        path = os.path.join(tempfile.mkdtemp(prefix='bench_blocklist_'), 'blocklist.bin')
+        t0 = time.perf_counter()
+        bl.save(path)
+        save = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        Blocklist.load(path).blocked(ips[:1])
+        load = time.perf_counter() - t0
+        print(f'{len(bl):>10,} {len(bl._lo):>10,} {per_int:>18.2f} {per_str:>8.2f} {len(ips) / vec:>20,.0f}'
+              f" {hit.mean() * 100:>6.1f} {save:>7.3f} {load:>7.3f} {os.path.getsize(path) / 1e6:>6.1f}")
+        os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+# benchmarks/bench_compact_logs.py
+# Memory and groupby/merge time: string log frames vs log_codec compact frames.
+#
+#   python benchmarks/bench_compact_logs.py --rows 1000000
+#
+# Runs the grouping work of preprocess_logs.py, dashboard.py and
+# block_suspicious_ips.py on both representations and checks that the decoded
+# results match before printing timings.
+import argparse
+import os
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ip_scoring import ip_aggregates  # noqa: E402
+from log_codec import compact_logs, int_to_ip  # noqa: E402
+from simulate_logs import generate_logs  # noqa: E402
+from thresholds import per_minute_counts  # noqa: E402
+
+BLOCK_ROWS = 100_000
+
+
+def make_logs(rows):
+    parts = []
+    while sum(len(p) for p in parts) < rows:
+        parts.append(generate_logs(num_rows=BLOCK_ROWS))
+    logs = pd.concat(parts, ignore_index=True).head(rows)
+    # what pd.read_csv hands the scripts: plain object strings
+    for c in logs.columns:
+        if c not in ('timestamp', 'response_time'):
+            logs[c] = logs[c].astype(object)
+    return logs
+
+
+def preprocess_stage(logs):
+    df = logs.set_index('timestamp')
+    agg = df.resample('1Min').agg({'user_id': pd.Series.nunique, 'product_id': 'count'})
+    events = df.groupby([pd.Grouper(freq='1Min'), 'event_type'], observed=True).size().unstack(fill_value=0)
+    events.columns = events.columns.astype(str)
+    return agg.join(events)
+
+
+def dashboard_stage(logs):
+    return (per_minute_counts(logs, 'ip_address'),
+            per_minute_counts(logs[logs['login_status'] == 'failed'], 'ip_address'),
+            per_minute_counts(logs, 'product_id'))
+
+
+def ip_agg_stage(logs):
+    ip_agg = ip_aggregates(logs)
+    return logs[['ip_address']].merge(ip_agg, on='ip_address', how='left')
+
+
+def normalise(result):
+    """Decode ip/product keys so string and compact results compare equal."""
+    if isinstance(result, tuple):
+        return tuple(normalise(r) for r in result)
+    frame = result.reset_index() if isinstance(result, pd.Series) else result.reset_index(drop=False)
+    if 'ip_address' in frame.columns and frame['ip_address'].dtype.kind == 'u':
+        frame['ip_address'] = int_to_ip(frame['ip_address'])
+    for c in frame.columns:
+        if isinstance(frame[c].dtype, pd.CategoricalDtype):
+            frame[c] = frame[c].astype(object)
+    keys = [c for c in ('timestamp', 'ip_address', 'product_id') if c in frame.columns]
+    return frame.sort_values(keys, kind='mergesort').reset_index(drop=True) if keys else frame
+
+
+def timed(fn, logs):
+    t0 = time.perf_counter()
+    out = fn(logs)
+    return time.perf_counter() - t0, out
+
+
+def main():
+    parser = argparse.ArgumentParser(description="String vs compact log frame benchmark.")
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    logs = make_logs(args.rows)
+    t0 = time.perf_counter()
+    compact = compact_logs(logs)
+    encode = time.perf_counter() - t0
+
+    str_bytes = logs.memory_usage(deep=True).sum() / len(logs)
+    cmp_bytes = compact.memory_usage(deep=True).sum() / len(compact)
+    print(f'rows: {len(logs):,}   encode: {encode:.2f}s')
+    print(f'bytes/row: strings {str_bytes:.1f}   compact {cmp_bytes:.1f}   ({str_bytes / cmp_bytes:.1f}x smaller)')
+
+    print(f"{'stage':<16} {'strings s':>10} {'compact s':>10} {'speedup':>8}")
+    for name, fn in (('preprocess', preprocess_stage), ('dashboard', dashboard_stage), ('ip_agg+merge', ip_agg_stage)):
+        t_str, r_str = timed(fn, logs)
+        t_cmp, r_cmp = timed(fn, compact)
+        a, b = normalise(r_str), normalise(r_cmp)
+        for x, y in zip(a if isinstance(a, tuple) else (a,), b if isinstance(b, tuple) else (b,)):
+            pd.testing.assert_frame_equal(x, y, check_dtype=False, check_index_type=False,
+                                          check_column_type=False, check_categorical=False)
+        print(f'{name:<16} {t_str:>10.3f} {t_cmp:>10.3f} {t_str / t_cmp:>7.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+# benchmarks/bench_log_store.py
+# Cold-load time and peak RSS: CSV vs the partitioned Parquet log store.
+#
+#   python benchmarks/bench_log_store.py --rows 1000000
+#
+# Writes a synthetic log of --rows rows as CSV, converts it with log_store, then
+# times each load in a fresh interpreter for a full read and for a one-column /
+# one-day read. RSS is the peak growth over the interpreter after imports.
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from log_store import convert_csv  # noqa: E402
+from simulate_logs import generate_logs  # noqa: E402
+
+BLOCK_ROWS = 100_000
+START = datetime(2025, 1, 1)
+
+CHILD = """
+import json, sys, time
+sys.path.insert(0, {root!r})
+import pyarrow.dataset
+from log_store import load_logs
+
+def peak_kb():
+    # VmHWM starts fresh at exec; ru_maxrss can carry over the parent's peak
+    with open('/proc/self/status') as fh:
+        return next(int(line.split()[1]) for line in fh if line.startswith('VmHWM'))
+
+base = peak_kb()
+t0 = time.perf_counter()
+df = load_logs({source!r}, columns={columns!r}, start={start!r}, end={end!r})
+elapsed = time.perf_counter() - t0
+print(json.dumps({{'rows': len(df), 'seconds': elapsed,
+                   'rss_mb': (peak_kb() - base) / 1024}}))
+"""
+
+
+def write_csv(path, rows):
+    # every block covers the same week, so partitions grow with --rows
+    written = 0
+    while written < rows:
+        n = min(BLOCK_ROWS, rows - written)
+        # generate_logs adds a few hundred anomaly rows on top of num_rows
+        df = generate_logs(num_rows=n, start_time=START).head(n)
+        df.to_csv(path, mode='a', header=written == 0, index=False)
+        written += n
+
+
+def measure(source, columns=None, start=None, end=None):
+    code = CHILD.format(root=ROOT, source=source, columns=columns, start=start, end=end)
+    out = subprocess.run([sys.executable, '-c', code], check=True, capture_output=True, text=True)
+    return json.loads(out.stdout)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CSV vs columnar log store load benchmark.")
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--workdir', help="keep generated files here instead of a temp dir")
+    args = parser.parse_args()
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix='bench_log_store_')
+    os.makedirs(workdir, exist_ok=True)
+    csv_path = os.path.join(workdir, 'logs.csv')
+    store_dir = os.path.join(workdir, 'log_store')
+    if not os.path.exists(csv_path):
+        write_csv(csv_path, args.rows)
+    if not os.path.exists(store_dir):
+        t0 = time.perf_counter()
+        convert_csv(csv_path, store_dir)
+        print(f'convert: {time.perf_counter() - t0:.2f}s')
+
+    day = ('2025-01-03', '2025-01-04')
+    cases = [
+        ('full', {}),
+        ('product_id, 1 day', {'columns': ['product_id'], 'start': day[0], 'end': day[1]}),
+    ]
+    print(f"{'case':<20} {'source':<6} {'rows':>10} {'seconds':>9} {'RSS MB':>8}")
+    for name, kw in cases:
+        for label, source in (('csv', csv_path), ('store', store_dir)):
+            r = measure(source, **kw)
+            print(f"{name:<20} {label:<6} {r['rows']:>10,} {r['seconds']:>9.2f} {r['rss_mb']:>8.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+# benchmarks/bench_model_startup.py
+# Cold-start and steady-state latency of the model backends: Keras, the NumPy
+# export of the dense autoencoder, and a resident scoring worker.
+#
+#   python benchmarks/bench_model_startup.py --models models
+#   python benchmarks/bench_model_startup.py --demo      # random dense AE export, no TensorFlow needed
+#
+# Cold: a fresh interpreter imports what it needs, loads (or connects to) the
+# model and scores one batch; the time is measured from process start to
+# result. Warm: batches scored back to back by an already loaded model,
+# reported as p50 / p99 latency per batch. Keras rows are skipped when
+# TensorFlow or the .h5 files are not available.
+import argparse
+import importlib.util
+import json
+import os
+import secrets
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from ip_scoring import FEATURES, LSTM_FEATURES, SEQ_LEN  # noqa: E402
+from model_registry import (AUTHKEY_ENV, MODEL_FILES, WARM_BATCH, DenseNumpyModel,  # noqa: E402
+                            RemoteModel, load_model_file, numpy_export_path, wait_for_worker)
+
+INPUT_SHAPES = {'ae': (len(FEATURES),), 'lstm': (SEQ_LEN, len(LSTM_FEATURES))}
+
+COLD = """
+import sys, time, json
+t0 = time.perf_counter()
+sys.path.insert(0, {root!r})
+import numpy as np
+from model_registry import RemoteModel, load_model_file
+x = np.zeros({shape!r}, dtype=np.float32)
+if {address!r}:
+    model = RemoteModel({address!r}, {name!r})
+else:
+    model = load_model_file({path!r}, {backend!r})
+t1 = time.perf_counter()
+model.predict_on_batch(x)
+print(json.dumps({{'load': t1 - t0, 'first_batch': time.perf_counter() - t1}}))
+"""
+
+
+def cold(name, path, backend, address, batch):
+    code = COLD.format(root=ROOT, shape=(batch,) + INPUT_SHAPES[name], address=address,
+                       name=name, path=path, backend=backend)
+    t0 = time.perf_counter()
+    out = subprocess.run([sys.executable, '-c', code], check=True, capture_output=True, text=True)
+    wall = time.perf_counter() - t0
+    inner = json.loads(out.stdout.strip().splitlines()[-1])
+    return {'wall_s': wall, **{f'{k}_s': v for k, v in inner.items()}}
+
+
+def warm(model, name, batch, iters):
+    x = np.random.default_rng(0).random((batch,) + INPUT_SHAPES[name], dtype=np.float32)
+    model.predict_on_batch(x)
+    lat = []
+    for _ in range(iters):
+        t0 = time.perf_counter()
+        model.predict_on_batch(x)
+        lat.append(time.perf_counter() - t0)
+    lat = np.sort(lat)
+    return {'p50_ms': lat[len(lat) // 2] * 1000, 'p99_ms': lat[int(len(lat) * 0.99)] * 1000,
+            'rows_per_sec': batch / lat.mean()}
+
+
+def make_demo(models_dir):
+    rng = np.random.default_rng(0)
+    sizes = [len(FEATURES), 16, 8, 16, len(FEATURES)]
+    DenseNumpyModel([rng.normal(0, 0.5, (a, b)) for a, b in zip(sizes, sizes[1:])],
+                    [np.zeros(b) for b in sizes[1:]],
+                    ['relu', 'relu', 'relu', 'sigmoid']).save(
+        numpy_export_path(os.path.join(models_dir, MODEL_FILES['ae'])))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold vs warm model latency per backend.")
+    parser.add_argument('--models', default='models')
+    parser.add_argument('--demo', action='store_true', help="benchmark a random dense AE export instead")
+    parser.add_argument('--batch', type=int, default=WARM_BATCH)
+    parser.add_argument('--iters', type=int, default=200)
+    parser.add_argument('--listen', default=os.path.join(tempfile.gettempdir(), f'scoring-{os.getpid()}.sock'),
+                        help="address for the scoring worker started by the benchmark")
+    args = parser.parse_args()
+
+    models_dir = args.models
+    if args.demo:
+        models_dir = tempfile.mkdtemp(prefix='bench_models_')
+        make_demo(models_dir)
+    have_tf = importlib.util.find_spec('tensorflow') is not None
+
+    # (model, backend) pairs that can run here
+    cases = []
+    for name in MODEL_FILES:
+        path = os.path.join(models_dir, MODEL_FILES[name])
+        if have_tf and os.path.exists(path):
+            cases.append((name, path, 'keras'))
+        if os.path.exists(numpy_export_path(path)):
+            cases.append((name, path, 'auto'))
+    if not cases:
+        sys.exit(f"no models found in {models_dir} (use --demo without TensorFlow)")
+
+    served = sorted({name for name, _, _ in cases})
+    # one key for this run, inherited by the worker and the cold-start clients
+    os.environ.setdefault(AUTHKEY_ENV, secrets.token_hex(32))
+    t0 = time.perf_counter()
+    worker = subprocess.Popen([sys.executable, os.path.join(ROOT, 'model_registry.py'), '--models', models_dir,
+                               'serve', '--listen', args.listen, '--preload', *served])
+    try:
+        wait_for_worker(args.listen)
+        worker_start = time.perf_counter() - t0
+
+        print(f"scoring worker ready in {worker_start:.2f}s (models: {', '.join(served)})\n")
+        print(f"{'model':<6} {'backend':<8} {'cold wall s':>11} {'load s':>8} {'1st batch s':>11}"
+              f" {'warm p50 ms':>11} {'p99 ms':>8} {'rows/s':>12}")
+        rows = [(name, path, 'keras' if backend == 'keras' else 'numpy', backend, None) for name, path, backend in cases]
+        rows += [(name, None, 'worker', None, args.listen) for name in served]
+        for name, path, label, backend, address in rows:
+            c = cold(name, path, backend, address, args.batch)
+            model = RemoteModel(address, name) if address else load_model_file(path, backend)
+            w = warm(model, name, args.batch, args.iters)
+            print(f"{name:<6} {label:<8} {c['wall_s']:>11.3f} {c['load_s']:>8.3f} {c['first_batch_s']:>11.4f}"
+                  f" {w['p50_ms']:>11.3f} {w['p99_ms']:>8.3f} {w['rows_per_sec']:>12,.0f}")
+    finally:
+        worker.terminate()
+        worker.wait()
+        if os.path.exists(args.listen):
+            os.remove(args.listen)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+# benchmarks/bench_parallel.py
+# Scaling of the hash-sharded per-IP LSTM scoring and per-product spike counts
+# across 1..N worker processes.
+#
+#   python benchmarks/bench_parallel.py --ips 50000 --products 2000 --workers 1 2 4 8
+#   python benchmarks/bench_parallel.py --lstm-model models/lstm_ae_full.h5
+#
+# Without --lstm-model a NumPy recurrent stand-in with the same input/output
+# shapes is used, so the benchmark runs without TensorFlow. Every parallel
+# result is checked against the serial one before its time is reported.
+import argparse
+import functools
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ip_scoring import LSTM_FEATURES, sharded_lstm_scores  # noqa: E402
+from trending import sharded_spike_counts  # noqa: E402
+
+
+class StandInLSTM:
+    """Elman-style recurrent autoencoder forward pass with fixed random weights."""
+
+    def __init__(self, hidden=64, seed=0):
+        rng = np.random.default_rng(seed)
+        n = len(LSTM_FEATURES)
+        self.w_in = rng.normal(0, 0.3, (n, hidden)).astype(np.float32)
+        self.w_h = rng.normal(0, 0.3, (hidden, hidden)).astype(np.float32)
+        self.w_out = rng.normal(0, 0.3, (hidden, n)).astype(np.float32)
+
+    def predict(self, x, batch_size=None, verbose=0):
+        h = np.zeros((x.shape[0], self.w_h.shape[0]), dtype=np.float32)
+        out = np.empty_like(x, dtype=np.float32)
+        for t in range(x.shape[1]):
+            h = np.tanh(x[:, t] @ self.w_in + h @ self.w_h)
+            out[:, t] = h @ self.w_out
+        return out
+
+
+def make_per_minute(n_ips, max_minutes=60, seed=0):
+    rng = np.random.default_rng(seed)
+    lens = rng.integers(1, max_minutes, n_ips)
+    ips = np.repeat(rng.choice(2**32 - 1, n_ips, replace=False).astype(np.uint32), lens)
+    start = pd.Timestamp('2025-01-01')
+    minutes = np.concatenate([np.sort(rng.choice(7 * 24 * 60, n, replace=False)) for n in lens])
+    return pd.DataFrame({
+        'ip_address': ips,
+        'minute': start + pd.to_timedelta(minutes, unit='min'),
+        'reqs': rng.integers(1, 20, len(ips)),
+        'failed_logins': rng.integers(0, 3, len(ips)),
+        'mean_rt': rng.random(len(ips)) * 2,
+    })
+
+
+def make_product_counts(n_products, n_minutes, seed=0):
+    rng = np.random.default_rng(seed)
+    counts = rng.poisson(0.3, (n_minutes, n_products))
+    spikes = rng.random((n_minutes, n_products)) < 0.001
+    counts[spikes] += rng.integers(5, 20, spikes.sum())
+    dense = pd.DataFrame(counts, columns=[f'P{i:06d}' for i in range(n_products)],
+                         index=pd.date_range('2025-01-01', periods=n_minutes, freq='1Min'))
+    # sparse (minute, product) counts, as trending.bucket_counts() returns them
+    sparse = dense.stack()
+    return sparse[sparse > 0]
+
+
+def timed(fn, *args):
+    t0 = time.perf_counter()
+    out = fn(*args)
+    return time.perf_counter() - t0, out
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parallel per-IP / per-product scaling benchmark.")
+    parser.add_argument('--ips', type=int, default=50_000)
+    parser.add_argument('--products', type=int, default=2_000)
+    parser.add_argument('--minutes', type=int, default=7 * 24 * 60)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, os.cpu_count() or 1])
+    parser.add_argument('--lstm-model', help="Keras LSTM autoencoder to load in each worker")
+    args = parser.parse_args()
+
+    if args.lstm_model:
+        from tensorflow.keras.models import load_model
+        load_lstm = functools.partial(load_model, args.lstm_model)
+    else:
+        load_lstm = StandInLSTM
+
+    per_min = make_per_minute(args.ips)
+    product_counts = make_product_counts(args.products, args.minutes)
+    print(f'per-IP: {args.ips:,} IPs / {len(per_min):,} IP-minutes   '
+          f'per-product: {args.products:,} products x {args.minutes:,} minutes   cpus: {os.cpu_count()}')
+
+    print(f"{'workers':>7} {'lstm s':>9} {'speedup':>8} {'spikes s':>9} {'speedup':>8}")
+    base = None
+    for w in sorted(set(args.workers)):
+        t_lstm, lstm = timed(sharded_lstm_scores, per_min, load_lstm, w)
+        t_spk, spikes = timed(sharded_spike_counts, product_counts, args.minutes, w)
+        if base is None:
+            base = (t_lstm, t_spk, lstm, spikes)
+        else:
+            pd.testing.assert_frame_equal(lstm, base[2])
+            pd.testing.assert_series_equal(spikes, base[3])
+        print(f'{w:>7} {t_lstm:>9.2f} {base[0] / t_lstm:>7.1f}x {t_spk:>9.2f} {base[1] / t_spk:>7.1f}x')
+
+
+if __name__ == '__main__':
+    main()
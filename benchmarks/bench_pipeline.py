@@ -0,0 +1,311 @@
+# benchmarks/bench_pipeline.py
+# Wall time, peak RSS and rows/sec for every pipeline stage at several log sizes.
+#
+#   python benchmarks/bench_pipeline.py                                  # 10k / 1M / 10M rows
+#   python benchmarks/bench_pipeline.py --rows 10000 1000000 --out results.json
+#   python benchmarks/bench_pipeline.py --save-baseline                  # refresh benchmarks/baseline.json
+#   python benchmarks/bench_pipeline.py --rows 1000000 --profile prof/   # one .prof per stage
+#
+# For each size a seeded synthetic log is written with simulate_logs, then each
+# script's stages run in a fresh interpreter (one per script and size) so that
+# peak RSS is not inherited from earlier runs. The peak is reset between stages
+# (/proc/self/clear_refs), so every stage reports its own high-water mark.
+#
+# Results go to --out as JSON and are compared against --baseline: a stage is
+# flagged when its time or peak RSS grows by more than --tolerance, and the
+# exit status is 1 if anything regressed or a stage failed (crashed, ran out
+# of memory). Baselines are machine-specific;
+# refresh them with --save-baseline on the machine that runs the comparison.
+#
+# block_suspicious_ips runs with NumPy stand-ins for the Keras models unless
+# --models points at a models directory (see model_registry.py; NumPy exports
+# are used where present).
+import argparse
+import cProfile
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from bench_parallel import StandInLSTM  # noqa: E402
+from ip_scoring import (FEATURES, ae_scores, attach_signals, combine_scores, ip_aggregates,  # noqa: E402
+                        lstm_frame, per_minute_features, report_by_ip)
+from log_codec import load_compact_logs  # noqa: E402
+from log_store import load_logs  # noqa: E402
+from model_registry import ModelRegistry  # noqa: E402
+
+SIZES = [10_000, 1_000_000, 10_000_000]
+SCRIPTS = ['simulate_logs', 'preprocess_logs', 'dashboard', 'block_suspicious_ips', 'trending_recommendation']
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+TOLERANCE = 0.25
+# differences below these are noise, whatever the ratio
+MIN_SECONDS = 0.05
+MIN_RSS_MB = 16
+SEED = 11
+START = '2025-01-01'
+
+
+# -----------------------------
+# Measurement
+# -----------------------------
+def _status_kb(field):
+    with open('/proc/self/status') as fh:
+        return next(int(line.split()[1]) for line in fh if line.startswith(field))
+
+
+def _reset_peak():
+    try:
+        with open('/proc/self/clear_refs', 'w') as fh:
+            fh.write('5')
+    except OSError:
+        pass  # peak then covers everything since the interpreter started
+
+
+class StageRecorder:
+    def __init__(self, rows, profile_dir=None):
+        self.rows = rows
+        self.profile_dir = profile_dir
+        self.records = []
+
+    @contextmanager
+    def stage(self, name):
+        _reset_peak()
+        before = _status_kb('VmRSS')
+        profiler = cProfile.Profile() if self.profile_dir else None
+        t0 = time.perf_counter()
+        if profiler:
+            profiler.enable()
+        yield
+        if profiler:
+            profiler.disable()
+        elapsed = time.perf_counter() - t0
+        peak = _status_kb('VmHWM')
+        if profiler:
+            profiler.dump_stats(os.path.join(self.profile_dir, f'{name}-{self.rows}.prof'))
+        self.records.append({
+            'stage': name,
+            'rows': self.rows,
+            'seconds': round(elapsed, 4),
+            'rows_per_sec': round(self.rows / elapsed, 1) if elapsed > 0 else None,
+            'peak_rss_mb': round(peak / 1024, 1),
+            'rss_growth_mb': round((peak - before) / 1024, 1),
+        })
+
+
+# -----------------------------
+# Stages (one function per script)
+# -----------------------------
+class StandInAE:
+    """Dense 5-3-5 autoencoder forward pass with fixed random weights."""
+
+    def __init__(self, seed=0):
+        rng = np.random.default_rng(seed)
+        self.w1 = rng.normal(0, 0.5, (len(FEATURES), 3))
+        self.w2 = rng.normal(0, 0.5, (3, len(FEATURES)))
+
+    def predict(self, x, batch_size=None, verbose=0):
+        return np.maximum(x @ self.w1, 0) @ self.w2
+
+
+def load_models(models_dir):
+    """(scaler, autoencoder, lstm_ae); the stand-in scaler is None and fitted on the data later."""
+    if models_dir:
+        # loaded up front so model loading is not charged to the stages
+        registry = ModelRegistry(models_dir)
+        return registry.scaler.get(), registry.model('ae').get(), registry.model('lstm').get()
+    return None, StandInAE(), StandInLSTM()
+
+
+def run_simulate(rec, data, args):
+    from simulate_logs import write_shards
+    with rec.stage('simulate_logs.generate'):
+        write_shards(data, rec.rows, seed=SEED, start=START)
+
+
+def run_preprocess(rec, data, args):
+    from sklearn.preprocessing import MinMaxScaler
+    from preprocess_logs import LOG_COLUMNS, minute_features
+    with rec.stage('preprocess_logs.load'):
+        df = load_compact_logs(data, columns=LOG_COLUMNS)
+    with rec.stage('preprocess_logs.resample'):
+        agg_df = minute_features(df.set_index('timestamp'))
+        MinMaxScaler().fit_transform(agg_df)
+
+
+def run_dashboard(rec, data, args):
+    from dashboard import detect_anomalies
+    with rec.stage('dashboard.load'):
+        logs = load_compact_logs(data)
+    with rec.stage('dashboard.detect'):
+        detect_anomalies(logs)
+
+
+def run_block_suspicious_ips(rec, data, args):
+    with rec.stage('block_suspicious_ips.load'):
+        logs = load_compact_logs(data)
+    scaler, autoencoder, lstm_ae = load_models(args.models)
+    with rec.stage('block_suspicious_ips.features'):
+        ip_agg = ip_aggregates(logs)
+        per_min = per_minute_features(logs)
+    with rec.stage('block_suspicious_ips.lstm'):
+        lstm_df = lstm_frame(per_min, lstm_ae)
+    with rec.stage('block_suspicious_ips.merge'):
+        logs = attach_signals(logs, ip_agg, lstm_df)
+    if scaler is None:
+        from sklearn.preprocessing import MinMaxScaler
+        scaler = MinMaxScaler().fit(logs[FEATURES].fillna(0).values)
+    with rec.stage('block_suspicious_ips.ae'):
+        ae_mse = ae_scores(logs, scaler, autoencoder)
+    with rec.stage('block_suspicious_ips.classify'):
+        logs = combine_scores(logs, ae_mse)
+    with rec.stage('block_suspicious_ips.report'):
+        report_by_ip(logs)
+
+
+def run_trending(rec, data, args):
+    from trending import product_spikes, top_k
+    with rec.stage('trending_recommendation.load'):
+        logs = load_logs(data, columns=['product_id'])
+    with rec.stage('trending_recommendation.spikes'):
+        top_k(product_spikes(logs), 20)
+
+
+RUNNERS = {
+    'simulate_logs': run_simulate,
+    'preprocess_logs': run_preprocess,
+    'dashboard': run_dashboard,
+    'block_suspicious_ips': run_block_suspicious_ips,
+    'trending_recommendation': run_trending,
+}
+
+
+def child(args):
+    rec = StageRecorder(args.child_rows, args.profile)
+    RUNNERS[args.child](rec, args.child_data, args)
+    print(json.dumps(rec.records))
+
+
+# -----------------------------
+# Driver
+# -----------------------------
+def run_script(script, rows, data, args):
+    cmd = [sys.executable, os.path.abspath(__file__), '--child', script,
+           '--child-rows', str(rows), '--child-data', data]
+    if args.models:
+        cmd += ['--models', args.models]
+    if args.profile:
+        cmd += ['--profile', args.profile]
+    out = subprocess.run(cmd, capture_output=True, text=True)
+    if out.returncode != 0:
+        print(f'  {script} failed at {rows:,} rows (exit {out.returncode}): '
+              f'{out.stderr.strip().splitlines()[-1:] or ""}', file=sys.stderr)
+        return [{'stage': script, 'rows': rows, 'error': f'exit {out.returncode}'}]
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def compare(results, baseline, tolerance):
+    """Print every stage against the baseline; returns the regressed and failed records."""
+    base = {(r['stage'], r['rows']): r for r in baseline.get('results', [])}
+    regressions = []
+    print(f"\n{'stage':<40} {'rows':>10} {'seconds':>9} {'rows/s':>12} {'peak MB':>8}  vs baseline")
+    for r in results:
+        if 'error' in r:
+            print(f"{r['stage']:<40} {r['rows']:>10,} {r['error']}  FAILED")
+            regressions.append(r)
+            continue
+        b = base.get((r['stage'], r['rows']))
+        note = ''
+        if b and 'error' not in b:
+            dt = r['seconds'] / b['seconds'] - 1 if b['seconds'] else 0
+            dm = r['peak_rss_mb'] / b['peak_rss_mb'] - 1 if b['peak_rss_mb'] else 0
+            slower = dt > tolerance and r['seconds'] - b['seconds'] > MIN_SECONDS
+            bigger = dm > tolerance and r['peak_rss_mb'] - b['peak_rss_mb'] > MIN_RSS_MB
+            note = f'time {dt:+.0%}  rss {dm:+.0%}'
+            if slower or bigger:
+                note += '  REGRESSION'
+                regressions.append(r)
+        print(f"{r['stage']:<40} {r['rows']:>10,} {r['seconds']:>9.3f} {r['rows_per_sec'] or 0:>12,.0f} "
+              f"{r['peak_rss_mb']:>8.1f}  {note}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-stage wall time / peak RSS / throughput benchmark.")
+    parser.add_argument('--rows', type=int, nargs='+', default=SIZES)
+    parser.add_argument('--scripts', nargs='+', choices=SCRIPTS, default=SCRIPTS)
+    parser.add_argument('--out', default='bench_pipeline_results.json', help="results file (JSON)")
+    parser.add_argument('--baseline', default=BASELINE, help="results file to compare against")
+    parser.add_argument('--save-baseline', action='store_true', help="write the results to --baseline as well")
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE,
+                        help="relative growth in time or peak RSS flagged as a regression")
+    parser.add_argument('--models', help="directory with the real scaler / autoencoder / LSTM models")
+    parser.add_argument('--profile', help="directory to write one cProfile .prof file per stage into")
+    parser.add_argument('--workdir', help="keep the generated logs here instead of a temp dir")
+    parser.add_argument('--child', choices=SCRIPTS, help=argparse.SUPPRESS)
+    parser.add_argument('--child-rows', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--child-data', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        return child(args)
+    if args.profile:
+        os.makedirs(args.profile, exist_ok=True)
+        args.profile = os.path.abspath(args.profile)
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix='bench_pipeline_')
+    os.makedirs(workdir, exist_ok=True)
+    results = []
+    for rows in args.rows:
+        data = os.path.join(workdir, f'logs_{rows}.csv')
+        scripts = args.scripts
+        if not os.path.exists(data) and 'simulate_logs' not in scripts:
+            scripts = ['simulate_logs'] + scripts
+        for script in scripts:
+            print(f'{script} @ {rows:,} rows ...', file=sys.stderr)
+            results += run_script(script, rows, data, args)
+        if not args.workdir:
+            os.remove(data)
+
+    report = {
+        'meta': {
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'numpy': np.__version__,
+            'machine': platform.machine(),
+            'cpus': os.cpu_count(),
+            'models': args.models or 'stand-in',
+        },
+        'results': results,
+    }
+    with open(args.out, 'w') as fh:
+        json.dump(report, fh, indent=2)
+    baseline = {}
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline) as fh:
+            baseline = json.load(fh)
+    regressions = compare(results, baseline, args.tolerance)
+    if args.save_baseline:
+        with open(args.baseline, 'w') as fh:
+            json.dump(report, fh, indent=2)
+        print(f'\nbaseline written to {args.baseline}')
+    print(f'results written to {args.out}')
+    if regressions:
+        failed = sum('error' in r for r in regressions)
+        print(f'{len(regressions) - failed} stage(s) regressed by more than {args.tolerance:.0%}, '
+              f'{failed} failed', file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+# benchmarks/bench_sketches.py
+# Accuracy, speed and memory of the sketch paths against the exact ones.
+#
+#   python benchmarks/bench_sketches.py --rows 2000000 --ips 1000000 --minutes 1440
+#   python benchmarks/bench_sketches.py --source data/simulated_logs.csv
+#
+# Three comparisons on the same log (synthetic unless --source is given):
+#   distinct users per minute   resample().nunique() vs sketches.distinct_per_bucket()
+#   per-IP request counts       value_counts() vs conservative Count-Min + SpaceSaving
+#                               (log_stream.SketchIPAggregator's setup)
+#   per-(minute, IP) DDoS flags per_minute_counts() + mean + 2 std vs dashboard.sketch_minute_counts()
+# The synthetic log has --ips spoofed one-off addresses plus a few heavy
+# talkers that burst in some minutes, which is where exact per-IP tables grow.
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from dashboard import sketch_minute_counts  # noqa: E402
+from log_codec import load_compact_logs  # noqa: E402
+from log_stream import CHUNK_ROWS, IP_DELTA, IP_EPSILON  # noqa: E402
+from sketches import TOP_K, WINDOW_TOP_K, CountMinSketch, SpaceSaving, distinct_per_bucket, hash64  # noqa: E402
+from thresholds import SIGMAS, mean_plus_sigmas, per_minute_counts  # noqa: E402
+
+HEAVY_IPS = 20
+
+
+def make_logs(rows, ips, users, minutes, seed=0):
+    rng = np.random.default_rng(seed)
+    heavy = rng.integers(0, 2**32, HEAVY_IPS, dtype=np.uint64).astype(np.uint32)
+    n_heavy = rows // 10
+    spoofed = rng.integers(0, 2**32, ips, dtype=np.uint64).astype(np.uint32)
+    background = rng.choice(spoofed, rows - n_heavy)
+    # heavy talkers: zipf-weighted, bunched into a few minutes each
+    weights = 1 / np.arange(1, HEAVY_IPS + 1)
+    who = rng.choice(HEAVY_IPS, n_heavy, p=weights / weights.sum())
+    burst = rng.integers(0, minutes, (HEAVY_IPS, 8))
+    minute = np.concatenate([rng.integers(0, minutes, rows - n_heavy), burst[who, rng.integers(0, 8, n_heavy)]])
+    start = pd.Timestamp('2025-01-01')
+    logs = pd.DataFrame({
+        'timestamp': start + pd.to_timedelta(minute * 60 + rng.random(rows) * 60, unit='s'),
+        'ip_address': np.concatenate([background, heavy[who]]),
+        'user_id': rng.zipf(1.2, rows) % users,
+    })
+    return logs.sort_values('timestamp', kind='mergesort').reset_index(drop=True)
+
+
+def timed(fn, *args):
+    t0 = time.perf_counter()
+    out = fn(*args)
+    return out, time.perf_counter() - t0
+
+
+def mb(obj):
+    return (obj.memory_usage(deep=True).sum() if isinstance(obj, pd.DataFrame)
+            else obj.memory_usage(deep=True)) / 1e6
+
+
+def bench_distinct(logs):
+    exact, t_exact = timed(lambda: logs.set_index('timestamp')['user_id'].resample('1Min').nunique())
+    approx, t_sketch = timed(lambda: distinct_per_bucket(logs['timestamp'].dt.floor('1Min'), logs['user_id']))
+    exact = exact[exact > 0]
+    err = np.abs(approx.reindex(exact.index).to_numpy() / exact.to_numpy() - 1)
+    print(f"{'distinct users / minute':<28} {t_exact:>8.2f} {t_sketch:>8.2f} {'':>9} {len(approx) * 1024 / 1e6:>9.2f}"
+          f"  mean rel err {err.mean():.2%}, max {err.max():.2%} (avg {exact.mean():.0f} users)")
+
+
+def bench_ip_counts(logs, epsilon, k):
+    ips = logs['ip_address']
+    exact, t_exact = timed(ips.value_counts)
+
+    def sketch():
+        cms, top = CountMinSketch.from_error(epsilon, IP_DELTA, conservative=True), SpaceSaving(k)
+        for start in range(0, len(ips), CHUNK_ROWS):
+            codes, uniques = pd.factorize(ips.iloc[start:start + CHUNK_ROWS])
+            counts = np.bincount(codes).astype(np.float64)
+            cms.update(None, counts, hashes=hash64(np.asarray(uniques), unique=True))
+            top.merge_counts(pd.Series(counts, index=uniques))
+        return cms, top
+    (cms, top), t_sketch = timed(sketch)
+    over = cms.estimate(exact.index) - exact.to_numpy()
+    recall = len(set(top.top(10).index) & set(exact.index[:10])) / 10
+    print(f"{'per-IP counts':<28} {t_exact:>8.2f} {t_sketch:>8.2f} {mb(exact):>9.2f} {cms.nbytes / 1e6:>9.2f}"
+          f"  over mean {over.mean():.2f}, max {over.max():.0f} (bound {cms.error_bound():.0f});"
+          f" top-10 recall {recall:.0%}")
+
+
+def bench_window_flags(logs, k):
+    def exact():
+        counts = per_minute_counts(logs, 'ip_address')
+        return counts, mean_plus_sigmas(counts)
+    (counts, threshold), t_exact = timed(exact)
+    (top, (mean, std)), t_sketch = timed(sketch_minute_counts, logs, 'ip_address', k)
+    flagged = counts[counts > threshold].index
+    found = top[top > mean + SIGMAS * std].index
+    hit = len(flagged.intersection(found))
+    print(f"{'minute x IP DDoS flags':<28} {t_exact:>8.2f} {t_sketch:>8.2f} {mb(counts):>9.2f} {mb(top):>9.2f}"
+          f"  threshold {threshold:.2f} vs {mean + SIGMAS * std:.2f}; flags {len(flagged)} vs {len(found)},"
+          f" recall {hit / max(len(flagged), 1):.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sketch vs exact distinct counts, per-IP counts and DDoS flags.")
+    parser.add_argument('--source', help="log file or store to use instead of a synthetic log")
+    parser.add_argument('--rows', type=int, default=2_000_000)
+    parser.add_argument('--ips', type=int, default=1_000_000, help="distinct spoofed addresses")
+    parser.add_argument('--users', type=int, default=100_000)
+    parser.add_argument('--minutes', type=int, default=1440)
+    parser.add_argument('--epsilon', type=float, default=IP_EPSILON, help="Count-Min error per unit of N")
+    parser.add_argument('--top-k', type=int, default=TOP_K, help="SpaceSaving size for the per-IP counts")
+    parser.add_argument('--window-k', type=int, default=WINDOW_TOP_K, help="keys kept per minute")
+    args = parser.parse_args()
+
+    if args.source:
+        logs = load_compact_logs(args.source, columns=['ip_address', 'user_id'])
+        logs = logs.sort_values('timestamp', kind='mergesort').reset_index(drop=True)
+    else:
+        logs = make_logs(args.rows, args.ips, args.users, args.minutes)
+    print(f"{len(logs):,} rows, {logs['ip_address'].nunique():,} IPs, "
+          f"{logs['timestamp'].dt.floor('1Min').nunique():,} minutes")
+    print(f"{'':<28} {'exact s':>8} {'sketch s':>8} {'exact MB':>9} {'sketch MB':>9}  accuracy")
+    bench_distinct(logs)
+    bench_ip_counts(logs, args.epsilon, args.top_k)
+    bench_window_flags(logs, args.window_k)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,278 @@
+# blocklist.py
+# IP blocklist fed by the per-IP classification report, with time-decaying bans.
+#
+#   python blocklist.py update                      # ban IPs from data/anomaly_classification_report.csv
+#   python blocklist.py update --promote 24:16      # also ban a /24 once 16 of its hosts are banned
+#   python blocklist.py check 203.0.113.1 10.0.0.7
+#   python blocklist.py list                        # active bans as aggregated CIDR blocks
+#   python block_suspicious_ips.py --blocklist data/blocklist.bin   # skip banned IPs, then add new bans
+#
+# A ban is an inclusive uint32 address range (a host, or a CIDR block) with an
+# expiry time. Reported IPs whose anomaly is in BAN_ANOMALIES are banned for
+# MIN_TTL to MAX_TTL, scaled linearly by the report's avg_intensity; banning an
+# address again keeps the later expiry.
+#
+# Lookups run against the union of the active bans, merged into sorted,
+# disjoint intervals: is_blocked() is one bisect over a Python list and
+# blocked() one np.searchsorted over a whole column. The merged view is rebuilt
+# lazily when the earliest active ban expires, so expiry is exact without
+# per-lookup timestamp checks.
+#
+# Snapshot format (little endian): b'IPBL', uint32 version, uint64 count, then
+# count uint32 starts, count uint32 ends and count float64 expiry times.
+import argparse
+import bisect
+import os
+import socket
+import struct
+import time
+
+import numpy as np
+import pandas as pd
+
+from ip_scoring import INTENSITY_MULTIPLIER
+from log_codec import ip_to_int
+
+BLOCKLIST_PATH = 'data/blocklist.bin'
+REPORT_PATH = 'data/anomaly_classification_report.csv'
+BAN_ANOMALIES = ['DDoS Attack', 'Brute Force Login', 'SQL Injection Attempt']
+MIN_TTL = 3600.0
+MAX_TTL = 7 * 86400.0
+MAX_INTENSITY = max(INTENSITY_MULTIPLIER.values())
+MAGIC = b'IPBL'
+VERSION = 1
+_HEADER = struct.Struct('<4sIQ')
+
+
+# -----------------------------
+# Addresses and CIDR blocks
+# -----------------------------
+def parse_cidr(text):
+    """'a.b.c.d' or 'a.b.c.d/n' -> inclusive (start, end) uint32 range."""
+    addr, _, bits = str(text).partition('/')
+    prefix = int(bits) if bits else 32
+    if not 0 <= prefix <= 32:
+        raise ValueError(f"bad prefix length in {text!r}")
+    mask = (0xFFFFFFFF << (32 - prefix)) & 0xFFFFFFFF
+    start = struct.unpack('!I', socket.inet_aton(addr))[0] & mask
+    return start, start | (~mask & 0xFFFFFFFF)
+
+
+def range_to_cidrs(start, end):
+    """Smallest list of CIDR blocks that covers exactly [start, end]."""
+    blocks = []
+    while start <= end:
+        # largest aligned block starting at `start` that stays within `end`
+        size = (start & -start) or 1 << 32
+        while size > end - start + 1:
+            size >>= 1
+        prefix = 33 - size.bit_length()
+        blocks.append(f'{socket.inet_ntoa(struct.pack("!I", start))}/{prefix}')
+        start += size
+    return blocks
+
+
+def _as_ints(ips):
+    ips = pd.Series(ips)
+    if ips.dtype.kind in 'ui':
+        return ips.to_numpy(dtype=np.uint32)
+    return ip_to_int(ips.astype(object))
+
+
+def _merge(starts, ends):
+    """Union of inclusive ranges as sorted, disjoint, non-adjacent ranges."""
+    if not len(starts):
+        return starts, ends
+    order = np.argsort(starts, kind='stable')
+    s, e = starts[order].astype(np.int64), ends[order].astype(np.int64)
+    reach = np.maximum.accumulate(e)
+    # a new interval starts where it does not touch anything before it
+    new = np.r_[True, s[1:] > reach[:-1] + 1]
+    idx = np.flatnonzero(new)
+    return s[idx].astype(np.uint32), np.maximum.reduceat(e, idx).astype(np.uint32)
+
+
+# -----------------------------
+# Blocklist
+# -----------------------------
+class Blocklist:
+    """Address-range bans with expiry times; see the module header."""
+
+    def __init__(self, starts=(), ends=(), expires=()):
+        self.starts = np.asarray(starts, dtype=np.uint32)
+        self.ends = np.asarray(ends, dtype=np.uint32)
+        self.expires = np.asarray(expires, dtype=np.float64)
+        self._dedupe()
+        self._valid_until = None  # forces a rebuild of the merged view
+
+    def __len__(self):
+        return len(self.starts)
+
+    def _dedupe(self):
+        # one entry per range, with its latest expiry
+        if not len(self.starts):
+            return
+        order = np.lexsort((-self.expires, self.ends, self.starts))
+        s, e, x = self.starts[order], self.ends[order], self.expires[order]
+        first = np.r_[True, (s[1:] != s[:-1]) | (e[1:] != e[:-1])]
+        self.starts, self.ends, self.expires = s[first], e[first], x[first]
+        self._valid_until = None
+
+    def ban(self, ranges, ttl, now=None):
+        """Ban (start, end) ranges (or CIDR strings) for `ttl` seconds each (scalar or per range)."""
+        now = time.time() if now is None else now
+        ranges = [parse_cidr(r) if isinstance(r, str) else r for r in ranges]
+        if not ranges:
+            return self
+        starts, ends = np.array(ranges, dtype=np.uint32).reshape(-1, 2).T
+        expires = now + np.broadcast_to(np.asarray(ttl, dtype=np.float64), starts.shape)
+        self.starts = np.concatenate([self.starts, starts])
+        self.ends = np.concatenate([self.ends, ends])
+        self.expires = np.concatenate([self.expires, expires])
+        self._dedupe()
+        return self
+
+    def ban_ips(self, ips, ttl, now=None):
+        ints = _as_ints(ips)
+        return self.ban(np.stack([ints, ints], axis=1), ttl, now)
+
+    def expire(self, now=None):
+        """Drop bans that have run out."""
+        now = time.time() if now is None else now
+        live = self.expires > now
+        self.starts, self.ends, self.expires = self.starts[live], self.ends[live], self.expires[live]
+        self._valid_until = None
+        return self
+
+    def _view(self, now):
+        # valid from the build time until the earliest live ban runs out
+        if self._valid_until is None or not self._built_at <= now < self._valid_until:
+            self._built_at = now
+            live = self.expires > now
+            self._lo, self._hi = _merge(self.starts[live], self.ends[live])
+            self._lo_list, self._hi_list = self._lo.tolist(), self._hi.tolist()
+            self._valid_until = self.expires[live].min() if live.any() else np.inf
+        return self._lo, self._hi
+
+    def is_blocked(self, ip, now=None):
+        """Is one address (dotted string or int) banned right now?"""
+        self._view(time.time() if now is None else now)
+        if isinstance(ip, str):
+            ip = struct.unpack('!I', socket.inet_aton(ip))[0]
+        i = bisect.bisect_right(self._lo_list, ip) - 1
+        return i >= 0 and ip <= self._hi_list[i]
+
+    def blocked(self, ips, now=None):
+        """Bool array over a column of addresses (dotted strings or uint32)."""
+        lo, hi = self._view(time.time() if now is None else now)
+        ints = _as_ints(ips)
+        i = np.searchsorted(lo, ints, side='right') - 1
+        hit = i >= 0
+        hit[hit] = ints[hit] <= hi[i[hit]]
+        return hit
+
+    def cidrs(self, now=None):
+        """Active bans as a minimal list of CIDR blocks."""
+        lo, hi = self._view(time.time() if now is None else now)
+        return [c for s, e in zip(lo.tolist(), hi.tolist()) for c in range_to_cidrs(s, e)]
+
+    def promote(self, prefix, min_hosts, now=None):
+        """Ban every /prefix network with at least `min_hosts` banned addresses, until its last member expires."""
+        now = time.time() if now is None else now
+        live = (self.expires > now) & (self.starts == self.ends)
+        if not live.any():
+            return self
+        shift = 32 - prefix
+        nets = self.starts[live] >> np.uint32(shift)
+        frame = pd.DataFrame({'net': nets, 'expires': self.expires[live]}).groupby('net')['expires']
+        stats = pd.DataFrame({'hosts': frame.size(), 'expires': frame.max()})
+        stats = stats[stats['hosts'] >= min_hosts]
+        if not stats.empty:
+            starts = stats.index.to_numpy(dtype=np.uint64) << np.uint64(shift)
+            ends = starts + np.uint64((1 << shift) - 1)
+            self.ban(np.stack([starts, ends], axis=1).astype(np.uint32), stats['expires'].to_numpy() - now, now)
+        return self
+
+    # -----------------------------
+    # Snapshot
+    # -----------------------------
+    def save(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp = f'{path}.tmp'
+        with open(tmp, 'wb') as fh:
+            fh.write(_HEADER.pack(MAGIC, VERSION, len(self)))
+            for a, dtype in ((self.starts, '<u4'), (self.ends, '<u4'), (self.expires, '<f8')):
+                fh.write(a.astype(dtype, copy=False).tobytes())
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        """The snapshot at `path`, or an empty blocklist if there is none."""
+        if not os.path.exists(path):
+            return cls()
+        with open(path, 'rb') as fh:
+            data = fh.read()
+        magic, version, n = _HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} blocklist snapshot")
+        off = _HEADER.size
+        starts = np.frombuffer(data, '<u4', n, off)
+        ends = np.frombuffer(data, '<u4', n, off + 4 * n)
+        expires = np.frombuffer(data, '<f8', n, off + 8 * n)
+        return cls(starts, ends, expires)
+
+
+# -----------------------------
+# Report -> bans
+# -----------------------------
+def ban_ttl(avg_intensity):
+    """Ban length in seconds: MIN_TTL at zero intensity up to MAX_TTL at MAX_INTENSITY."""
+    scale = np.clip(np.asarray(avg_intensity, dtype=float) / MAX_INTENSITY, 0, 1)
+    return MIN_TTL + np.nan_to_num(scale) * (MAX_TTL - MIN_TTL)
+
+
+def ban_from_report(blocklist, report, now=None):
+    """Ban every reported IP whose anomaly is in BAN_ANOMALIES; returns how many were banned."""
+    hits = report[report['anomaly_name'].isin(BAN_ANOMALIES)]
+    blocklist.ban_ips(hits['ip_address'], ban_ttl(hits['avg_intensity']), now)
+    return len(hits)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="IP blocklist built from the anomaly classification report.")
+    parser.add_argument('--blocklist', default=BLOCKLIST_PATH, help="snapshot file")
+    sub = parser.add_subparsers(dest='command', required=True)
+    update = sub.add_parser('update', help="add bans from a classification report and drop expired ones")
+    update.add_argument('--report', default=REPORT_PATH)
+    update.add_argument('--promote', metavar='PREFIX:HOSTS',
+                        help="also ban a whole /PREFIX network once HOSTS of its addresses are banned")
+    check = sub.add_parser('check', help="is each address banned?")
+    check.add_argument('ips', nargs='+')
+    sub.add_parser('list', help="print the active bans as CIDR blocks")
+    args = parser.parse_args()
+
+    blocklist = Blocklist.load(args.blocklist)
+    if args.command == 'update':
+        n = ban_from_report(blocklist, pd.read_csv(args.report))
+        if args.promote:
+            prefix, hosts = (int(v) for v in args.promote.split(':'))
+            blocklist.promote(prefix, hosts)
+        blocklist.expire().save(args.blocklist)
+        print(f"✅ {n} IPs banned; {len(blocklist)} active bans, {len(blocklist.cidrs())} CIDR blocks"
+              f" saved to {args.blocklist}")
+    elif args.command == 'check':
+        for ip in args.ips:
+            print(f"{ip}\t{'blocked' if blocklist.is_blocked(ip) else 'allowed'}")
+    elif args.command == 'list':
+        now = time.time()
+        for cidr in blocklist.cidrs(now):
+            start, end = parse_cidr(cidr)
+            covering = (blocklist.starts <= end) & (blocklist.ends >= start) & (blocklist.expires > now)
+            until = pd.Timestamp(blocklist.expires[covering].max(), unit='s').strftime('%Y-%m-%d %H:%M:%S')
+            print(f"{cidr}\tuntil {until} UTC")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,71 +1,245 @@
+import argparse
+
 import pandas as pd
 import plotly.express as px
 
-# Load logs
-logs = pd.read_csv('synthetic_logs_enhanced.csv', parse_dates=['timestamp'])
-
-# Initialize a list to store detected anomalies
-anomaly_list = []
-
-# 1️⃣ High Response Time
-threshold_resp = logs['response_time'].mean() + 2 * logs['response_time'].std()
-high_resp = logs[logs['response_time'] > threshold_resp].copy()
-high_resp['attack_type'] = 'High Response Time'
-high_resp['severity'] = high_resp['response_time']  # use actual value as intensity
-anomaly_list.append(high_resp)
-
-# 2️⃣ DDoS Detection (high number of requests per IP per minute)
-ip_counts = logs.groupby([pd.Grouper(key='timestamp', freq='1Min'), 'ip_address']).size()
-ddos_threshold = ip_counts.mean() + 2 * ip_counts.std()
-ddos = ip_counts[ip_counts > ddos_threshold].reset_index()
-ddos['attack_type'] = 'DDoS'
-ddos['severity'] = ddos[0]  # count as severity
-ddos = ddos.rename(columns={0:'count'})
-anomaly_list.append(ddos)
-
-# 3️⃣ Failed Login Attack
-failed_logins = logs[logs['login_status'] == 'failed']
-failed_count = failed_logins.groupby([pd.Grouper(key='timestamp', freq='1Min'), 'ip_address']).size()
-failed_threshold = failed_count.mean() + 2 * failed_count.std()
-login_attack = failed_count[failed_count > failed_threshold].reset_index()
-login_attack['attack_type'] = 'Failed Login'
-login_attack['severity'] = login_attack[0]
-login_attack = login_attack.rename(columns={0:'count'})
-anomaly_list.append(login_attack)
-
-# 4️⃣ Abnormal Product Activity (spikes per product)
-product_counts = logs.groupby([pd.Grouper(key='timestamp', freq='1Min'), 'product_id']).size()
-product_threshold = product_counts.mean() + 2 * product_counts.std()
-product_anomaly = product_counts[product_counts > product_threshold].reset_index()
-product_anomaly['attack_type'] = 'Product Spike'
-product_anomaly['severity'] = product_anomaly[0]
-product_anomaly = product_anomaly.rename(columns={0:'count'})
-anomaly_list.append(product_anomaly)
-
-# Combine all anomalies
-anomalies = pd.concat(anomaly_list, ignore_index=True, sort=False)
-
-# Fill missing columns for uniform plotting
-for col in ['timestamp', 'ip_address', 'product_id', 'attack_type', 'severity']:
-    if col not in anomalies.columns:
-        anomalies[col] = None
-
-# Plot interactive dashboard
-fig = px.scatter(
-    anomalies,
-    x='timestamp',
-    y='ip_address',
-    color='attack_type',
-    size='severity',
-    hover_data=['product_id', 'count', 'response_time'],
-    title='Anomaly Detection Dashboard - Multiple Attack Types',
-    color_discrete_sequence=px.colors.qualitative.Dark24
-)
-
-fig.update_layout(
-    xaxis_title='Timestamp',
-    yaxis_title='IP Address',
-    title_x=0.5
-)
-
-fig.show()
+import render
+from log_codec import expand_logs, load_compact_logs
+from log_store import default_source
+from log_stream import CHUNK_ROWS
+from metrics import add_arguments, counter, instrumented, timer
+from rollup import counts, load_rollup, response_moments, time_range
+from sketches import WINDOW_TOP_K, WindowSketch
+from thresholds import (DDOS, FAILED_LOGIN, HALFLIFE, HIGH_RESPONSE, PRODUCT_SPIKE, SIGMAS, WARMUP,
+                        AdaptiveThresholds, adaptive_flags, halflife_seconds, mean_plus_sigmas, per_minute_counts,
+                        threshold_values)
+
+
+def detect_anomalies(logs):
+    """All rows / per-minute counts above the dashboard thresholds, as one frame."""
+    # Initialize a list to store detected anomalies
+    anomaly_list = []
+
+    # 1️⃣ High Response Time
+    threshold_resp = mean_plus_sigmas(logs['response_time'])
+    high_resp = logs[logs['response_time'] > threshold_resp].copy()
+    high_resp['attack_type'] = HIGH_RESPONSE
+    high_resp['severity'] = high_resp['response_time']  # use actual value as intensity
+    anomaly_list.append(high_resp)
+
+    # 2️⃣ DDoS Detection (high number of requests per IP per minute)
+    ip_counts = per_minute_counts(logs, 'ip_address')
+    ddos_threshold = mean_plus_sigmas(ip_counts)
+    ddos = ip_counts[ip_counts > ddos_threshold].reset_index()
+    ddos['attack_type'] = DDOS
+    ddos['severity'] = ddos[0]  # count as severity
+    ddos = ddos.rename(columns={0:'count'})
+    anomaly_list.append(ddos)
+
+    # 3️⃣ Failed Login Attack
+    failed_logins = logs[logs['login_status'] == 'failed']
+    failed_count = per_minute_counts(failed_logins, 'ip_address')
+    failed_threshold = mean_plus_sigmas(failed_count)
+    login_attack = failed_count[failed_count > failed_threshold].reset_index()
+    login_attack['attack_type'] = FAILED_LOGIN
+    login_attack['severity'] = login_attack[0]
+    login_attack = login_attack.rename(columns={0:'count'})
+    anomaly_list.append(login_attack)
+
+    # 4️⃣ Abnormal Product Activity (spikes per product)
+    product_counts = per_minute_counts(logs, 'product_id')
+    product_threshold = mean_plus_sigmas(product_counts)
+    product_anomaly = product_counts[product_counts > product_threshold].reset_index()
+    product_anomaly['attack_type'] = PRODUCT_SPIKE
+    product_anomaly['severity'] = product_anomaly[0]
+    product_anomaly = product_anomaly.rename(columns={0:'count'})
+    anomaly_list.append(product_anomaly)
+
+    # Combine all anomalies
+    return pd.concat(anomaly_list, ignore_index=True, sort=False)
+
+
+def _above(values, attack_type):
+    flagged = values[values > mean_plus_sigmas(values)].rename('count').reset_index()
+    flagged['attack_type'] = attack_type
+    flagged['severity'] = flagged['count']
+    return flagged
+
+
+def detect_rollup_anomalies(by_ip, failed_by_ip, by_product):
+    """detect_anomalies() on 1-minute rollup cells instead of raw rows.
+
+    Takes the per-(minute, IP), failed-login per-(minute, IP) and
+    per-(minute, product) cells (the cube's projections). Thresholds are the
+    same; per-minute counts are identical. High response times are reported
+    per (minute, IP) cell with the cell's maximum, time-stamped with the
+    minute rather than the request and without a product.
+    """
+    mean, std = response_moments(by_ip)
+    high_resp = by_ip[by_ip['rt_max'] > mean + SIGMAS * std]
+    high_resp = pd.DataFrame({
+        'timestamp': high_resp['bucket'],
+        'ip_address': high_resp['ip_address'],
+        'response_time': high_resp['rt_max'],
+        'attack_type': HIGH_RESPONSE,
+        'severity': high_resp['rt_max'],
+    })
+    return pd.concat([
+        high_resp,
+        _above(counts(by_ip, 'ip_address'), DDOS),
+        _above(counts(failed_by_ip, 'ip_address', 'failed'), FAILED_LOGIN),
+        _above(counts(by_product, 'product_id'), PRODUCT_SPIKE),
+    ], ignore_index=True, sort=False)
+
+
+def detect_adaptive_anomalies(logs, adaptive, step='1h'):
+    """detect_anomalies() against thresholds.AdaptiveThresholds, a `step` of log time at a time.
+
+    Each row carries the threshold it was judged against.
+    """
+    values = threshold_values(logs)
+    flags = adaptive_flags(values, adaptive, step)
+    anomaly_list = []
+    for attack_type, series in values.items():
+        flagged, limits = flags[attack_type]
+        if attack_type == HIGH_RESPONSE:
+            found = logs.loc[series.index.get_level_values(1)[flagged]].copy()
+            found['severity'] = found['response_time']
+        else:
+            found = series[flagged].rename('count').reset_index()
+            found['severity'] = found['count']
+        found['attack_type'] = attack_type
+        found['threshold'] = limits[flagged]
+        anomaly_list.append(found)
+    return pd.concat(anomaly_list, ignore_index=True, sort=False)
+
+
+def sketch_minute_counts(logs, key, k=WINDOW_TOP_K):
+    """per_minute_counts() for each minute's top-k keys only, and (mean, std) over all (minute, key) counts.
+
+    Built with sketches.WindowSketch, CHUNK_ROWS rows at a time, so no
+    per-(minute, key) table of the whole log is ever held. Every pair whose
+    count exceeds 1/k of its minute's events is included.
+    """
+    logs = logs.sort_values('timestamp', kind='mergesort')
+    sketch = WindowSketch('1Min', k)
+    for start in range(0, len(logs), CHUNK_ROWS):
+        part = logs.iloc[start:start + CHUNK_ROWS]
+        sketch.update(part['timestamp'], part[key])
+    top, summary = sketch.result(key)
+    return top, WindowSketch.moments(summary)
+
+
+def detect_sketch_anomalies(logs, k=WINDOW_TOP_K):
+    """detect_anomalies() with the per-minute IP / product counts and their thresholds from sketches."""
+    threshold_resp = mean_plus_sigmas(logs['response_time'])
+    high_resp = logs[logs['response_time'] > threshold_resp].copy()
+    high_resp['attack_type'] = HIGH_RESPONSE
+    high_resp['severity'] = high_resp['response_time']
+    anomaly_list = [high_resp]
+    failed = logs[logs['login_status'] == 'failed']
+    for attack_type, frame, key in [(DDOS, logs, 'ip_address'), (FAILED_LOGIN, failed, 'ip_address'),
+                                    (PRODUCT_SPIKE, logs, 'product_id')]:
+        top, (mean, std) = sketch_minute_counts(frame, key, k)
+        found = top[top > mean + SIGMAS * std].reset_index()
+        found['attack_type'] = attack_type
+        found['severity'] = found['count']
+        anomaly_list.append(found)
+    return pd.concat(anomaly_list, ignore_index=True, sort=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Interactive dashboard of threshold-based anomalies.")
+    parser.add_argument('--rollup', metavar='DIR', help="read the rollup cube (rollup.py) instead of the raw log")
+    parser.add_argument('--days', type=float, help="with --rollup: only the last N days of the cube")
+    parser.add_argument('--adaptive', action='store_true',
+                        help="judge each --step of the log against thresholds learned from what came before it")
+    parser.add_argument('--halflife', default=f'{HALFLIFE / 3600:g}h',
+                        help="with --adaptive: event-time halflife of the learned statistics ('none' = no decay)")
+    parser.add_argument('--step', default='1h', help="with --adaptive: how often the thresholds move on")
+    parser.add_argument('--quantile', type=float,
+                        help="with --adaptive: threshold at this quantile instead of mean + 2 std")
+    parser.add_argument('--product-warmup', type=float, metavar='N',
+                        help=f"with --adaptive: per-product spike thresholds once a product has N minutes"
+                             f" of weight (e.g. {WARMUP}); default one threshold for all products")
+    parser.add_argument('--count-floor', action='store_true',
+                        help="with --adaptive: floor the std of per-minute counts at sqrt(mean) (Poisson noise)")
+    parser.add_argument('--sketch', action='store_true',
+                        help="per-minute IP / product counts from bounded-memory sketches (top --top-k per minute)")
+    parser.add_argument('--top-k', type=int, default=WINDOW_TOP_K,
+                        help="with --sketch: keys kept per minute; any key above 1/k of a minute's events is kept")
+    add_arguments(parser)
+    render.add_arguments(parser)
+    args = parser.parse_args()
+    if args.adaptive and args.rollup:
+        parser.error("--adaptive works on the raw log; drop --rollup")
+    if args.sketch and (args.rollup or args.adaptive):
+        parser.error("--sketch works on the raw log with the static thresholds; drop --rollup / --adaptive")
+    with instrumented(args, 'dashboard'):
+        run(args)
+
+
+def load_anomalies(args):
+    if args.rollup:
+        with timer('load'):
+            start = None
+            if args.days:
+                _, last = time_range(args.rollup)
+                if last is not None:
+                    start = last + pd.Timedelta(days=1) - pd.Timedelta(days=args.days)
+            by_ip = load_rollup(args.rollup, '1min', start=start, dimensions=['ip_address'])
+            failed_by_ip = load_rollup(args.rollup, '1min', start=start, dimensions=['ip_address'], failed=True)
+            by_product = load_rollup(args.rollup, '1min', start=start, dimensions=['product_id'])
+        counter('rows_processed_total', 'log rows scanned').inc(int(by_product['events'].sum()))
+        with timer('detect'):
+            return expand_logs(detect_rollup_anomalies(by_ip, failed_by_ip, by_product))
+
+    with timer('load'):
+        logs = load_compact_logs(default_source('synthetic_logs_enhanced.csv'))
+    counter('rows_processed_total', 'log rows scanned').inc(len(logs))
+    with timer('detect'):
+        if args.adaptive:
+            adaptive = AdaptiveThresholds(halflife_seconds(args.halflife), quantile=args.quantile,
+                                          warmup=args.product_warmup, count_floor=args.count_floor)
+            return expand_logs(detect_adaptive_anomalies(logs, adaptive, args.step))
+        if args.sketch:
+            return expand_logs(detect_sketch_anomalies(logs, args.top_k))
+        return expand_logs(detect_anomalies(logs))
+
+
+def run(args):
+    anomalies = load_anomalies(args)
+    for attack_type, n in anomalies['attack_type'].value_counts().items():
+        counter('alerts_emitted_total', 'anomalies shown on the dashboard', attack_type=attack_type).inc(int(n))
+
+    # Fill missing columns for uniform plotting
+    for col in ['timestamp', 'ip_address', 'product_id', 'attack_type', 'severity']:
+        if col not in anomalies.columns:
+            anomalies[col] = None
+
+    # Plot interactive dashboard
+    with timer('render'):
+        fig = render.scatter(
+            anomalies,
+            x='timestamp',
+            y='ip_address',
+            value='severity',
+            max_points=args.max_points,
+            method=args.downsample,
+            color='attack_type',
+            size='severity',
+            hover_data=['product_id', 'count', 'response_time'] + (['threshold'] if 'threshold' in anomalies else []),
+            title='Anomaly Detection Dashboard - Multiple Attack Types',
+            color_discrete_sequence=px.colors.qualitative.Dark24
+        )
+        fig.update_layout(
+            xaxis_title='Timestamp',
+            yaxis_title='IP Address',
+            title_x=0.5
+        )
+
+    render.output(fig, args, 'dashboard')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,678 @@
+# ingest.py
+# Asyncio ingestion front-end: accepts live events over TCP, UDP or HTTP and
+# feeds them to the detection stages in columnar micro-batches.
+#
+#   python ingest.py --tcp 127.0.0.1:9100 --http 127.0.0.1:9180
+#   python ingest.py --udp 127.0.0.1:9101 --format csv --alerts data/alerts.jsonl
+#   python replay.py --tcp 127.0.0.1:9100 --stats 127.0.0.1:9180 --speedup 3600
+#
+#   TCP   newline-delimited events, one connection per producer
+#   UDP   one or more newline-delimited events per datagram
+#   HTTP  POST /events (NDJSON, or CSV with Content-Type: text/csv);
+#         GET /stats (JSON), GET /metrics (Prometheus text),
+#         POST /stats/reset (stats, then restart the latency percentiles)
+#
+# Events use the simulate_logs.py schema: JSON objects, or CSV lines in COLUMNS
+# order, plus an optional sent_at epoch time for end-to-end latency. The event
+# loop only splits incoming bytes into whole lines and appends them to a
+# per-format buffer; a buffer is flushed as one batch once it holds
+# --batch-rows events or its oldest event is --max-delay-ms old. A batch is
+# parsed in one call (pyarrow.json / read_csv), validated column-wise and
+# handed to BatchDetector on a worker thread: no Python code runs per event,
+# and per key only to emit an alert. Per-(minute, key) counts are one Series
+# per minute; a batch is merged into each minute it touches with array ops.
+#
+# Backpressure: batches wait in a queue of --queue-batches. When it is full,
+# TCP readers stop reading (the kernel window closes on the producer), HTTP
+# requests are answered 503 with Retry-After, and UDP datagrams are dropped and
+# counted in ingest_dropped_total.
+#
+# BatchDetector keeps per-(minute, IP) and per-(minute, product) counts for the
+# last --retention minutes of event time (older events are rejected as late)
+# and raises the dashboard's threshold alerts (thresholds.py, learned from
+# --baseline) when a running count crosses them. With --adaptive the thresholds
+# are an AdaptiveThresholds seeded from --baseline (shifted to end at startup)
+# that keeps learning: response times batch by batch, and each minute's final
+# per-IP / per-product counts once the minute drops out of the retention
+# window. --product-warmup gives products their own spike thresholds and
+# --count-floor floors the count std at its Poisson noise (thresholds.py).
+# Each batch also goes through rule_engine.evaluate(), with per-IP minute
+# counts as features, for labels the thresholds do not cover (SQL injection),
+# and the per-product minute counts (kept for --trend-minutes) give the stats'
+# trending products through trending.sparse_spike_counts(). Latency
+# percentiles cover the most recent LATENCY_SAMPLES events.
+import argparse
+import asyncio
+import io
+import json
+import socket
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from log_store import load_logs
+from metrics import REGISTRY, add_arguments, counter, gauge, histogram, instrumented
+from realtime_detector import ALERT_RULES
+from rule_engine import BRUTE_FORCE_FAILURES, RULES, evaluate, rule
+from simulate_logs import COLUMNS
+from thresholds import (DDOS, FAILED_LOGIN, HALFLIFE, HIGH_RESPONSE, PRODUCT_SPIKE, WARMUP, AdaptiveThresholds,
+                        dashboard_thresholds, halflife_seconds, threshold_values)
+from trending import n_buckets, sparse_spike_counts, top_k
+
+BATCH_ROWS = 5000
+MAX_DELAY = 0.05
+QUEUE_BATCHES = 8
+RETENTION_MINUTES = 5
+TREND_MINUTES = 60
+LATENCY_SAMPLES = 100_000
+UDP_RCVBUF = 8 << 20
+READ_BYTES = 1 << 16
+FORMATS = ['json', 'csv']
+EVENT_COLUMNS = COLUMNS + ['sent_at']
+LOGIN_STATUS = ['success', 'failed']
+IPV4 = r'(?:(?:25[0-5]|2[0-4]\d|1\d\d|[1-9]?\d)\.){3}(?:25[0-5]|2[0-4]\d|1\d\d|[1-9]?\d)'
+# rule-engine labels raised on their own; the rest come with a threshold alert
+RULE_ALERTS = [r.name for r in RULES if r.name not in ALERT_RULES.values()]
+
+
+# -----------------------------
+# Parsing and validation
+# -----------------------------
+def parse_batch(fmt, data):
+    """Newline-delimited events -> (frame, malformed line count)."""
+    lines = data.count(b'\n')
+    if fmt == 'csv':
+        df = pd.read_csv(io.BytesIO(data), header=None, names=EVENT_COLUMNS, dtype=str,
+                         on_bad_lines='skip', skip_blank_lines=True)
+        return df, max(lines - len(df), 0)
+    try:
+        import pyarrow.json as pj
+        return pj.read_json(io.BytesIO(data)).to_pandas(), 0
+    except Exception:  # a malformed line anywhere: fall back to line by line
+        records, bad = [], 0
+        for line in data.splitlines():
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                record = None
+            if isinstance(record, dict):
+                records.append(record)
+            else:
+                bad += 1
+        return pd.DataFrame.from_records(records), bad
+
+
+def _to_datetime(values):
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values.dt.tz_localize(None) if values.dt.tz is not None else values
+    try:
+        return pd.to_datetime(values, errors='coerce', format='ISO8601')
+    except (TypeError, ValueError):  # pandas < 2.0
+        return pd.to_datetime(values, errors='coerce')
+
+
+def validate(df):
+    """Rows that fit the log schema, typed, and {reason: rejected row count}."""
+    df = df.reindex(columns=EVENT_COLUMNS)
+    ts = _to_datetime(df['timestamp'])
+    rt = pd.to_numeric(df['response_time'], errors='coerce')
+    ip = df['ip_address'].astype(object).where(df['ip_address'].notna(), '').astype(str)
+    checks = {
+        'timestamp': ts.isna(),
+        'ip_address': ~ip.str.fullmatch(IPV4).astype(bool),
+        'response_time': ~(rt >= 0),
+        'login_status': ~df['login_status'].isin(LOGIN_STATUS),
+        'missing_field': df[['product_id', 'event_type']].isna().any(axis=1),
+    }
+    bad = np.zeros(len(df), dtype=bool)
+    reasons = {}
+    for reason, mask in checks.items():
+        hit = np.asarray(mask, dtype=bool) & ~bad
+        if hit.any():
+            reasons[reason] = int(hit.sum())
+            bad |= hit
+    ok = ~bad
+    out = df[ok].assign(timestamp=ts[ok], response_time=rt[ok],
+                        sent_at=pd.to_numeric(df['sent_at'][ok], errors='coerce'))
+    return out.reset_index(drop=True), reasons
+
+
+# -----------------------------
+# Detection
+# -----------------------------
+def batch_pairs(minutes, keys):
+    """Distinct (minute, key) pairs of a batch: ((minutes, keys) arrays, events per pair, each row's pair index)."""
+    minute_codes, minute_values = pd.factorize(minutes)
+    key_codes, key_values = pd.factorize(keys)
+    width = max(len(key_values), 1)
+    rows, combined = pd.factorize(minute_codes.astype(np.int64) * width + key_codes)
+    pairs = (np.asarray(minute_values, dtype=np.int64)[combined // width],
+             np.asarray(key_values, dtype=object)[combined % width])
+    return pairs, np.bincount(rows, minlength=len(combined)), rows
+
+
+def _by_minute(minutes):
+    """(minute, positions) for every distinct minute of an array of minutes."""
+    codes, uniques = pd.factorize(minutes)
+    order = np.argsort(codes, kind='stable')
+    bounds = np.searchsorted(codes[order], np.arange(len(uniques) + 1))
+    for i, minute in enumerate(uniques.tolist()):
+        yield minute, order[bounds[i]:bounds[i + 1]]
+
+
+def _stack(minutes):
+    """{minute: per-key counts} -> one Series indexed by (minute, key)."""
+    if not minutes:
+        return pd.Series([], index=pd.MultiIndex.from_arrays([[], []]), dtype=np.int64)
+    return pd.concat(minutes)
+
+
+class MinuteCounts:
+    """Running per-(minute, key) counts: thresholds.per_minute_counts() fed batch by batch.
+
+    One int64 Series of per-key counts per minute (epoch ns). A batch's
+    pairs (batch_pairs()) are merged into each minute they touch through an
+    index lookup and array adds; the Python work is per minute, not per key.
+    A merge builds a new Series, so readers on other threads see whole ones.
+    """
+
+    def __init__(self):
+        self.minutes = {}
+        self._floor = None
+
+    def add(self, pairs, sizes):
+        """Add a batch's pair counts; returns the running totals of those pairs."""
+        minutes, keys = pairs
+        totals = np.empty(len(keys), dtype=np.int64)
+        for minute, rows in _by_minute(minutes):
+            added = sizes[rows].astype(np.int64)
+            old = self.minutes.get(minute)
+            if old is None:
+                self.minutes[minute] = pd.Series(added, index=pd.Index(keys[rows], dtype=object))
+                totals[rows] = added
+                continue
+            at = old.index.get_indexer(keys[rows])
+            known = at >= 0
+            values = old.to_numpy().copy()
+            values[at[known]] += added[known]
+            totals[rows] = np.where(known, values[at], added)
+            self.minutes[minute] = pd.Series(np.concatenate([values, added[~known]]),
+                                             index=old.index.append(pd.Index(keys[rows][~known], dtype=object)))
+        return totals
+
+    def get(self, pairs):
+        minutes, keys = pairs
+        totals = np.zeros(len(keys), dtype=np.int64)
+        for minute, rows in _by_minute(minutes):
+            if minute in self.minutes:
+                totals[rows] = self.minutes[minute].reindex(keys[rows], fill_value=0).to_numpy()
+        return totals
+
+    def prune(self, before):
+        """Forget minutes (epoch ns) before `before`; returns their counts, indexed by (minute, key).
+
+        A no-op (returning an empty Series) until the watermark moves.
+        """
+        dropped = {}
+        if before != self._floor:
+            self._floor = before
+            dropped = {m: counts for m, counts in self.minutes.items() if m < before}
+            for minute in dropped:
+                del self.minutes[minute]
+        return _stack(dropped)
+
+    def between(self, start, end):
+        """Counts of the minutes in [start, end), indexed by (minute, key)."""
+        return _stack({m: counts for m, counts in self.minutes.items() if start <= m < end})
+
+    def series(self):
+        """All counts, indexed by (minute, key)."""
+        return _stack(dict(self.minutes))
+
+    def __len__(self):
+        return sum(len(counts) for counts in list(self.minutes.values()))
+
+
+class LatencyRing:
+    """The last `size` latency samples (seconds) in a numpy ring."""
+
+    def __init__(self, size=LATENCY_SAMPLES):
+        self.samples = np.empty(size, dtype=np.float64)
+        self.n = 0
+
+    def add(self, values):
+        values = np.asarray(values, dtype=np.float64)[-len(self.samples):]
+        idx = (self.n + np.arange(len(values))) % len(self.samples)
+        self.samples[idx] = values
+        self.n += len(values)
+
+    def clear(self):
+        self.n = 0
+
+    def quantile(self, q):
+        filled = self.samples[:min(self.n, len(self.samples))]
+        return float(np.quantile(filled, q)) if len(filled) else None
+
+
+class BatchDetector:
+    """Threshold, rule and trending detection over validated event batches."""
+
+    def __init__(self, thresholds, retention=RETENTION_MINUTES, trend_minutes=TREND_MINUTES, emit=None,
+                 adaptive=None):
+        self.adaptive = adaptive
+        self.thresholds = adaptive.current() if adaptive else thresholds
+        self.retention = pd.Timedelta(minutes=retention).value  # ns, like the minute keys
+        self.trend_horizon = pd.Timedelta(minutes=max(trend_minutes, retention)).value
+        self.emit = emit or (lambda alert: print(json.dumps(alert), flush=True))
+        self.ip_requests = MinuteCounts()
+        self.ip_failed = MinuteCounts()
+        self.product_events = MinuteCounts()
+        self.latency = LatencyRing()
+        self._alerted = set()
+        self._latest = self._closed = None
+        self.events = self.rejected = self.alerts = self.batches = 0
+        self.rejected_reasons = {}
+        self.first_received = self.last_done = None
+
+    def process_raw(self, fmt, data, received):
+        """parse_batch() + validate() + process(); runs on the detection thread."""
+        df, malformed = parse_batch(fmt, data)
+        frame, reasons = validate(df)
+        if malformed:
+            reasons['malformed'] = malformed
+        if self._latest is not None and len(frame):
+            # events from minutes that were already pruned can no longer be counted correctly
+            minutes = frame['timestamp'].dt.floor('1Min').to_numpy().astype('datetime64[ns]').view(np.int64)
+            late = minutes < self._latest - self.retention
+            if late.any():
+                reasons['late'] = int(late.sum())
+                frame = frame[~late].reset_index(drop=True)
+        for reason, n in reasons.items():
+            counter('ingest_rejected_total', 'events failing validation', reason=reason).inc(n)
+            self.rejected += n
+            self.rejected_reasons[reason] = self.rejected_reasons.get(reason, 0) + n
+        self.process(frame, received)
+
+    def process(self, frame, received):
+        with histogram('ingest_batch_seconds', 'detection time per micro-batch').time():
+            if len(frame):
+                self._detect(frame)
+        done = time.time()
+        sent = frame['sent_at'].to_numpy(dtype=float) if len(frame) else np.empty(0)
+        self.latency.add(done - np.where(np.isnan(sent), received, sent))
+        self.events += len(frame)
+        self.batches += 1
+        self.first_received = received if self.first_received is None else min(self.first_received, received)
+        self.last_done = done
+        counter('ingest_events_total', 'events accepted').inc(len(frame))
+
+    def _detect(self, frame):
+        if self.adaptive:
+            self.thresholds = self.adaptive.current()
+        minutes = frame['timestamp'].dt.floor('1Min').to_numpy().astype('datetime64[ns]').view(np.int64)
+        ip = frame['ip_address'].to_numpy(dtype=object)
+        product = frame['product_id'].to_numpy(dtype=object)
+        failed = (frame['login_status'] == 'failed').to_numpy()
+        rt = frame['response_time'].to_numpy(dtype=float)
+
+        ip_pairs, ip_sizes, ip_rows = batch_pairs(minutes, ip)
+        requests = self.ip_requests.add(ip_pairs, ip_sizes)
+        failed_pairs, failed_sizes, _ = batch_pairs(minutes[failed], ip[failed])
+        failures = self.ip_failed.add(failed_pairs, failed_sizes)
+        product_pairs, product_sizes, _ = batch_pairs(minutes, product)
+        products = self.product_events.add(product_pairs, product_sizes)
+
+        self._alert(DDOS, 'ip_address', ip_pairs, requests, requests > self.thresholds[DDOS])
+        self._alert(FAILED_LOGIN, 'ip_address', failed_pairs, failures,
+                    (failures > self.thresholds[FAILED_LOGIN]) | (failures >= BRUTE_FORCE_FAILURES))
+        if self.adaptive:
+            limits = self.adaptive.threshold(PRODUCT_SPIKE, product_pairs[1])
+            self.adaptive.judge(HIGH_RESPONSE, rt, frame['timestamp'].to_numpy().astype('datetime64[ns]')
+                                .view(np.int64) / 1e9)
+        else:
+            limits = np.full(len(product_sizes), self.thresholds[PRODUCT_SPIKE])
+        self._alert(PRODUCT_SPIKE, 'product_id', product_pairs, products, products > limits, limits=limits)
+        slow = rt > self.thresholds[HIGH_RESPONSE]
+        if slow.any():
+            worst = pd.Series(rt[slow]).groupby(ip_rows[slow]).max()
+            at = worst.index.to_numpy()
+            self._alert(HIGH_RESPONSE, 'ip_address', (ip_pairs[0][at], ip_pairs[1][at]), worst.to_numpy(),
+                        value_name='response_time')
+
+        # rule engine, with this minute's per-IP counts as the request / failure features
+        features = pd.DataFrame({
+            'total_requests': requests[ip_rows],
+            'failed_logins': self.ip_failed.get(ip_pairs)[ip_rows],
+            'response_time': rt,
+            'product_id': product,
+            'anomaly_type': frame['anomaly_type'].to_numpy(dtype=object),
+            'composite_score': 0.0,
+        })
+        names = evaluate(features)['anomaly_name'].to_numpy(dtype=object)
+        hit = np.isin(names, RULE_ALERTS)
+        if hit.any():
+            flagged = pd.DataFrame({'pair': ip_rows[hit], 'name': names[hit], 'product_id': product[hit]})
+            for pair, name, product_id in flagged.drop_duplicates(['pair', 'name']).itertuples(index=False):
+                self._emit(name, 'ip_address', ip_pairs[1][pair], int(ip_pairs[0][pair]), name,
+                           {'product_id': product_id})
+
+        # the watermark only moves forward: late batches are counted but never un-prune
+        latest = max(int(minutes.max()), self._latest or 0)
+        self._latest = latest
+        watermark = latest - self.retention
+        requests_closed = self.ip_requests.prune(watermark)
+        failed_closed = self.ip_failed.prune(watermark)
+        if self.adaptive and watermark != self._closed:
+            # minutes behind the watermark are final: learn their counts
+            start = -np.inf if self._closed is None else self._closed
+            self._learn(PRODUCT_SPIKE, self.product_events.between(start, watermark))
+            self._learn(DDOS, requests_closed)
+            self._learn(FAILED_LOGIN, failed_closed)
+        self._closed = watermark
+        self.product_events.prune(latest - self.trend_horizon)
+        if len(self._alerted) > len(self.ip_requests) + len(self.product_events):
+            self._alerted = {a for a in self._alerted if a[2] >= watermark}
+
+    def _learn(self, category, closed):
+        """Feed the final counts of closed minutes to the adaptive thresholds."""
+        if len(closed):
+            minutes, keys = closed.index.get_level_values(0), closed.index.get_level_values(1)
+            self.adaptive.judge(category, closed.to_numpy(), minutes.to_numpy(dtype=np.int64) / 1e9,
+                                keys.to_numpy(dtype=object) if category == PRODUCT_SPIKE else None)
+
+    def _alert(self, attack_type, key_name, pairs, values, mask=None, value_name='count', limits=None):
+        minutes, keys = pairs
+        hits = range(len(keys)) if mask is None else np.flatnonzero(mask)
+        for i in hits:
+            minute, key = int(minutes[i]), keys[i]
+            value = float(values[i]) if value_name == 'response_time' else int(values[i])
+            limit = self.thresholds[attack_type] if limits is None else limits[i]
+            self._emit(attack_type, key_name, key, minute, ALERT_RULES[attack_type],
+                       {value_name: value, 'threshold': round(float(limit), 3)})
+
+    def _emit(self, attack_type, key_name, key, minute, name, extra):
+        if (attack_type, key, minute) in self._alerted:
+            return
+        self._alerted.add((attack_type, key, minute))
+        minute = pd.Timestamp(minute)
+        self.alerts += 1
+        counter('alerts_emitted_total', 'alerts raised', attack_type=attack_type).inc()
+        self.emit({
+            'attack_type': attack_type, key_name: key, **extra, 'minute': minute.isoformat(),
+            'anomaly_name': name, 'recommendation': rule(name).recommendation if name else None,
+        })
+
+    def stats(self):
+        counts = self.product_events.series()
+        trending = top_k(sparse_spike_counts(counts, n_buckets(counts)), 5) if len(counts) else counts
+        span = (self.last_done - self.first_received) if self.events else 0
+        ms = lambda q: None if self.latency.quantile(q) is None else round(self.latency.quantile(q) * 1000, 3)  # noqa: E731
+        return {
+            'events': self.events,
+            'rejected': self.rejected,
+            'rejected_reasons': dict(self.rejected_reasons),
+            'batches': self.batches,
+            'alerts': self.alerts,
+            'events_per_sec': round(self.events / span, 1) if span > 0 else None,
+            'latency_ms_p50': ms(0.50),
+            'latency_ms_p99': ms(0.99),
+            'active_ips': len(self.ip_requests),
+            'thresholds': {k: round(float(v), 3) for k, v in self.thresholds.items()},
+            'trending_products': {str(k): int(v) for k, v in trending.items()},
+        }
+
+
+# -----------------------------
+# Ingestion
+# -----------------------------
+class _Buffer:
+    __slots__ = ('chunks', 'rows', 'first')
+
+    def __init__(self):
+        self.chunks, self.rows, self.first = [], 0, None
+
+
+class Ingest:
+    """Micro-batching, bounded hand-off queue and the TCP / UDP / HTTP listeners."""
+
+    def __init__(self, detector, fmt='json', batch_rows=BATCH_ROWS, max_delay=MAX_DELAY,
+                 queue_batches=QUEUE_BATCHES):
+        self.detector = detector
+        self.fmt = fmt
+        self.batch_rows = batch_rows
+        self.max_delay = max_delay
+        self.queue = asyncio.Queue(maxsize=queue_batches)
+        self.buffers = {f: _Buffer() for f in FORMATS}
+        self.dropped = 0
+        self._put_lock = asyncio.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='detect')
+
+    # -- batching
+    def _append(self, fmt, data, rows):
+        buf = self.buffers[fmt]
+        if buf.first is None:
+            buf.first = time.time()
+        buf.chunks.append(data)
+        buf.rows += rows
+        return buf.rows >= self.batch_rows
+
+    def _take(self, fmt):
+        buf = self.buffers[fmt]
+        item = (fmt, b''.join(buf.chunks), buf.first)
+        self.buffers[fmt] = _Buffer()
+        return item
+
+    async def _put(self, item):
+        # one putter at a time, so batches reach the detector in the order they were cut
+        async with self._put_lock:
+            await self.queue.put(item)
+
+    async def add(self, fmt, data, rows):
+        """Buffer whole lines; waits for queue space when a batch is due (backpressure)."""
+        if self._append(fmt, data, rows):
+            await self._put(self._take(fmt))
+
+    def add_nowait(self, fmt, data, rows, transport):
+        """Like add() for callers that cannot wait: drops `data` when it completes a batch and the queue is full.
+
+        Events buffered before it are kept for a later batch.
+        """
+        due = self.buffers[fmt].rows + rows >= self.batch_rows
+        # others already waiting for space go first
+        if due and (self._put_lock.locked() or self.queue.full()):
+            events = data.count(b'\n')
+            self.dropped += events
+            counter('ingest_dropped_total', 'events dropped under backpressure', transport=transport).inc(events)
+            return False
+        if self._append(fmt, data, rows):
+            self.queue.put_nowait(self._take(fmt))
+        return True
+
+    async def _flush_timer(self):
+        while True:
+            await asyncio.sleep(self.max_delay / 2)
+            for fmt, buf in list(self.buffers.items()):
+                if buf.rows and time.time() - buf.first >= self.max_delay:
+                    await self._put(self._take(fmt))
+
+    async def _consume(self):
+        loop = asyncio.get_running_loop()
+        depth = gauge('ingest_queue_batches', 'micro-batches waiting for detection')
+        while True:
+            item = await self.queue.get()
+            depth.set(self.queue.qsize())
+            await loop.run_in_executor(self._pool, self.detector.process_raw, *item)
+
+    # -- listeners
+    async def _tcp(self, reader, writer):
+        tail = b''
+        try:
+            while True:
+                data = await reader.read(READ_BYTES)
+                if not data:
+                    break
+                data = tail + data
+                cut = data.rfind(b'\n') + 1
+                tail = data[cut:]
+                if cut:
+                    await self.add(self.fmt, data[:cut], data.count(b'\n', 0, cut))
+            if tail.strip():
+                await self.add(self.fmt, tail + b'\n', 1)
+        finally:
+            writer.close()
+
+    def _udp_protocol(self):
+        ingest = self
+
+        class Protocol(asyncio.DatagramProtocol):
+            def datagram_received(self, data, addr):
+                if not data.endswith(b'\n'):
+                    data += b'\n'
+                ingest.add_nowait(ingest.fmt, data, data.count(b'\n'), 'udp')
+
+        return Protocol()
+
+    async def _http(self, reader, writer):
+        try:
+            while True:
+                head = await reader.readuntil(b'\r\n\r\n')
+                request, *header_lines = head.decode('latin-1').split('\r\n')
+                method, path, _ = request.split(' ', 2)
+                headers = {k.strip().lower(): v.strip() for k, _, v in (h.partition(':') for h in header_lines if h)}
+                body = await reader.readexactly(int(headers.get('content-length', 0)))
+                status, payload, ctype = await self._route(method, path.split('?')[0], headers, body)
+                extra = 'Retry-After: 1\r\n' if status == 503 else ''
+                writer.write(f'HTTP/1.1 {status} {_REASONS[status]}\r\nContent-Type: {ctype}\r\n'
+                             f'Content-Length: {len(payload)}\r\n{extra}\r\n'.encode() + payload)
+                await writer.drain()
+                if headers.get('connection', '').lower() == 'close':
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def _route(self, method, path, headers, body):
+        if method == 'POST' and path == '/events':
+            if self.queue.full():
+                counter('ingest_throttled_total', 'HTTP batches refused with 503').inc()
+                return 503, b'{"error": "busy"}', 'application/json'
+            fmt = 'csv' if headers.get('content-type', '').startswith('text/csv') else 'json'
+            if body and not body.endswith(b'\n'):
+                body += b'\n'
+            rows = body.count(b'\n')
+            await self.add(fmt, body, rows)
+            return 202, json.dumps({'accepted': rows}).encode(), 'application/json'
+        if path == '/stats' and method == 'GET' or path == '/stats/reset' and method == 'POST':
+            stats = dict(self.detector.stats(), queued_batches=self.queue.qsize(), dropped=self.dropped)
+            if path == '/stats/reset':  # start a new latency measurement
+                self.detector.latency.clear()
+            return 200, json.dumps(stats).encode(), 'application/json'
+        if method == 'GET' and path == '/metrics':
+            return 200, REGISTRY.render().encode(), 'text/plain; version=0.0.4'
+        return 404, b'{"error": "not found"}', 'application/json'
+
+    async def serve(self, tcp=None, udp=None, http=None, report_every=None):
+        loop = asyncio.get_running_loop()
+        servers = []
+        if tcp:
+            servers.append(await asyncio.start_server(self._tcp, *_host_port(tcp)))
+        if http:
+            servers.append(await asyncio.start_server(self._http, *_host_port(http)))
+        if udp:
+            transport, _ = await loop.create_datagram_endpoint(self._udp_protocol, local_addr=_host_port(udp))
+            # room for bursts while the loop is busy; the kernel drops what does not fit
+            transport.get_extra_info('socket').setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, UDP_RCVBUF)
+        tasks = [asyncio.ensure_future(self._flush_timer()), asyncio.ensure_future(self._consume())]
+        listening = {'tcp': tcp, 'udp': udp, 'http': http}
+        print(f"ingesting on { {k: v for k, v in listening.items() if v} }", file=sys.stderr, flush=True)
+        try:
+            while True:
+                await asyncio.sleep(report_every or 3600)
+                if report_every:
+                    print(json.dumps(dict(self.detector.stats(), queued_batches=self.queue.qsize(),
+                                          dropped=self.dropped)), file=sys.stderr, flush=True)
+        finally:
+            for t in tasks:
+                t.cancel()
+            for s in servers:
+                s.close()
+
+
+_REASONS = {200: 'OK', 202: 'Accepted', 404: 'Not Found', 503: 'Service Unavailable'}
+
+
+def _host_port(address):
+    host, port = address.rsplit(':', 1)
+    return host, int(port)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Async TCP / UDP / HTTP event ingestion with micro-batched detection.")
+    parser.add_argument('--tcp', metavar='HOST:PORT', help="accept newline-delimited events on a TCP port")
+    parser.add_argument('--udp', metavar='HOST:PORT', help="accept newline-delimited events in UDP datagrams")
+    parser.add_argument('--http', metavar='HOST:PORT', help="accept POST /events; serves /stats and /metrics")
+    parser.add_argument('--format', choices=FORMATS, default='json', help="TCP / UDP event encoding")
+    parser.add_argument('--baseline', default='synthetic_logs_enhanced.csv',
+                        help="log file the dashboard thresholds are learned from")
+    parser.add_argument('--batch-rows', type=int, default=BATCH_ROWS, help="events per micro-batch")
+    parser.add_argument('--max-delay-ms', type=float, default=MAX_DELAY * 1000,
+                        help="flush a partial batch once its oldest event is this old")
+    parser.add_argument('--queue-batches', type=int, default=QUEUE_BATCHES,
+                        help="micro-batches waiting for detection before producers are throttled")
+    parser.add_argument('--retention', type=int, default=RETENTION_MINUTES,
+                        help="minutes of per-key counts kept for late events")
+    parser.add_argument('--trend-minutes', type=int, default=TREND_MINUTES,
+                        help="minutes of product buckets the trending stats are computed over")
+    parser.add_argument('--adaptive', action='store_true',
+                        help="keep learning the thresholds from the stream, seeded from --baseline")
+    parser.add_argument('--halflife', default=f'{HALFLIFE / 3600:g}h',
+                        help="--adaptive: event time over which a value's weight halves ('none' = no decay)")
+    parser.add_argument('--product-warmup', type=float, metavar='N',
+                        help=f"--adaptive: per-product spike thresholds once a product has N minutes of weight"
+                             f" (e.g. {WARMUP}); default one threshold for all products")
+    parser.add_argument('--count-floor', action='store_true',
+                        help="--adaptive: floor the std of per-minute counts at sqrt(mean) (Poisson noise)")
+    parser.add_argument('--alerts', help="append alerts to this JSON-lines file instead of stdout")
+    parser.add_argument('--report-every', type=float, default=10.0, help="seconds between stats lines on stderr")
+    add_arguments(parser)
+    args = parser.parse_args()
+    if not (args.tcp or args.udp or args.http):
+        parser.error("give at least one of --tcp, --udp, --http")
+
+    baseline = load_logs(args.baseline)
+    adaptive = None
+    if args.adaptive:
+        # the baseline stands for the history just before startup
+        baseline['timestamp'] += pd.Timestamp.now().floor('1Min') - baseline['timestamp'].max()
+        adaptive = AdaptiveThresholds(halflife_seconds(args.halflife), warmup=args.product_warmup,
+                                      count_floor=args.count_floor).fit(threshold_values(baseline))
+        thresholds = adaptive.current()
+    else:
+        thresholds = dashboard_thresholds(baseline)
+    print(f"thresholds: { {k: round(float(v), 3) for k, v in thresholds.items()} }", file=sys.stderr)
+    emit = None
+    if args.alerts:
+        out = open(args.alerts, 'a', buffering=1)
+        emit = lambda alert: out.write(json.dumps(alert) + '\n')  # noqa: E731
+    detector = BatchDetector(thresholds, args.retention, args.trend_minutes, emit, adaptive)
+
+    async def run():
+        ingest = Ingest(detector, args.format, args.batch_rows, args.max_delay_ms / 1000, args.queue_batches)
+        await ingest.serve(args.tcp, args.udp, args.http, args.report_every)
+
+    with instrumented(args, 'ingest'):
+        try:
+            asyncio.run(run())
+        except KeyboardInterrupt:
+            pass
+    print(json.dumps(detector.stats()), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,420 @@
+# ip_scoring.py
+# Scoring stages shared by the batch and streaming paths of block_suspicious_ips.py
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from log_stream import CHUNK_ROWS, IPAggregator, MinuteAggregator, SketchIPAggregator, iter_log_chunks
+from metrics import counter, histogram, timed, timer
+from parallel import map_shards
+from rule_engine import evaluate
+from sql_scanner import is_sql_payload
+
+EPS = 1e-9
+SEQ_LEN = 5
+LSTM_BATCH = 4096
+AE_BATCH = 4096
+LSTM_FEATURES = ['reqs', 'failed_logins', 'mean_rt']
+IP_AGG_COLUMNS = ['total_requests', 'failed_logins', 'avg_response_time', 'mass_clicks']
+FEATURES = ['response_time', 'total_requests', 'failed_logins', 'mass_clicks', 'avg_response_time']
+
+# intensity multiplier mapping
+INTENSITY_MULTIPLIER = {
+    "DDoS Attack": 1.3,
+    "High Response Time": 1.0,
+    "Brute Force Login": 0.9,
+    "SQL Injection Attempt": 1.4,
+    "Data Exfiltration": 1.5,
+    "Privilege Escalation": 1.6,
+    "Mass Clicks / Bot": 0.8,
+    "IP Abuse": 1.0,
+    "Suspicious Behavior": 0.6,
+    None: 0.0
+}
+
+
+def norm(x, lo, hi):
+    return (x - lo) / ((hi - lo) + EPS)
+
+
+# -----------------------------
+# Feature engineering
+# -----------------------------
+def ip_aggregates(logs):
+    """Basic aggregations per ip (for event signals)."""
+    ip_agg = pd.DataFrame({
+        'ip_address': logs['ip_address'],
+        'event_type': logs['event_type'],
+        'failed': (logs['login_status'] == 'failed').astype(np.int64),
+        'click': (logs['event_type'] == 'click').astype(np.int64),
+        'response_time': logs['response_time'],
+    }).groupby('ip_address', observed=True).agg(
+        total_requests=('event_type','count'),
+        failed_logins=('failed','sum'),
+        avg_response_time=('response_time','mean'),
+        mass_clicks=('click','sum'),
+    )
+    return ip_agg.reset_index()
+
+
+def per_minute_features(logs):
+    """Per-ip time-ordered feature rows (per-minute aggregation) for the LSTM AE."""
+    return pd.DataFrame({
+        'ip_address': logs['ip_address'],
+        'minute': logs['timestamp'].dt.floor('1Min'),
+        'event_type': logs['event_type'],
+        'failed': (logs['login_status'] == 'failed').astype(np.int64),
+        'response_time': logs['response_time'],
+    }).groupby(['ip_address', 'minute'], observed=True).agg(
+        reqs=('event_type','count'),
+        failed_logins=('failed','sum'),
+        mean_rt=('response_time','mean')
+    ).reset_index()
+
+
+def attach_signals(logs, ip_agg, lstm_df):
+    """Join per-ip aggregates and per-minute LSTM errors onto raw log rows."""
+    logs = logs.drop(columns=[c for c in IP_AGG_COLUMNS if c in logs.columns])
+    for c in ['sql_flag', 'anomaly_type']:
+        if c not in logs.columns:
+            logs[c] = 0
+    # Join these back to logs (so each row gets ip-agg signals)
+    logs = logs.merge(ip_agg, on='ip_address', how='left')
+    for f in FEATURES:
+        if f not in logs.columns:
+            logs[f] = 0
+    logs['minute'] = logs['timestamp'].dt.floor('1Min')
+    logs = logs.merge(lstm_df, on=['ip_address','minute'], how='left')
+    logs['lstm_mse'] = logs['lstm_mse'].fillna(0)
+    return logs
+
+
+# -----------------------------
+# Model scores
+# -----------------------------
+def ae_scores(logs, scaler, autoencoder):
+    X = logs[FEATURES].fillna(0).values
+    X_scaled = scaler.transform(X)
+    recon = predict_fixed_batches(autoencoder, X_scaled, AE_BATCH, name='ae')
+    return np.mean(np.power(X_scaled - recon, 2), axis=1)
+
+
+def predict_fixed_batches(model, x, batch_size, name='lstm'):
+    """Run the model over `x` in equally sized batches.
+
+    The tail is zero-padded up to a whole batch so every call sees the same
+    input shape and the graph is traced once. Each batch's latency goes to
+    inference_batch_seconds{model=name}.
+    """
+    n = len(x)
+    if n == 0:
+        return np.empty_like(x, dtype=np.float32)
+    pad = -n % batch_size
+    if pad:
+        x = np.concatenate([x, np.zeros((pad,) + x.shape[1:], dtype=x.dtype)])
+    x = x.astype(np.float32, copy=False)
+    latency = histogram('inference_batch_seconds', 'model latency per fixed-size batch', model=name)
+    on_batch = getattr(model, 'predict_on_batch', None)
+    out = []
+    for i in range(0, len(x), batch_size):
+        with latency.time():
+            if on_batch is not None:
+                pred = on_batch(x[i:i + batch_size])
+            else:
+                pred = model.predict(x[i:i + batch_size], batch_size=batch_size, verbose=0)
+        out.append(np.asarray(pred))
+    return np.concatenate(out)[:n]
+
+
+def lstm_windows(per_min, seq_len=SEQ_LEN):
+    """All `seq_len`-minute windows of every IP, min-max scaled per IP.
+
+    Returns (windows, end_rows): windows has shape (n_windows, seq_len, 3) and
+    end_rows indexes the last per_min row of each window. per_min must be
+    sorted by (ip_address, minute).
+    """
+    arr = per_min[LSTM_FEATURES].fillna(0).to_numpy(dtype=np.float64)
+    codes = pd.factorize(per_min['ip_address'])[0]
+    if len(arr) < seq_len:
+        return np.empty((0, seq_len, arr.shape[1])), np.empty(0, dtype=np.int64)
+
+    # per-ip min-max scaling (same as a MinMaxScaler fitted on each ip's rows)
+    starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+    sizes = np.diff(np.r_[starts, len(arr)])
+    lo = np.minimum.reduceat(arr, starts, axis=0)
+    span = np.maximum.reduceat(arr, starts, axis=0) - lo
+    span[span == 0] = 1.0
+    scaled = (arr - np.repeat(lo, sizes, axis=0)) / np.repeat(span, sizes, axis=0)
+
+    # a window is valid when its first and last row belong to the same ip
+    view = np.lib.stride_tricks.sliding_window_view(scaled, seq_len, axis=0).transpose(0, 2, 1)
+    first = np.flatnonzero(codes[:1 - seq_len or None] == codes[seq_len - 1:])
+    return view[first], first + seq_len - 1
+
+
+def lstm_scores(per_min, lstm_ae, seq_len=SEQ_LEN, batch_size=LSTM_BATCH):
+    """Reconstruction error of every `seq_len`-minute window, keyed by (ip, last minute)."""
+    per_min = per_min.sort_values(['ip_address', 'minute'], kind='mergesort')
+    seqs, end_rows = lstm_windows(per_min, seq_len)
+    pred = predict_fixed_batches(lstm_ae, seqs, batch_size)
+    mse_seq = np.mean(np.power(seqs - pred, 2), axis=(1,2))
+    # map mse back to minutes: assign each minute (end of window) that mse
+    return pd.DataFrame({
+        'ip_address': per_min['ip_address'].to_numpy()[end_rows],
+        'minute': per_min['minute'].to_numpy()[end_rows],
+        'lstm_mse': mse_seq,
+    }, columns=['ip_address', 'minute', 'lstm_mse'])
+
+
+def _lstm_shard(per_min, lstm_ae, seq_len, batch_size):
+    return lstm_scores(per_min, lstm_ae, seq_len, batch_size)
+
+
+def sharded_lstm_scores(per_min, load_lstm, workers, seq_len=SEQ_LEN, batch_size=LSTM_BATCH):
+    """lstm_scores() with IPs hash-sharded over `workers` processes.
+
+    Each worker builds its own model with `load_lstm()`; rows come back in the
+    same (ip, minute) order as the serial call.
+    """
+    return map_shards(per_min, 'ip_address', _lstm_shard, workers, loader=load_lstm,
+                      args=(seq_len, batch_size), sort_by=['ip_address', 'minute'])
+
+
+def lstm_frame(per_min, lstm_ae, workers=1, load_lstm=None):
+    if workers != 1 and load_lstm is not None:
+        return sharded_lstm_scores(per_min, load_lstm, workers)
+    return lstm_scores(per_min, lstm_ae)
+
+
+def event_score(logs, fl_max, tr_max, rt_max):
+    return (logs['failed_logins'] / (fl_max + EPS)) * 0.6 \
+        + (logs['total_requests'] / (tr_max + EPS)) * 0.6 \
+        + (logs['response_time'] / (rt_max + EPS)) * 0.5
+
+
+# -----------------------------
+# Classification
+# -----------------------------
+# Row-wise reference for rule_engine.RULES; kept for parity checks only.
+def classify(row):
+    tr = row['total_requests']
+    rt = row['response_time']
+    fl = row['failed_logins']
+    sql_flag = 1 if is_sql_payload(row.get('product_id','')) else 0
+    if tr > 50 or 'ddos' in str(row.get('anomaly_type','')).lower():
+        return "DDoS Attack", "Rate-limit / Block IP"
+    if rt > 3.0:
+        return "High Response Time", "Investigate servers / slow endpoints"
+    if fl >= 5:
+        return "Brute Force Login", "Block IP & enforce 2FA"
+    if sql_flag > 0:
+        return "SQL Injection Attempt", "Sanitize inputs & block payloads"
+    if row['composite_score'] > 0.6 and fl > 0:
+        return "Account Takeover Attempt", "Force password reset"
+    if row['composite_score'] > 0.7:
+        return "Suspicious Behavior", "Monitor & escalate"
+    return None, None
+
+
+# -----------------------------
+# Batch path
+# -----------------------------
+def score_logs(logs, scaler, autoencoder, lstm_ae, workers=1, load_lstm=None):
+    """Score every row of an in-memory log frame; returns the enriched frame.
+
+    With workers != 1 and a `load_lstm` callable, LSTM window scoring is
+    sharded by IP over a process pool (see parallel.py).
+    """
+    counter('rows_processed_total', 'log rows scored').inc(len(logs))
+    with timer('ip_agg'):
+        ip_agg = ip_aggregates(logs)
+    counter('ips_scored_total', 'distinct IPs scored').inc(len(ip_agg))
+    with timer('lstm_windows'):
+        lstm_df = lstm_frame(per_minute_features(logs), lstm_ae, workers, load_lstm)
+    with timer('merge'):
+        logs = attach_signals(logs, ip_agg, lstm_df)
+    with timer('ae_predict'):
+        ae_mse = ae_scores(logs, scaler, autoencoder)
+    with timer('classify'):
+        return combine_scores(logs, ae_mse)
+
+
+def combine_scores(logs, ae_mse):
+    """Composite score, rule-engine label and intensity for rows with signals attached."""
+    logs['ae_mse'] = ae_mse
+    logs['ae_norm'] = norm(ae_mse, ae_mse.min(), ae_mse.max())
+    logs['lstm_norm'] = norm(logs['lstm_mse'], logs['lstm_mse'].min(), logs['lstm_mse'].max())
+
+    evt = event_score(logs, logs['failed_logins'].max(), logs['total_requests'].max(), logs['response_time'].max())
+    logs['event_norm'] = norm(evt, evt.min(), evt.max())
+
+    logs['composite_score'] = 0.5 * logs['ae_norm'] + 0.3 * logs['lstm_norm'] + 0.2 * logs['event_norm']
+    logs[['anomaly_name','recommendation']] = evaluate(logs)
+
+    comp = logs['composite_score']
+    comp_norm = norm(comp, comp.min(), comp.max())
+    logs['intensity'] = logs['anomaly_name'].map(INTENSITY_MULTIPLIER).fillna(0) * comp_norm
+    logs['is_anomaly'] = logs['anomaly_name'].notnull()
+    return logs
+
+
+@timed('report')
+def report_by_ip(logs):
+    """Aggregate report by IP."""
+    return (
+        logs[logs['is_anomaly']]
+        .groupby('ip_address')
+        .agg(
+            anomaly_name = ('anomaly_name', lambda x: x.mode()[0] if not x.mode().empty else x.iloc[0]),
+            recommendation = ('recommendation', lambda x: x.mode()[0] if not x.mode().empty else x.iloc[0]),
+            count = ('anomaly_name', 'count'),
+            avg_intensity = ('intensity', 'mean')
+        ).reset_index()
+    )
+
+
+# -----------------------------
+# Streaming path
+# -----------------------------
+def _add(state, part):
+    return part if state is None else state.add(part, fill_value=0)
+
+
+def _mode_by_ip(counts, column):
+    # Series.mode() sorts its values, so ties resolve to the smallest label
+    df = counts.rename('n').reset_index()
+    df = df.sort_values(['ip_address', 'n', column], ascending=[True, False, True], kind='mergesort')
+    return df.drop_duplicates('ip_address').set_index('ip_address')[column]
+
+
+class _MinMax:
+    def __init__(self):
+        self.lo = np.inf
+        self.hi = -np.inf
+
+    def update(self, x):
+        x = np.asarray(x, dtype=float)
+        if x.size and not np.isnan(x).all():
+            self.lo = min(self.lo, np.nanmin(x))
+            self.hi = max(self.hi, np.nanmax(x))
+
+
+def _chunks(path, chunksize, blocklist, now, count=False):
+    for chunk in iter_log_chunks(path, chunksize):
+        if blocklist is not None:
+            banned = blocklist.blocked(chunk['ip_address'], now)
+            if banned.any():
+                chunk = chunk[~banned].reset_index(drop=True)
+                if count:
+                    counter('rows_skipped_blocked_total', 'log rows of banned IPs not scored').inc(int(banned.sum()))
+        yield chunk
+
+
+def stream_report(path, scaler, autoencoder, lstm_ae, chunksize=CHUNK_ROWS, workers=1, load_lstm=None,
+                  blocklist=None, sketch=False):
+    """Build the per-IP report from a log file without holding its rows in memory.
+
+    Three passes over the file, each one chunk at a time:
+      1. per-IP and per-(IP, minute) aggregates, row count and max response time;
+      2. AE error per row (spilled to a scratch .npy memmap) and the global
+         min/max of every score that the batch path normalises;
+      3. composite score, classification and per-IP report accumulators.
+    Resident state is the aggregate tables and the report accumulators, so peak
+    memory follows the number of distinct IPs (and IP-minutes), not file size.
+    Returns the same frame as report_by_ip(score_logs(...)).
+
+    blocklist: rows of IPs it bans (as of the start of the run) are skipped
+    in every pass.
+
+    sketch: keep the per-IP aggregates in log_stream.SketchIPAggregator
+    (constant memory; counts are overestimated within its bound) and look
+    them up chunk by chunk. The per-(IP, minute) LSTM input is unchanged.
+    """
+    now = time.time()
+    # pass 1
+    ip_acc, min_acc, rt = SketchIPAggregator() if sketch else IPAggregator(), MinuteAggregator(), _MinMax()
+    n_rows = 0
+    with timer('ip_agg'):
+        for chunk in _chunks(path, chunksize, blocklist, now, count=True):
+            ip_acc.update(chunk)
+            min_acc.update(chunk)
+            rt.update(chunk['response_time'])
+            n_rows += len(chunk)
+        ip_agg = None if sketch else ip_acc.result()
+    counter('rows_processed_total', 'log rows scored').inc(n_rows)
+    counter('ips_scored_total', 'distinct IPs scored').inc(round(ip_acc.distinct_ips()) if sketch else len(ip_agg))
+    with timer('lstm_windows'):
+        lstm_df = lstm_frame(min_acc.result(), lstm_ae, workers, load_lstm)
+    if sketch:
+        fl_max = ip_acc.heaviest('failed_logins', 1)['failed_logins'].max()
+        tr_max = ip_acc.heaviest('total_requests', 1)['total_requests'].max()
+    else:
+        fl_max = ip_agg['failed_logins'].max()
+        tr_max = ip_agg['total_requests'].max()
+
+    def signals(chunk):
+        return attach_signals(chunk, ip_acc.lookup(chunk['ip_address']) if sketch else ip_agg, lstm_df)
+
+    with tempfile.TemporaryDirectory() as scratch:
+        ae_mse = np.lib.format.open_memmap(os.path.join(scratch, 'ae_mse.npy'), mode='w+',
+                                           dtype=np.float64, shape=(n_rows,))
+
+        # pass 2
+        ae, lstm, evt = _MinMax(), _MinMax(), _MinMax()
+        pos = 0
+        for chunk in _chunks(path, chunksize, blocklist, now):
+            with timer('merge'):
+                frame = signals(chunk)
+            with timer('ae_predict'):
+                mse = ae_scores(frame, scaler, autoencoder)
+            ae_mse[pos:pos + len(frame)] = mse
+            pos += len(frame)
+            ae.update(mse)
+            lstm.update(frame['lstm_mse'])
+            evt.update(event_score(frame, fl_max, tr_max, rt.hi))
+
+        # pass 3
+        comp = _MinMax()
+        names = recs = sums = None
+        pos = 0
+        for chunk in _chunks(path, chunksize, blocklist, now):
+            with timer('merge'):
+                frame = signals(chunk)
+            mse = np.asarray(ae_mse[pos:pos + len(frame)])
+            pos += len(frame)
+            frame['composite_score'] = 0.5 * norm(mse, ae.lo, ae.hi) \
+                + 0.3 * norm(frame['lstm_mse'], lstm.lo, lstm.hi) \
+                + 0.2 * norm(event_score(frame, fl_max, tr_max, rt.hi), evt.lo, evt.hi)
+            comp.update(frame['composite_score'])
+            with timer('classify'):
+                frame[['anomaly_name','recommendation']] = evaluate(frame)
+
+            anom = frame[frame['anomaly_name'].notnull()]
+            if anom.empty:
+                continue
+            ip = anom['ip_address']
+            mult = anom['anomaly_name'].map(INTENSITY_MULTIPLIER).fillna(0)
+            names = _add(names, anom.groupby(['ip_address', 'anomaly_name']).size())
+            recs = _add(recs, anom.groupby(['ip_address', 'recommendation']).size())
+            sums = _add(sums, pd.DataFrame({
+                'count': ip.groupby(ip).size(),
+                'weighted': (mult * anom['composite_score']).groupby(ip).sum(),
+                'weight': mult.groupby(ip).sum(),
+            }))
+        del ae_mse
+
+    if sums is None:
+        return pd.DataFrame(columns=['ip_address', 'anomaly_name', 'recommendation', 'count', 'avg_intensity'])
+    # mean(mult * (c - lo) / span) == (sum(mult * c) - lo * sum(mult)) / span / count
+    span = (comp.hi - comp.lo) + EPS
+    report = pd.DataFrame({
+        'anomaly_name': _mode_by_ip(names, 'anomaly_name'),
+        'recommendation': _mode_by_ip(recs, 'recommendation'),
+        'count': sums['count'].astype(np.int64),
+        'avg_intensity': (sums['weighted'] - comp.lo * sums['weight']) / span / sums['count'],
+    })
+    report.index.name = 'ip_address'
+    return report.sort_index().reset_index()
@@ -0,0 +1,94 @@
+# loadgen.py
+# Load generator for realtime_detector.py built on simulate_logs.generate_logs().
+#
+#   python loadgen.py --connect 127.0.0.1:9999 --rate 20000 --duration 30
+#   python loadgen.py --append data/live_logs.csv --rate 5000
+#
+# Generated rows are ordered by their simulated timestamp (so DDoS bursts stay
+# together) and replayed at --rate events/sec, re-stamped with the current wall
+# time. Every event carries `sent_at` so the detector can report end-to-end
+# alert latency.
+import argparse
+import csv
+import json
+import socket
+import sys
+import time
+from datetime import datetime
+
+from simulate_logs import generate_logs
+
+COLUMNS = ['timestamp', 'user_id', 'ip_address', 'region', 'device_type', 'product_id',
+           'event_type', 'login_status', 'response_time', 'anomaly_type']
+
+
+def event_pool(rows):
+    df = generate_logs(num_rows=rows).sort_values('timestamp', kind='mergesort')
+    return df[COLUMNS[1:]].to_dict('records')
+
+
+def socket_sink(address):
+    host, port = address.rsplit(':', 1)
+    sock = socket.create_connection((host, int(port)))
+
+    def send(batch):
+        sock.sendall(''.join(json.dumps(e) + '\n' for e in batch).encode())
+    return send
+
+
+def file_sink(path):
+    fh = open(path, 'a', newline='', buffering=1 << 16)
+    writer = csv.DictWriter(fh, fieldnames=COLUMNS + ['sent_at'])
+    if fh.tell() == 0:
+        writer.writeheader()
+
+    def send(batch):
+        writer.writerows(batch)
+        fh.flush()
+    return send
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay synthetic logs into the real-time detector.")
+    dst = parser.add_mutually_exclusive_group(required=True)
+    dst.add_argument('--connect', help="HOST:PORT of realtime_detector.py --listen")
+    dst.add_argument('--append', help="CSV file followed by realtime_detector.py --tail")
+    parser.add_argument('--rate', type=float, default=10_000, help="target events per second")
+    parser.add_argument('--duration', type=float, default=30, help="seconds to run")
+    parser.add_argument('--pool', type=int, default=50_000, help="normal rows generated per replay pool")
+    parser.add_argument('--tick', type=float, default=0.01, help="seconds between sent batches")
+    args = parser.parse_args()
+
+    send = socket_sink(args.connect) if args.connect else file_sink(args.append)
+    pool = event_pool(args.pool)
+    per_tick = max(1, int(args.rate * args.tick))
+
+    sent = 0
+    pos = 0
+    started = time.time()
+    while True:
+        now = time.time()
+        if now - started >= args.duration:
+            break
+        batch = []
+        stamp = datetime.fromtimestamp(now).isoformat(sep=' ')
+        for _ in range(per_tick):
+            event = dict(pool[pos], timestamp=stamp, sent_at=now)
+            batch.append(event)
+            pos += 1
+            if pos == len(pool):
+                pos = 0
+        send(batch)
+        sent += len(batch)
+        # pace to the target rate
+        ahead = sent / args.rate - (time.time() - started)
+        if ahead > 0:
+            time.sleep(ahead)
+
+    elapsed = time.time() - started
+    print(json.dumps({'sent': sent, 'seconds': round(elapsed, 2), 'events_per_sec': round(sent / elapsed, 1)}),
+          file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
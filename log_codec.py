@@ -0,0 +1,63 @@
+# log_codec.py
+# Compact in-memory representation of log frames.
+#
+#   ip_address          dotted string -> uint32
+#   user_id, product_id object string -> categorical (interned int codes + lookup table)
+#   enum-like columns   object string -> categorical
+#
+# Groupbys and merges then hash fixed-width integers instead of Python strings.
+# expand_logs() / int_to_ip() map compact frames back to strings for reports.
+import socket
+import struct
+
+import numpy as np
+import pandas as pd
+
+from log_store import DICT_COLUMNS, load_logs
+
+ID_COLUMNS = ['user_id', 'product_id']
+
+
+def ip_to_int(values):
+    """Dotted IPv4 strings -> uint32 array (each distinct address is parsed once)."""
+    codes, uniques = pd.factorize(pd.Series(values), use_na_sentinel=True)
+    if (codes < 0).any():
+        raise ValueError("ip_address contains missing values")
+    ints = np.fromiter((struct.unpack('!I', socket.inet_aton(u))[0] for u in uniques),
+                       dtype=np.uint32, count=len(uniques))
+    return ints[codes]
+
+
+def int_to_ip(values):
+    """uint32 (or float with NaN) array -> dotted IPv4 strings; NaN -> None."""
+    values = pd.Series(values)
+    codes, uniques = pd.factorize(values)
+    strings = np.array([socket.inet_ntoa(struct.pack('!I', int(u))) for u in uniques] + [None], dtype=object)
+    return strings[codes]
+
+
+def compact_logs(logs):
+    """Return a copy of `logs` with compact dtypes (see module header)."""
+    out = logs.copy()
+    if 'ip_address' in out.columns and out['ip_address'].dtype != np.uint32:
+        out['ip_address'] = ip_to_int(out['ip_address'])
+    for c in ID_COLUMNS + DICT_COLUMNS:
+        if c in out.columns and not isinstance(out[c].dtype, pd.CategoricalDtype):
+            out[c] = out[c].astype('category')
+    return out
+
+
+def expand_logs(logs):
+    """Inverse of compact_logs: plain string columns again."""
+    out = logs.copy()
+    if 'ip_address' in out.columns and out['ip_address'].dtype.kind in 'uif':
+        out['ip_address'] = int_to_ip(out['ip_address'])
+    for c in ID_COLUMNS + DICT_COLUMNS:
+        if c in out.columns and isinstance(out[c].dtype, pd.CategoricalDtype):
+            out[c] = out[c].astype(object).where(out[c].notna(), None)
+    return out
+
+
+def load_compact_logs(source, columns=None, start=None, end=None):
+    """load_logs() followed by compact_logs(); stores hand categoricals over directly."""
+    return compact_logs(load_logs(source, columns=columns, start=start, end=end, categorical=True))
@@ -0,0 +1,186 @@
+# log_store.py
+# Columnar (Parquet) log store partitioned by day/hour, and the one loader every
+# analysis script reads its logs through.
+#
+#   python log_store.py convert data/simulated_logs.csv data/log_store
+#   LOG_STORE=data/log_store python dashboard.py
+#
+# load_logs() accepts either a CSV file or a store directory. Against a store it
+# reads only the requested columns and only the date=/hour= partitions that
+# overlap [start, end), so scripts skip CSV parsing and date parsing entirely.
+# Enum-like columns are stored dictionary-encoded. pyarrow is only needed when a
+# store is actually written or read.
+import argparse
+import os
+import uuid
+
+import pandas as pd
+
+from log_stream import CHUNK_ROWS, iter_log_chunks
+
+DICT_COLUMNS = ['region', 'device_type', 'event_type', 'login_status', 'anomaly_type']
+PARTITION_COLUMNS = ['date', 'hour']
+ROW_GROUP_ROWS = 128_000
+
+
+def default_source(csv_path):
+    """The store named by $LOG_STORE if set, otherwise the script's own CSV."""
+    return os.environ.get('LOG_STORE') or csv_path
+
+
+def is_store(source):
+    return os.path.isdir(source)
+
+
+# -----------------------------
+# Writing
+# -----------------------------
+def _schema(chunk):
+    import pyarrow as pa
+    schema = pa.Schema.from_pandas(chunk, preserve_index=False)
+    for i, name in enumerate(schema.names):
+        if name == 'timestamp':
+            schema = schema.set(i, pa.field(name, pa.timestamp('us')))
+        elif name in DICT_COLUMNS:
+            schema = schema.set(i, pa.field(name, pa.dictionary(pa.int32(), pa.string())))
+    return schema.append(pa.field('date', pa.string())).append(pa.field('hour', pa.int8()))
+
+
+def _batches(chunks, schema):
+    import pyarrow as pa
+    for chunk in chunks:
+        chunk = chunk.copy()
+        chunk['date'] = chunk['timestamp'].dt.strftime('%Y-%m-%d')
+        chunk['hour'] = chunk['timestamp'].dt.hour.astype('int8')
+        for c in DICT_COLUMNS:
+            if c in chunk.columns:
+                chunk[c] = chunk[c].astype('string')
+        yield from pa.Table.from_pandas(chunk, schema=schema, preserve_index=False).to_batches()
+
+
+def write_store(chunks, store_dir):
+    """Append an iterable of log frames to the store at `store_dir`."""
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    chunks = iter(chunks)
+    first = next(chunks, None)
+    if first is None:
+        return
+    schema = _schema(first)
+
+    def all_chunks():
+        yield first
+        yield from chunks
+
+    ds.write_dataset(
+        _batches(all_chunks(), schema), store_dir, schema=schema, format='parquet',
+        partitioning=ds.partitioning(pa.schema([schema.field(c) for c in PARTITION_COLUMNS]), flavor='hive'),
+        basename_template=f'part-{uuid.uuid4().hex}-{{i}}.parquet',
+        existing_data_behavior='overwrite_or_ignore',
+        # buffer rows per partition so row groups are not one per incoming chunk
+        min_rows_per_group=ROW_GROUP_ROWS, max_rows_per_group=ROW_GROUP_ROWS,
+    )
+
+
+def convert_csv(csv_path, store_dir, chunksize=CHUNK_ROWS):
+    write_store(iter_log_chunks(csv_path, chunksize), store_dir)
+
+
+# -----------------------------
+# Reading
+# -----------------------------
+def _time_filter(start, end):
+    import pyarrow.dataset as ds
+    date, hour, ts = ds.field('date'), ds.field('hour'), ds.field('timestamp')
+    expr = None
+
+    def both(a, b):
+        return b if a is None else a & b
+
+    if start is not None:
+        start = pd.Timestamp(start)
+        day = start.strftime('%Y-%m-%d')
+        expr = both(expr, (date > day) | ((date == day) & (hour >= start.hour)))
+        expr = both(expr, ts >= start.to_pydatetime())
+    if end is not None:
+        end = pd.Timestamp(end)
+        day = end.strftime('%Y-%m-%d')
+        expr = both(expr, (date < day) | ((date == day) & (hour <= end.hour)))
+        expr = both(expr, ts < end.to_pydatetime())
+    return expr
+
+
+def _dataset(store_dir):
+    import pyarrow.dataset as ds
+    return ds.dataset(store_dir, format='parquet', partitioning='hive')
+
+
+def _to_frame(table, categorical):
+    df = table.to_pandas()
+    if not categorical:
+        for c in DICT_COLUMNS:
+            if c in df.columns:
+                df[c] = df[c].astype(object).where(df[c].notna(), None)
+    return df
+
+
+def _store_columns(columns):
+    if columns is None:
+        return None
+    return [c for c in columns if c not in PARTITION_COLUMNS]
+
+
+def load_logs(source, columns=None, start=None, end=None, categorical=False):
+    """Load logs from a CSV file or a store directory.
+
+    columns: subset to read (timestamp is always included).
+    start, end: optional [start, end) time range.
+    categorical: keep dictionary-encoded columns as pandas categoricals.
+    """
+    if columns is not None and 'timestamp' not in columns:
+        columns = ['timestamp'] + list(columns)
+    if not is_store(source):
+        logs = pd.read_csv(source, usecols=columns, parse_dates=['timestamp'])
+        if start is not None:
+            logs = logs[logs['timestamp'] >= pd.Timestamp(start)]
+        if end is not None:
+            logs = logs[logs['timestamp'] < pd.Timestamp(end)]
+        return logs.reset_index(drop=True) if start is not None or end is not None else logs
+
+    dataset = _dataset(source)
+    cols = _store_columns(columns) or [n for n in dataset.schema.names if n not in PARTITION_COLUMNS]
+    table = dataset.to_table(columns=cols, filter=_time_filter(start, end))
+    return _to_frame(table, categorical)
+
+
+def iter_store_chunks(store_dir, chunksize=CHUNK_ROWS, columns=None, start=None, end=None):
+    """Yield the store as DataFrames of at most `chunksize` rows.
+
+    Rows come out in the same order on every call, which the multi-pass
+    streaming scorer relies on.
+    """
+    dataset = _dataset(store_dir)
+    cols = _store_columns(columns) or [n for n in dataset.schema.names if n not in PARTITION_COLUMNS]
+    scanner = dataset.scanner(columns=cols, filter=_time_filter(start, end), batch_size=chunksize,
+                              use_threads=False)
+    for batch in scanner.to_batches():
+        if batch.num_rows:
+            yield _to_frame(batch, categorical=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Columnar log store utilities.")
+    sub = parser.add_subparsers(dest='command', required=True)
+    conv = sub.add_parser('convert', help="convert a CSV log into a partitioned store")
+    conv.add_argument('csv_path')
+    conv.add_argument('store_dir')
+    conv.add_argument('--chunksize', type=int, default=CHUNK_ROWS)
+    args = parser.parse_args()
+
+    if args.command == 'convert':
+        convert_csv(args.csv_path, args.store_dir, args.chunksize)
+        print(f"✅ {args.csv_path} converted to {args.store_dir}")
+
+
+if __name__ == '__main__':
+    main()
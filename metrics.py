@@ -0,0 +1,286 @@
+# metrics.py
+# Stage timers, counters and latency histograms for the pipeline scripts,
+# exposed in the Prometheus text format.
+#
+#   python block_suspicious_ips.py --metrics-file metrics/bsi.prom    # node_exporter textfile collector
+#   python block_suspicious_ips.py --metrics-port 9108                # GET /metrics while running
+#   python block_suspicious_ips.py --metrics-port 9108 --metrics-host 0.0.0.0   # ... from other hosts
+#   python block_suspicious_ips.py --profile bsi.prof                 # cProfile the whole run
+#   kill -USR1 <pid>                                                  # toggle cProfile on a running script
+#
+#   with metrics.timer('ip_agg'): ...          @metrics.timed('report')
+#   metrics.counter('rows_processed_total').inc(len(logs))
+#   with metrics.histogram('inference_batch_seconds', model='lstm').time(): ...
+#
+# Metrics live in one process-wide registry; recording costs a dict lookup and
+# an add, so the calls stay in place whether or not anything is exported.
+# Stages are ordinary named functions and `with` blocks, so external samplers
+# such as `py-spy record --pid <pid>` attribute time to them as well.
+# The /metrics endpoint has no authentication, so it listens on loopback unless
+# --metrics-host says otherwise.
+import bisect
+import cProfile
+import functools
+import os
+import signal
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+STAGE_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0)
+METRICS_HOST = '127.0.0.1'
+
+
+# -----------------------------
+# Metric types
+# -----------------------------
+class Counter:
+    kind = 'counter'
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, n=1):
+        self.value += n
+
+    def samples(self, name, labels):
+        yield name, labels, self.value
+
+
+class Gauge:
+    kind = 'gauge'
+
+    def __init__(self):
+        self.value = 0
+
+    def set(self, value):
+        self.value = value
+
+    def samples(self, name, labels):
+        yield name, labels, self.value
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    @contextmanager
+    def time(self):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - t0)
+
+    def samples(self, name, labels):
+        running = 0
+        for bound, n in zip(self.buckets + (float('inf'),), self.counts):
+            running += n
+            le = '+Inf' if bound == float('inf') else repr(bound)
+            yield f'{name}_bucket', labels + (('le', le),), running
+        yield f'{name}_sum', labels, self.sum
+        yield f'{name}_count', labels, running
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._help = {}
+        self._lock = threading.Lock()
+        self.const_labels = ()
+
+    def _get(self, cls, name, help, labels, **kwargs):
+        key = (name, tuple(sorted(labels.items())))
+        metric = self._metrics.get(key)
+        if metric is None:
+            with self._lock:
+                metric = self._metrics.get(key)
+                if metric is None:
+                    metric = self._metrics[key] = cls(**kwargs)
+                    self._help.setdefault(name, (cls.kind, help))
+        return metric
+
+    def counter(self, name, help='', **labels):
+        return self._get(Counter, name, help, labels)
+
+    def gauge(self, name, help='', **labels):
+        return self._get(Gauge, name, help, labels)
+
+    def histogram(self, name, help='', buckets=LATENCY_BUCKETS, **labels):
+        return self._get(Histogram, name, help, labels, buckets=buckets)
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            items = sorted(self._metrics.items(), key=lambda kv: kv[0])
+        seen = set()
+        for (name, labels), metric in items:
+            if name not in seen:
+                seen.add(name)
+                kind, help = self._help[name]
+                if help:
+                    lines.append(f'# HELP {name} {help}')
+                lines.append(f'# TYPE {name} {kind}')
+            for sample, sample_labels, value in metric.samples(name, self.const_labels + labels):
+                lines.append(f'{sample}{_labels(sample_labels)} {_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+def _labels(pairs):
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+
+def _value(v):
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+REGISTRY = Registry()
+counter = REGISTRY.counter
+gauge = REGISTRY.gauge
+histogram = REGISTRY.histogram
+
+
+# -----------------------------
+# Stage timers
+# -----------------------------
+@contextmanager
+def timer(stage):
+    """Time a pipeline stage into stage_seconds{stage=...}."""
+    with histogram('stage_seconds', 'wall time per pipeline stage', buckets=STAGE_BUCKETS, stage=stage).time():
+        yield
+
+
+def timed(stage):
+    """Decorator form of timer()."""
+    def wrap(fn):
+        @functools.wraps(fn)
+        def inner(*args, **kwargs):
+            with timer(stage):
+                return fn(*args, **kwargs)
+        return inner
+    return wrap
+
+
+# -----------------------------
+# Export
+# -----------------------------
+def write_textfile(path):
+    """Write the registry to `path` atomically (node_exporter textfile collector friendly)."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'w') as fh:
+        fh.write(REGISTRY.render())
+    os.replace(tmp, path)
+
+
+def serve(port, host=METRICS_HOST):
+    """Serve GET /metrics from a daemon thread; returns the server."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = REGISTRY.render().encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+# -----------------------------
+# Profiling
+# -----------------------------
+class Profiler:
+    """cProfile that can be switched on and off while the process runs.
+
+    Every stop() dumps the stats collected so far to `path`.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._profile = None
+
+    @property
+    def active(self):
+        return self._profile is not None
+
+    def start(self):
+        if self._profile is None:
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+
+    def stop(self):
+        if self._profile is not None:
+            self._profile.disable()
+            self._profile.dump_stats(self.path)
+            self._profile = None
+            print(f"profile written to {self.path}", file=sys.stderr)
+
+    def toggle(self, *_):
+        self.stop() if self.active else self.start()
+
+
+# -----------------------------
+# Script integration
+# -----------------------------
+def add_arguments(parser):
+    group = parser.add_argument_group('metrics')
+    group.add_argument('--metrics-file', help="write Prometheus text metrics to this file at exit")
+    group.add_argument('--metrics-port', type=int, help="serve Prometheus metrics on this port while running")
+    group.add_argument('--metrics-host', default=METRICS_HOST,
+                       help="address --metrics-port listens on (0.0.0.0 exposes it on every interface)")
+    group.add_argument('--profile', metavar='PATH',
+                       help="cProfile the run into PATH (SIGUSR1 toggles profiling into the same file)")
+
+
+@contextmanager
+def instrumented(args, script):
+    """Export / profile a script run according to the add_arguments() flags.
+
+    SIGUSR1 toggles cProfile at run time (into --profile, or
+    <script>-<pid>.prof), so a long run can be profiled without a restart.
+    """
+    REGISTRY.const_labels = (('script', script),)
+    profiler = Profiler(args.profile or f'{script}-{os.getpid()}.prof')
+    if hasattr(signal, 'SIGUSR1'):
+        signal.signal(signal.SIGUSR1, profiler.toggle)
+    if args.metrics_port:
+        serve(args.metrics_port, args.metrics_host)
+    if args.profile:
+        profiler.start()
+    started = time.time()
+    try:
+        with timer('total'):
+            yield
+    finally:
+        profiler.stop()
+        gauge('last_run_timestamp_seconds', 'unix time the run started').set(started)
+        if args.metrics_file:
+            write_textfile(args.metrics_file)
@@ -0,0 +1,379 @@
+# model_registry.py
+# Lazy model loading, a NumPy export of the dense autoencoder, and a
+# long-lived scoring worker that keeps the models resident.
+#
+#   python model_registry.py export                          # models/autoencoder_full.h5 -> .npz
+#   python model_registry.py serve --listen 127.0.0.1:6100   # load once, answer predict requests
+#   python block_suspicious_ips.py --worker 127.0.0.1:6100   # score without loading any model
+#
+# ModelRegistry hands out proxies that load their model on first use, so a run
+# only pays for the models its stages actually touch. When a model has a .npz
+# export next to its .h5 file, the registry runs that with NumPy instead of
+# Keras and TensorFlow is never imported. Only stacks of Dense layers can be
+# exported; the LSTM autoencoder stays on Keras (or on a scoring worker).
+#
+# The worker speaks multiprocessing.connection (pickled messages, HMAC
+# handshake with the key in $SCORING_WORKER_KEY). RemoteModel is its client and
+# has the same predict / predict_on_batch interface as the local models.
+# Anyone holding the key can make the worker unpickle arbitrary data, so there
+# is no built-in key: clients refuse to connect without $SCORING_WORKER_KEY,
+# and a worker started without it makes up a random key for the run and prints
+# it (loopback and Unix socket addresses only; listening on any other address
+# needs the key set explicitly).
+import argparse
+import functools
+import ipaddress
+import os
+import secrets
+import socket
+import sys
+import threading
+import time
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Listener
+
+import numpy as np
+
+from metrics import timer
+
+MODELS_DIR = 'models'
+MODEL_FILES = {
+    'ae': 'autoencoder_full.h5',
+    'lstm': 'lstm_ae_full.h5',
+}
+SCALER_FILE = 'scaler.save'
+BACKENDS = ['auto', 'keras']
+AUTHKEY_ENV = 'SCORING_WORKER_KEY'
+WARM_BATCH = 4096
+
+
+# -----------------------------
+# NumPy forward pass
+# -----------------------------
+def _sigmoid(x):
+    return np.exp(-np.logaddexp(0, -x))
+
+
+ACTIVATIONS = {
+    'linear': lambda x: x,
+    'relu': lambda x: np.maximum(x, 0),
+    'sigmoid': _sigmoid,
+    'tanh': np.tanh,
+    'elu': lambda x: np.where(x > 0, x, np.expm1(np.minimum(x, 0))),
+    'softplus': lambda x: np.logaddexp(0, x),
+}
+# layers that are the identity at inference time
+PASSTHROUGH_LAYERS = {'InputLayer', 'Dropout', 'GaussianNoise', 'GaussianDropout'}
+
+
+class DenseNumpyModel:
+    """Inference-only stack of Dense layers (float32, like the Keras model)."""
+
+    def __init__(self, kernels, biases, activations):
+        unknown = set(activations) - set(ACTIVATIONS)
+        if unknown:
+            raise ValueError(f"unsupported activation(s): {sorted(unknown)}")
+        self.kernels = [np.asarray(k, dtype=np.float32) for k in kernels]
+        self.biases = [np.asarray(b, dtype=np.float32) for b in biases]
+        self.activations = list(activations)
+        self._fns = [ACTIVATIONS[a] for a in self.activations]
+
+    @property
+    def input_shape(self):
+        return (None, self.kernels[0].shape[0])
+
+    def predict_on_batch(self, x):
+        x = np.asarray(x, dtype=np.float32)
+        for kernel, bias, fn in zip(self.kernels, self.biases, self._fns):
+            x = fn(x @ kernel + bias)
+        return x
+
+    def predict(self, x, batch_size=None, verbose=0):
+        return self.predict_on_batch(x)
+
+    def save(self, path):
+        arrays = {'activations': np.array(self.activations)}
+        for i, (k, b) in enumerate(zip(self.kernels, self.biases)):
+            arrays[f'kernel_{i}'] = k
+            arrays[f'bias_{i}'] = b
+        np.savez(path, **arrays)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as f:
+            activations = [str(a) for a in f['activations']]
+            n = len(activations)
+            return cls([f[f'kernel_{i}'] for i in range(n)], [f[f'bias_{i}'] for i in range(n)], activations)
+
+
+def export_dense(model, path):
+    """Write a Keras model made only of Dense (and inference-time no-op) layers as a .npz file."""
+    kernels, biases, activations = [], [], []
+    for layer in model.layers:
+        kind = type(layer).__name__
+        if kind in PASSTHROUGH_LAYERS:
+            continue
+        if kind != 'Dense':
+            raise ValueError(f"cannot export layer {layer.name!r} of type {kind}; only Dense stacks are supported")
+        weights = layer.get_weights()
+        kernel = weights[0]
+        bias = weights[1] if len(weights) > 1 else np.zeros(kernel.shape[1], dtype=kernel.dtype)
+        kernels.append(kernel)
+        biases.append(bias)
+        activations.append(layer.get_config()['activation'])
+    exported = DenseNumpyModel(kernels, biases, activations)
+    exported.save(path)
+    return exported
+
+
+# -----------------------------
+# Loading
+# -----------------------------
+def load_keras(path):
+    from tensorflow.keras.models import load_model
+    # inference only: skip restoring the optimizer / loss
+    return load_model(path, compile=False)
+
+
+def numpy_export_path(path):
+    return os.path.splitext(path)[0] + '.npz'
+
+
+def load_model_file(path, backend='auto'):
+    """The model at `path`, from its NumPy export when there is one (backend 'auto')."""
+    with timer('load_model'):
+        npz = numpy_export_path(path)
+        if backend == 'auto' and os.path.exists(npz):
+            return DenseNumpyModel.load(npz)
+        return load_keras(path)
+
+
+def load_scaler(path):
+    import joblib
+    return joblib.load(path)
+
+
+class Lazy:
+    """Proxy that calls `loader()` on first attribute access and delegates to the result."""
+
+    def __init__(self, loader):
+        self._loader = loader
+        self._target = None
+
+    @property
+    def loaded(self):
+        return self._target is not None
+
+    def get(self):
+        if self._target is None:
+            self._target = self._loader()
+        return self._target
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self.get(), name)
+
+
+class ModelRegistry:
+    """Models and scaler of one models directory, each loaded on first use and then kept."""
+
+    def __init__(self, models_dir=MODELS_DIR, backend='auto'):
+        if backend not in BACKENDS:
+            raise ValueError(f"backend must be one of {BACKENDS}")
+        self.models_dir = models_dir
+        self.backend = backend
+        self._models = {}
+        self.scaler = Lazy(functools.partial(load_scaler, os.path.join(models_dir, SCALER_FILE)))
+
+    def path(self, name):
+        return os.path.join(self.models_dir, MODEL_FILES[name])
+
+    def loader(self, name):
+        """Picklable zero-argument callable that loads model `name` (for process-pool workers)."""
+        return functools.partial(load_model_file, self.path(name), self.backend)
+
+    def model(self, name):
+        if name not in self._models:
+            self._models[name] = Lazy(self.loader(name))
+        return self._models[name]
+
+    def loaded(self):
+        return sorted(name for name, proxy in self._models.items() if proxy.loaded)
+
+
+# -----------------------------
+# Scoring worker
+# -----------------------------
+def parse_address(address):
+    """'host:port' -> (host, port); anything else is a Unix socket path."""
+    host, sep, port = address.rpartition(':')
+    if sep and port.isdigit():
+        return host or '127.0.0.1', int(port)
+    return address
+
+
+def is_local(address):
+    """True for Unix socket paths and hosts that resolve only to loopback addresses."""
+    address = parse_address(address)
+    if not isinstance(address, tuple):
+        return True
+    try:
+        infos = socket.getaddrinfo(address[0], None)
+        return all(ipaddress.ip_address(info[4][0]).is_loopback for info in infos)
+    except (OSError, ValueError):
+        return False
+
+
+def authkey():
+    key = os.environ.get(AUTHKEY_ENV)
+    if not key:
+        raise RuntimeError(f"${AUTHKEY_ENV} is not set; export the key the scoring worker was started with")
+    return key.encode()
+
+
+def serving_key(address):
+    """$SCORING_WORKER_KEY, or a random key for this run (printed for the clients) on a local address."""
+    if os.environ.get(AUTHKEY_ENV):
+        return authkey()
+    if not is_local(address):
+        raise ValueError(f"${AUTHKEY_ENV} must be set to listen on non-loopback address {address}")
+    key = secrets.token_hex(32)
+    print(f"no ${AUTHKEY_ENV} set; clients need this run's key:\n  export {AUTHKEY_ENV}={key}",
+          file=sys.stderr, flush=True)
+    return key.encode()
+
+
+class ScoringWorker:
+    """Serves predict requests for the registry's models; one thread per client connection."""
+
+    def __init__(self, registry):
+        self.registry = registry
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def warm(self, names, batch=WARM_BATCH):
+        """Load models and run one batch through each so the first request is not a cold one."""
+        for name in names:
+            model = self.registry.model(name)
+            shape = (batch,) + tuple(model.input_shape[1:])
+            model.predict_on_batch(np.zeros(shape, dtype=np.float32))
+
+    def _reply(self, message):
+        op = message[0]
+        if op == 'predict':
+            _, name, x = message
+            with self._lock:  # one prediction at a time; Keras models are not re-entrant
+                self.requests += 1
+                return np.asarray(self.registry.model(name).predict_on_batch(x))
+        if op == 'ping':
+            return {'loaded': self.registry.loaded(), 'requests': self.requests, 'pid': os.getpid()}
+        raise ValueError(f"unknown request {op!r}")
+
+    def handle(self, conn):
+        with conn:
+            while True:
+                try:
+                    message = conn.recv()
+                except (EOFError, OSError):
+                    return
+                try:
+                    conn.send(('ok', self._reply(message)))
+                except Exception as exc:  # report to the client, keep serving
+                    conn.send(('error', f'{type(exc).__name__}: {exc}'))
+
+    def serve(self, address):
+        listener = Listener(parse_address(address), authkey=serving_key(address))
+        print(f"scoring worker listening on {address} (pid {os.getpid()})", file=sys.stderr, flush=True)
+        while True:
+            try:
+                conn = listener.accept()
+            except (OSError, AuthenticationError):
+                continue  # failed handshake
+            threading.Thread(target=self.handle, args=(conn,), daemon=True).start()
+
+
+class RemoteModel:
+    """Model `name` on a scoring worker, with the predict interface of a local model."""
+
+    def __init__(self, address, name):
+        self.address = address
+        self.name = name
+        self._conn = Client(parse_address(address), authkey=authkey())
+
+    def __reduce__(self):
+        # reconnect, rather than share the socket, in process-pool workers
+        return RemoteModel, (self.address, self.name)
+
+    def _call(self, *message):
+        self._conn.send(message)
+        status, payload = self._conn.recv()
+        if status != 'ok':
+            raise RuntimeError(f"scoring worker at {self.address}: {payload}")
+        return payload
+
+    def predict_on_batch(self, x):
+        return self._call('predict', self.name, np.ascontiguousarray(x, dtype=np.float32))
+
+    def predict(self, x, batch_size=None, verbose=0):
+        return self.predict_on_batch(x)
+
+    def ping(self):
+        return self._call('ping')
+
+    def close(self):
+        self._conn.close()
+
+
+def wait_for_worker(address, timeout=60.0):
+    """Block until a worker answers at `address`; returns its ping reply."""
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            client = RemoteModel(address, None)
+            try:
+                return client.ping()
+            finally:
+                client.close()
+        except (ConnectionError, FileNotFoundError):
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Model export and the resident scoring worker.")
+    parser.add_argument('--models', default=MODELS_DIR, help="directory with the .h5 models and scaler")
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('export', help="write a NumPy (.npz) export of the dense autoencoder")
+    serve = sub.add_parser('serve', help="keep the models loaded and answer predict requests")
+    serve.add_argument('--listen', default='127.0.0.1:6100',
+                       help=f"HOST:PORT or a Unix socket path (non-loopback hosts need ${AUTHKEY_ENV})")
+    serve.add_argument('--backend', choices=BACKENDS, default='auto',
+                       help="auto: use .npz exports where present; keras: always load the .h5 files")
+    serve.add_argument('--preload', nargs='*', default=list(MODEL_FILES), choices=list(MODEL_FILES),
+                       help="models to load and warm up before accepting requests")
+    ping = sub.add_parser('ping', help="check that a worker is up")
+    ping.add_argument('--connect', default='127.0.0.1:6100')
+    args = parser.parse_args()
+
+    if args.command == 'export':
+        path = os.path.join(args.models, MODEL_FILES['ae'])
+        model = load_keras(path)
+        exported = export_dense(model, numpy_export_path(path))
+        x = np.random.default_rng(0).random((WARM_BATCH,) + tuple(model.input_shape[1:]), dtype=np.float32)
+        diff = np.abs(np.asarray(model.predict(x, verbose=0)) - exported.predict_on_batch(x)).max()
+        print(f"✅ {numpy_export_path(path)} written ({len(exported.kernels)} Dense layers, "
+              f"max |keras - numpy| = {diff:.2e})")
+    elif args.command == 'serve':
+        if not os.environ.get(AUTHKEY_ENV) and not is_local(args.listen):
+            parser.error(f"--listen {args.listen} is not a loopback address; set ${AUTHKEY_ENV} first")
+        worker = ScoringWorker(ModelRegistry(args.models, args.backend))
+        worker.warm(args.preload)
+        worker.serve(args.listen)
+    elif args.command == 'ping':
+        print(wait_for_worker(args.connect, timeout=0))
+
+
+if __name__ == '__main__':
+    main()
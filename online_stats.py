@@ -0,0 +1,271 @@
+# online_stats.py
+# Per-key running statistics for adaptive thresholds: moments and quantiles
+# updated batch by batch (or value by value) in bounded memory.
+#
+#   m = Moments(halflife=6 * 3600)               # decayed over event time
+#   m.update(keys, values, times)                # arrays; times in epoch seconds
+#   m.add('P001', 12.0, time.time())             # one value, O(1)
+#   m.mean(['P001']), m.std(['P001'])
+#
+#   q = QuantileSketch(halflife=6 * 3600)
+#   q.update(keys, values, times)
+#   q.quantile(0.99, ['P001'])
+#
+# keys=None puts every value under a single key.
+#
+# Moments keeps the total weight, the mean and the sum of squared deviations of
+# each key (Welford). A batch is reduced to the same three numbers per key with
+# bincounts and merged in (Chan et al.), so a batch costs O(rows) numpy work
+# and a single value O(1). With halflife=None every value weighs 1 and the
+# moments are exactly those of everything seen so far (std uses ddof=1, like
+# pandas). With a halflife, a value's weight halves every `halflife` seconds of
+# event time, which makes the mean and variance an EWMA over time rather than
+# over the number of values; the std then reads the weights as frequencies.
+#
+# QuantileSketch is a relative-error log histogram (DDSketch): bucket i holds
+# the values in (gamma^(i-1), gamma^i] with gamma = (1 + a) / (1 - a), so a
+# quantile comes back within relative error a of a value of the right rank
+# (a = relative_accuracy, 1% by default), however many values were added.
+# The buckets cover a fixed [min_value, max_value] and values outside it are
+# counted in the end buckets, so every key costs n_buckets floats (about 1000,
+# 8 kB, for 1% over 1e-3..1e6). Use it for low-cardinality keys (categories,
+# products); Moments costs four floats per key and suits IPs. Counts decay
+# with the same halflife rule as Moments.
+import math
+
+import numpy as np
+import pandas as pd
+
+MIN_VALUE = 1e-3
+MAX_VALUE = 1e6
+RELATIVE_ACCURACY = 0.01
+
+
+class KeyIndex:
+    """Dense row numbers for arbitrary keys, in first-seen order."""
+
+    def __init__(self):
+        self._rows = {}
+
+    def __len__(self):
+        return len(self._rows)
+
+    def rows(self, keys, n):
+        """Row of every key (new keys are added); keys=None is one shared key."""
+        if keys is None:
+            return np.full(n, self._rows.setdefault(None, len(self._rows)), dtype=np.int64)
+        codes, uniques = pd.factorize(np.asarray(keys, dtype=object), use_na_sentinel=False)
+        rows = self._rows
+        known = np.fromiter((rows.setdefault(k, len(rows)) for k in uniques.tolist()), dtype=np.int64,
+                            count=len(uniques))
+        return known[codes]
+
+    def find(self, keys):
+        """Row of every key, -1 for keys never seen."""
+        if keys is None:
+            return np.array([self._rows.get(None, -1)])
+        rows = self._rows
+        return np.fromiter((rows.get(k, -1) for k in np.asarray(keys, dtype=object).tolist()), dtype=np.int64)
+
+
+def _grow(array, n, fill=0.0):
+    if n <= len(array):
+        return array
+    grown = np.full((max(n, 2 * len(array), 16),) + array.shape[1:], fill, dtype=array.dtype)
+    grown[:len(array)] = array
+    return grown
+
+
+class _Decayed:
+    """Keys, last-update times and the halflife rule shared by the sketches."""
+
+    def __init__(self, halflife=None):
+        self.halflife = halflife
+        self.keys = KeyIndex()
+        self.last = np.full(0, -np.inf)
+
+    def _prepare(self, keys, values, times):
+        """Rows touched by a batch, each value's row among them, its weight, and the decay of each row's state."""
+        values = np.asarray(values, dtype=np.float64).ravel()
+        rows = self.keys.rows(keys, len(values))
+        self._resize(len(self.keys))
+        touched, inverse = np.unique(rows, return_inverse=True)
+        if self.halflife is None or times is None:
+            return values, touched, inverse, np.ones(len(values)), np.ones(len(touched))
+        times = np.asarray(times, dtype=np.float64).ravel()
+        # decay each touched key to the later of its last update and its newest value
+        newest = np.full(len(touched), -np.inf)
+        np.maximum.at(newest, inverse, times)
+        last = self.last[touched]
+        ref = np.maximum(newest, last)
+        prior = np.where(np.isfinite(last), np.exp2(-(ref - last) / self.halflife), 1.0)
+        self.last[touched] = ref
+        return values, touched, inverse, np.exp2(-(ref[inverse] - times) / self.halflife), prior
+
+    def _decay_one(self, row, time):
+        """Weight of a value at `time` and the factor the key's state decays by."""
+        if self.halflife is None or time is None:
+            return 1.0, 1.0
+        last = self.last[row]
+        if time >= last:
+            self.last[row] = time
+            return 1.0, (math.exp2(-(time - last) / self.halflife) if last > -np.inf else 1.0)
+        return math.exp2(-(last - time) / self.halflife), 1.0
+
+
+class Moments(_Decayed):
+    """Per-key weight, mean and variance (Welford / Chan), optionally decayed in time."""
+
+    def __init__(self, halflife=None):
+        super().__init__(halflife)
+        self._weight = np.zeros(0)
+        self._mean = np.zeros(0)
+        self._m2 = np.zeros(0)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def _resize(self, n):
+        self._weight, self._mean, self._m2 = (_grow(a, n) for a in (self._weight, self._mean, self._m2))
+        self.last = _grow(self.last, n, -np.inf)
+
+    def update(self, keys, values, times=None):
+        values, touched, inverse, w, prior = self._prepare(keys, values, times)
+        if not len(values):
+            return self
+        n = len(touched)
+        wb = np.bincount(inverse, weights=w, minlength=n)
+        ok = wb > 0
+        mean_b = np.divide(np.bincount(inverse, weights=w * values, minlength=n), wb, out=np.zeros(n), where=ok)
+        m2_b = np.bincount(inverse, weights=w * (values - mean_b[inverse]) ** 2, minlength=n)
+
+        w0 = self._weight[touched] * prior
+        m0 = self._mean[touched]
+        total = w0 + wb
+        delta = mean_b - m0
+        share = np.divide(wb, total, out=np.zeros(n), where=total > 0)
+        self._weight[touched] = total
+        self._mean[touched] = np.where(ok, m0 + delta * share, m0)
+        self._m2[touched] = self._m2[touched] * prior + np.where(ok, m2_b + delta ** 2 * w0 * share, 0.0)
+        return self
+
+    def add(self, key, value, time=None):
+        """One value (West's weighted Welford step)."""
+        row = self.keys.rows(None if key is None else [key], 1)[0]
+        self._resize(len(self.keys))
+        w, decay = self._decay_one(row, time)
+        total = self._weight[row] * decay + w
+        delta = value - self._mean[row]
+        self._mean[row] += delta * w / total
+        self._m2[row] = self._m2[row] * decay + w * delta * (value - self._mean[row])
+        self._weight[row] = total
+        return self
+
+    def _pick(self, array, keys, fill=np.nan):
+        rows = self.keys.find(keys)
+        out = np.where(rows >= 0, array[np.maximum(rows, 0)] if len(array) else fill, fill)
+        return out[0] if keys is None else out
+
+    def weight(self, keys=None):
+        """Total weight per key at its last update (0 for unseen keys)."""
+        return self._pick(self._weight, keys, 0.0)
+
+    def mean(self, keys=None):
+        return self._pick(self._mean, keys)
+
+    def var(self, keys=None):
+        weight = self._pick(self._weight, keys, 0.0)
+        m2 = self._pick(self._m2, keys)
+        return np.divide(m2, weight - 1, out=np.full(np.shape(m2), np.nan), where=np.asarray(weight) > 1)[()]
+
+    def std(self, keys=None):
+        return np.sqrt(self.var(keys))
+
+    def padded(self, keys, total_weight, time=None):
+        """(mean, std) per key as if each key's missing weight up to `total_weight` were zeros.
+
+        For sparse counts where a key with no value in a bucket had a count of
+        0 there; `total_weight` is the (decayed, at `time`) number of buckets.
+        """
+        weight, mean, m2 = self.weight(keys), np.nan_to_num(self.mean(keys)), np.nan_to_num(self._pick(self._m2, keys))
+        if self.halflife is not None and time is not None:
+            last = self._pick(self.last, keys, time)
+            decay = np.exp2(-(time - last) / self.halflife)
+            weight, m2 = weight * decay, m2 * decay
+        if total_weight <= 1:
+            return np.full(len(weight), np.nan), np.full(len(weight), np.nan)
+        # Chan merge with a group of (total_weight - weight) zeros
+        zeros = np.maximum(total_weight - weight, 0)
+        dense_m2 = m2 + mean ** 2 * weight * zeros / total_weight
+        return mean * weight / total_weight, np.sqrt(dense_m2 / (total_weight - 1))
+
+
+class QuantileSketch(_Decayed):
+    """Per-key relative-error quantiles over a fixed log-bucket grid (see the module header)."""
+
+    def __init__(self, relative_accuracy=RELATIVE_ACCURACY, min_value=MIN_VALUE, max_value=MAX_VALUE,
+                 halflife=None):
+        super().__init__(halflife)
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.min_value, self.max_value = min_value, max_value
+        self._offset = math.ceil(math.log(min_value) / self._log_gamma)
+        self.n_buckets = math.ceil(math.log(max_value) / self._log_gamma) - self._offset + 1
+        self.counts = np.zeros((0, self.n_buckets))
+
+    def __len__(self):
+        return len(self.keys)
+
+    def _resize(self, n):
+        self.counts = _grow(self.counts, n)
+        self.last = _grow(self.last, n, -np.inf)
+
+    def bucket(self, values):
+        clipped = np.clip(np.asarray(values, dtype=np.float64), self.min_value, self.max_value)
+        return np.ceil(np.log(clipped) / self._log_gamma).astype(np.int64) - self._offset
+
+    def update(self, keys, values, times=None):
+        values, touched, inverse, w, prior = self._prepare(keys, values, times)
+        if not len(values):
+            return self
+        self.counts[touched] *= prior[:, None]
+        flat = inverse * self.n_buckets + self.bucket(values)
+        added = np.bincount(flat, weights=w, minlength=len(touched) * self.n_buckets)
+        self.counts[touched] += added.reshape(len(touched), self.n_buckets)
+        return self
+
+    def add(self, key, value, time=None):
+        row = self.keys.rows(None if key is None else [key], 1)[0]
+        self._resize(len(self.keys))
+        w, decay = self._decay_one(row, time)
+        if decay != 1.0:
+            self.counts[row] *= decay
+        self.counts[row, self.bucket(value)] += w
+        return self
+
+    def count(self, keys=None):
+        rows = self.keys.find(keys)
+        out = np.where(rows >= 0, self.counts[np.maximum(rows, 0)].sum(axis=1) if len(self.counts) else 0.0, 0.0)
+        return out[0] if keys is None else out
+
+    def quantile(self, q, keys=None, upper=False):
+        """Value at quantile q per key (NaN for keys with no values).
+
+        upper=True returns the upper edge of the quantile's bucket instead of
+        its midpoint: no value counted in that bucket lies above it.
+        """
+        rows = self.keys.find(keys)
+        if not len(self.counts):
+            out = np.full(len(rows), np.nan)
+        else:
+            cum = np.cumsum(self.counts[np.maximum(rows, 0)], axis=1)
+            total = cum[:, -1]
+            # first bucket whose cumulative count passes rank q * (n - 1), as in DDSketch
+            i = (cum <= (q * np.maximum(total - 1, 0))[:, None]).sum(axis=1)
+            i = np.minimum(i, self.n_buckets - 1)
+            value = self.gamma ** (i + self._offset)
+            if not upper:
+                value = 2 * value / (self.gamma + 1)
+            out = np.where((rows >= 0) & (total > 0), value, np.nan)
+        return out[0] if keys is None else out
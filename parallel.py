@@ -0,0 +1,72 @@
+# parallel.py
+# Hash-partitioned execution of per-key analyses (per IP, per product) over a
+# process pool.
+#
+# Rows are assigned to shards by a stable hash of their key, so every key lives
+# in exactly one shard and per-key work needs no cross-shard state. Workers are
+# started with the "spawn" method: they never inherit a parent that already
+# initialised TensorFlow, and heavy resources (models) are built once per worker
+# by a `loader` callable instead of being pickled. Callers put results back in a
+# canonical order, so output is identical to a serial run.
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+_worker = {}
+
+
+def resolve_workers(workers):
+    """None or 0 -> one worker per CPU."""
+    if not workers:
+        return os.cpu_count() or 1
+    return max(1, int(workers))
+
+
+def shard_ids(keys, n_shards):
+    """Stable shard number in [0, n_shards) for every key (same across processes and runs)."""
+    hashes = pd.util.hash_pandas_object(pd.Series(keys), index=False).to_numpy()
+    return (hashes % np.uint64(n_shards)).astype(np.int64)
+
+
+def _init_worker(loader):
+    _worker['resource'] = loader() if loader is not None else None
+
+
+def _run_shard(fn, part, args):
+    return fn(part, _worker.get('resource'), *args)
+
+
+def run_shards(fn, parts, loader=None, args=(), workers=None):
+    """Call fn(part, resource, *args) for every part over a process pool; results in part order.
+
+    workers: pool size, default one process per part.
+    """
+    workers = min(len(parts), workers or len(parts))
+    if workers <= 1:
+        resource = loader() if loader is not None else None
+        return [fn(part, resource, *args) for part in parts]
+    ctx = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(workers, mp_context=ctx, initializer=_init_worker, initargs=(loader,)) as pool:
+        return list(pool.map(_run_shard, [fn] * len(parts), parts, [args] * len(parts)))
+
+
+def map_shards(frame, key, fn, workers, loader=None, args=(), sort_by=None):
+    """Split `frame` by hash of `key`, run fn on each shard, concatenate the results.
+
+    With sort_by the concatenated result is stably sorted on those columns,
+    which makes it independent of the worker count.
+    """
+    workers = resolve_workers(workers)
+    if workers == 1:
+        parts = [frame]
+    else:
+        shard = shard_ids(frame[key], workers)
+        parts = [frame[shard == i] for i in range(workers)]
+        parts = [p for p in parts if len(p)] or [frame]
+    result = pd.concat(run_shards(fn, parts, loader, args), ignore_index=True)
+    if sort_by:
+        result = result.sort_values(sort_by, kind='mergesort').reset_index(drop=True)
+    return result
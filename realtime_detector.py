@@ -0,0 +1,293 @@
+# realtime_detector.py
+# Resident detector: follows a live log source and raises DDoS / failed-login /
+# product-spike alerts as events arrive, instead of re-reading the whole CSV.
+#
+#   python realtime_detector.py --tail data/live_logs.csv
+#   python realtime_detector.py --listen 127.0.0.1:9999      # JSON lines over TCP
+#
+# Per-IP and per-product counts live in one-second ring buffers covering the
+# last --window seconds, so every event costs O(1) and memory follows the
+# number of keys active in the window. Thresholds come from thresholds.py
+# (learned from --baseline) and alert labels from rule_engine.RULES.
+import argparse
+import csv
+import json
+import os
+import queue
+import socketserver
+import sys
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+from log_store import load_logs
+from rule_engine import BRUTE_FORCE_FAILURES, rule
+from thresholds import DDOS, FAILED_LOGIN, HIGH_RESPONSE, PRODUCT_SPIKE, dashboard_thresholds
+
+WINDOW_SECS = 60
+
+# dashboard category -> rule_engine rule used for the alert's name / recommendation
+ALERT_RULES = {
+    DDOS: "DDoS Attack",
+    FAILED_LOGIN: "Brute Force Login",
+    HIGH_RESPONSE: "High Response Time",
+    PRODUCT_SPIKE: None,
+}
+
+
+# -----------------------------
+# Sliding-window state
+# -----------------------------
+class _Ring:
+    __slots__ = ('counts', 'last', 'total')
+
+    def __init__(self, window, second):
+        self.counts = [0] * window
+        self.last = second
+        self.total = 0
+
+
+class WindowCounter:
+    """Per-key event counts over the last `window` seconds (one ring buffer per key)."""
+
+    def __init__(self, window=WINDOW_SECS):
+        self.window = window
+        self._rings = {}
+
+    def __len__(self):
+        return len(self._rings)
+
+    def add(self, key, second, n=1):
+        """Count `n` events for `key` at epoch `second`; returns the key's window total."""
+        w = self.window
+        ring = self._rings.get(key)
+        if ring is None:
+            ring = self._rings[key] = _Ring(w, second)
+        elif second > ring.last:
+            # clear the buckets that slid out of the window since the last event
+            counts = ring.counts
+            for s in range(ring.last + 1, min(second, ring.last + w) + 1):
+                ring.total -= counts[s % w]
+                counts[s % w] = 0
+            ring.last = second
+        elif second <= ring.last - w:
+            return ring.total  # older than the window; nothing to count
+        ring.counts[second % w] += n
+        ring.total += n
+        return ring.total
+
+    def count(self, key):
+        ring = self._rings.get(key)
+        return 0 if ring is None else ring.total
+
+    def expire(self, now):
+        """Drop keys with no events inside the window ending at `now`."""
+        cutoff = now - self.window
+        for key in [k for k, r in self._rings.items() if r.last <= cutoff]:
+            del self._rings[key]
+
+
+# -----------------------------
+# Detector
+# -----------------------------
+def parse_time(value):
+    if isinstance(value, (int, float)):
+        return float(value)
+    return datetime.fromisoformat(str(value)).timestamp()
+
+
+class Detector:
+    """Feeds events into the window counters and emits alerts for threshold crossings.
+
+    An alert for a given (attack type, key) is raised at most once per window.
+    """
+
+    def __init__(self, thresholds, window=WINDOW_SECS, emit=None):
+        self.thresholds = thresholds
+        self.window = window
+        self.emit = emit or (lambda alert: print(json.dumps(alert), flush=True))
+        self.events = WindowCounter(window)
+        self.ip_requests = WindowCounter(window)
+        self.ip_failed = WindowCounter(window)
+        self.product_events = WindowCounter(window)
+        self._last_alert = {}
+        self._last_expire = 0
+        self.processed = 0
+        self.alerts = 0
+        self.latencies = deque(maxlen=100_000)
+
+    def process(self, event, received=None):
+        received = time.time() if received is None else received
+        second = int(parse_time(event['timestamp']))
+        ip = event.get('ip_address')
+        product = event.get('product_id')
+        self.processed += 1
+        self.events.add(None, second)
+
+        n = self.ip_requests.add(ip, second)
+        if n > self.thresholds[DDOS]:
+            self._alert(DDOS, 'ip_address', ip, n, second, event, received)
+        if event.get('login_status') == 'failed':
+            n = self.ip_failed.add(ip, second)
+            if n > self.thresholds[FAILED_LOGIN] or n >= BRUTE_FORCE_FAILURES:
+                self._alert(FAILED_LOGIN, 'ip_address', ip, n, second, event, received)
+        n = self.product_events.add(product, second)
+        if n > self.thresholds[PRODUCT_SPIKE]:
+            self._alert(PRODUCT_SPIKE, 'product_id', product, n, second, event, received)
+        rt = float(event.get('response_time') or 0)
+        if rt > self.thresholds[HIGH_RESPONSE]:
+            self._alert(HIGH_RESPONSE, 'ip_address', ip, rt, second, event, received)
+
+        if second - self._last_expire >= self.window:
+            self._expire(second)
+
+    def _alert(self, attack_type, key_name, key, value, second, event, received):
+        last = self._last_alert.get((attack_type, key))
+        if last is not None and second - last < self.window:
+            return
+        self._last_alert[(attack_type, key)] = second
+        name = ALERT_RULES[attack_type]
+        value_name = 'response_time' if attack_type == HIGH_RESPONSE else 'count'
+        now = time.time()
+        alert = {
+            'attack_type': attack_type,
+            key_name: key,
+            value_name: value,
+            'threshold': round(float(self.thresholds[attack_type]), 3),
+            'timestamp': event['timestamp'],
+            'anomaly_name': name,
+            'recommendation': rule(name).recommendation if name else None,
+            'latency_ms': round((now - received) * 1000, 3),
+        }
+        if 'sent_at' in event:
+            alert['end_to_end_ms'] = round((now - float(event['sent_at'])) * 1000, 3)
+        self.latencies.append(alert.get('end_to_end_ms', alert['latency_ms']))
+        self.alerts += 1
+        self.emit(alert)
+
+    def _expire(self, second):
+        for counter in (self.ip_requests, self.ip_failed, self.product_events):
+            counter.expire(second)
+        cutoff = second - self.window
+        self._last_alert = {k: s for k, s in self._last_alert.items() if s > cutoff}
+        self._last_expire = second
+
+    def stats(self, elapsed):
+        lat = sorted(self.latencies)
+        pct = (lambda q: lat[min(len(lat) - 1, int(q * len(lat)))]) if lat else (lambda q: None)
+        return {
+            'events': self.processed,
+            'events_per_sec': round(self.processed / elapsed, 1) if elapsed > 0 else None,
+            'events_in_window': self.events.count(None),
+            'alerts': self.alerts,
+            'alert_latency_ms_p50': pct(0.50),
+            'alert_latency_ms_p99': pct(0.99),
+            'active_ips': len(self.ip_requests),
+            'active_products': len(self.product_events),
+        }
+
+
+# -----------------------------
+# Event sources
+# -----------------------------
+def tail_file(path, from_start=False, poll=0.05):
+    """Follow an append-only CSV log (simulate_logs.py schema) and yield row dicts."""
+    while not os.path.exists(path):
+        time.sleep(poll)
+    with open(path, newline='') as fh:
+        header = None
+        if not from_start:
+            first = fh.readline()
+            if first.endswith('\n'):
+                header = next(csv.reader([first]), None)
+                fh.seek(0, os.SEEK_END)
+            else:
+                fh.seek(0)  # header not written yet: take it from the first line that arrives
+        pending = ''
+        while True:
+            chunk = fh.readline()
+            if not chunk:
+                time.sleep(poll)
+                continue
+            pending += chunk
+            if not pending.endswith('\n'):
+                continue  # writer is mid-line
+            line, pending = pending, ''
+            row = next(csv.reader([line]), None)
+            if not row:
+                continue
+            if not header:
+                header = row
+                continue
+            yield dict(zip(header, row))
+
+
+def serve_socket(host, port, events):
+    """Accept JSON-lines events on a local TCP socket and put them on `events`."""
+
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            for line in self.rfile:
+                line = line.strip()
+                if line:
+                    events.put((json.loads(line), time.time()))
+
+    class Server(socketserver.ThreadingTCPServer):
+        daemon_threads = True
+        allow_reuse_address = True
+
+    server = Server((host, port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def load_thresholds(path):
+    logs = load_logs(path)
+    return dashboard_thresholds(logs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Real-time DDoS / failed-login / product-spike detector.")
+    src = parser.add_mutually_exclusive_group(required=True)
+    src.add_argument('--tail', help="append-only CSV log to follow")
+    src.add_argument('--listen', help="HOST:PORT to accept JSON-lines events on")
+    parser.add_argument('--from-start', action='store_true', help="with --tail, replay the existing file first")
+    parser.add_argument('--baseline', default='synthetic_logs_enhanced.csv',
+                        help="log file the dashboard thresholds are learned from")
+    parser.add_argument('--window', type=int, default=WINDOW_SECS, help="sliding window in seconds")
+    parser.add_argument('--alerts', help="append alerts to this JSON-lines file instead of stdout")
+    parser.add_argument('--report-every', type=float, default=10.0, help="seconds between stats lines on stderr")
+    args = parser.parse_args()
+
+    thresholds = load_thresholds(args.baseline)
+    print(f"thresholds: { {k: round(float(v), 3) for k, v in thresholds.items()} }", file=sys.stderr)
+
+    emit = None
+    if args.alerts:
+        out = open(args.alerts, 'a', buffering=1)
+        emit = lambda alert: out.write(json.dumps(alert) + '\n')  # noqa: E731
+    detector = Detector(thresholds, window=args.window, emit=emit)
+
+    if args.tail:
+        source = ((event, time.time()) for event in tail_file(args.tail, from_start=args.from_start))
+    else:
+        host, port = args.listen.rsplit(':', 1)
+        events = queue.Queue(maxsize=100_000)
+        serve_socket(host, int(port), events)
+        source = iter(events.get, None)
+
+    started = last_report = time.time()
+    try:
+        for event, received in source:
+            detector.process(event, received)
+            if received - last_report >= args.report_every:
+                last_report = received
+                print(json.dumps(detector.stats(received - started)), file=sys.stderr)
+    except KeyboardInterrupt:
+        pass
+    print(json.dumps(detector.stats(time.time() - started)), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,247 @@
+# render.py
+# Downsampled scatter plots and non-blocking figure output for the dashboards.
+#
+#   python dashboard.py --html reports/                   # write reports/dashboard.html, no browser
+#   python dashboard.py --max-points 2000 --downsample minmax
+#
+#   fig = render.scatter(anomalies, x='timestamp', y='ip_address', value='severity', color='attack_type', ...)
+#   render.output(fig, args, 'dashboard')     # --html: written from a background thread; else fig.show()
+#
+# Pending HTML writes are waited for once, when the process exits (finish() is
+# registered with atexit), so scripts queue their figures and carry on with
+# the rest of their work instead of blocking on serialisation after each one.
+#
+# Every trace (colour group) is cut down to at most --max-points rows with
+# LTTB or min/max per time bucket over a numeric `value` column, so the extremes
+# that make a point anomalous survive. Whole rows are kept, so hover data stays
+# exact. Above WEBGL_POINTS points the figure uses scattergl.
+#
+# Level of detail: the HTML also embeds each trace at DETAIL_FACTOR times the
+# resolution (same downsampling). Zooming in on the time axis swaps in the
+# detail rows of the visible range, again capped at --max-points per trace;
+# resetting the axes restores the overview.
+import atexit
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import plotly.express as px
+
+MAX_POINTS = 4000
+DETAIL_FACTOR = 10
+WEBGL_POINTS = 1000
+METHODS = ['lttb', 'minmax']
+
+
+# -----------------------------
+# Downsampling
+# -----------------------------
+def lttb(x, y, n):
+    """Indices of the `n` points kept by Largest-Triangle-Three-Buckets (x ascending)."""
+    size = len(x)
+    if n >= size or n < 3:
+        return np.arange(size)
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    edges = (np.arange(n - 1) * (size - 2) / (n - 2)).astype(np.int64) + 1  # buckets between the end points
+    edges[-1] = size - 1
+    # mean of the following bucket (the last point for the last bucket)
+    cx, cy = np.concatenate([[0], np.cumsum(x)]), np.concatenate([[0], np.cumsum(y)])
+    nxt_lo = np.append(edges[1:], size - 1)
+    nxt_hi = np.append(edges[2:], [size, size])
+    avg_x = (cx[nxt_hi] - cx[nxt_lo]) / (nxt_hi - nxt_lo)
+    avg_y = (cy[nxt_hi] - cy[nxt_lo]) / (nxt_hi - nxt_lo)
+
+    keep = np.empty(n, dtype=np.int64)
+    keep[0], keep[-1] = 0, size - 1
+    a = 0
+    for i in range(n - 2):
+        lo, hi = edges[i], edges[i + 1]
+        area = np.abs((x[a] - avg_x[i]) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y[i] - y[a]))
+        a = lo + int(np.argmax(area))
+        keep[i + 1] = a
+    return keep
+
+
+def minmax(x, y, n):
+    """Indices of the minimum and maximum of y in each of n // 2 equal-width x buckets."""
+    size = len(x)
+    if n >= size or n < 2:
+        return np.arange(size)
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    buckets = n // 2
+    span = x[-1] - x[0]
+    b = np.zeros(size, dtype=np.int64) if span == 0 else \
+        np.minimum(((x - x[0]) / span * buckets).astype(np.int64), buckets - 1)
+    order = np.lexsort((y, b))
+    starts = np.flatnonzero(np.r_[True, b[order][1:] != b[order][:-1]])
+    ends = np.r_[starts[1:], size] - 1
+    return np.unique(np.concatenate([order[starts], order[ends]]))
+
+
+def _numeric(values):
+    values = pd.Series(values)
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values.astype('datetime64[ns]').astype(np.int64).to_numpy(dtype=float)
+    out = pd.to_numeric(values, errors='coerce').to_numpy(dtype=float)
+    return np.nan_to_num(out, nan=np.nanmin(out) if np.isfinite(out).any() else 0.0)
+
+
+def downsample(frame, x, value, max_points=MAX_POINTS, method='lttb', by=None):
+    """Rows of `frame` (sorted by x) with at most `max_points` per `by` group."""
+    if method not in METHODS:
+        raise ValueError(f"method must be one of {METHODS}")
+    pick = lttb if method == 'lttb' else minmax
+    frame = frame.sort_values(x, kind='mergesort')
+    groups = [frame] if by is None else [g for _, g in frame.groupby(by, observed=True, sort=False, dropna=False)]
+    parts = []
+    for g in groups:
+        if len(g) <= max_points:
+            parts.append(g)
+        else:
+            parts.append(g.iloc[pick(_numeric(g[x]), _numeric(g[value]), max_points)])
+    if not parts:
+        return frame
+    return pd.concat(parts).sort_values(x, kind='mergesort')
+
+
+# -----------------------------
+# Figures
+# -----------------------------
+def _px_scatter(frame, x, y, **kwargs):
+    mode = 'webgl' if len(frame) > WEBGL_POINTS else 'svg'
+    return px.scatter(frame, x=x, y=y, render_mode=mode, **kwargs)
+
+
+def _trace_arrays(trace):
+    arrays = {'x': trace.x, 'y': trace.y}
+    if trace.marker.size is not None and not np.isscalar(trace.marker.size):
+        arrays['marker.size'] = trace.marker.size
+    if trace.customdata is not None:
+        arrays['customdata'] = trace.customdata
+    return arrays
+
+
+def scatter(frame, x, y, value=None, color=None, max_points=MAX_POINTS, method='lttb', **kwargs):
+    """px.scatter() of `frame`, downsampled per colour group on `value` (default: y).
+
+    The returned figure carries the detail level in layout.meta for the
+    zoom handler that output() adds to the HTML.
+    """
+    value = value or y
+    kwargs = dict(kwargs, color=color)
+    overview = downsample(frame, x, value, max_points, method, by=color)
+    detail = downsample(frame, x, value, max_points * DETAIL_FACTOR, method, by=color)
+    fig = _px_scatter(overview, x, y, **kwargs)
+    if len(detail) == len(overview):
+        return fig
+
+    lod = {}
+    detail_traces = {t.name: t for t in _px_scatter(detail, x, y, **kwargs).data}
+    for i, trace in enumerate(fig.data):
+        fine = detail_traces.get(trace.name)
+        if fine is None:
+            continue
+        # marker sizes relative to the same maximum at both levels
+        trace.marker.sizeref = fine.marker.sizeref
+        arrays = _trace_arrays(fine)
+        arrays['t'] = _numeric(pd.to_datetime(pd.Series(fine.x))) // 1e6  # epoch ms for the range test
+        lod[str(i)] = arrays
+    fig.update_layout(meta={'lod': {'max_points': max_points, 'traces': lod}})
+    return fig
+
+
+# zoom handler: replace every trace by its detail rows in the visible x range
+LOD_SCRIPT = """
+var gd = document.getElementById('{plot_id}');
+var lod = gd.layout.meta && gd.layout.meta.lod;
+if (lod) {
+  var ids = Object.keys(lod.traces).map(Number);
+  var overview = ids.map(function (i) {
+    var t = gd.data[i], o = {x: t.x, y: t.y};
+    if (t.marker && Array.isArray(t.marker.size)) o['marker.size'] = t.marker.size;
+    if (t.customdata) o.customdata = t.customdata;
+    return o;
+  });
+  var toMs = function (v) {
+    return typeof v === 'number' ? v : Date.parse(String(v).replace(' ', 'T') + 'Z');
+  };
+  var apply = function (rows) {
+    var keys = Object.keys(rows[0]), update = {};
+    keys.forEach(function (k) { update[k] = rows.map(function (r) { return r[k]; }); });
+    Plotly.restyle(gd, update, ids);
+  };
+  gd.on('plotly_relayout', function (ev) {
+    if (ev['xaxis.autorange']) { apply(overview); return; }
+    var r = ev['xaxis.range'] || [ev['xaxis.range[0]'], ev['xaxis.range[1]']];
+    if (r[0] === undefined) return;
+    var lo = toMs(r[0]), hi = toMs(r[1]);
+    apply(ids.map(function (i, j) {
+      var d = lod.traces[i], keep = [];
+      for (var k = 0; k < d.t.length; k++) if (d.t[k] >= lo && d.t[k] <= hi) keep.push(k);
+      var step = Math.max(1, Math.ceil(keep.length / lod.max_points));
+      keep = keep.filter(function (_, n) { return n % step === 0; });
+      var o = {};
+      Object.keys(overview[j]).forEach(function (key) {
+        o[key] = keep.map(function (k) { return d[key][k]; });
+      });
+      return o;
+    }));
+  });
+}
+"""
+
+
+# -----------------------------
+# Output
+# -----------------------------
+_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='render')
+_pending = []
+
+
+def write_html(fig, path):
+    """Write `fig` (with the zoom handler) to `path` from a background thread; returns a Future."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    def write():
+        tmp = f'{path}.tmp'
+        fig.write_html(tmp, include_plotlyjs='cdn', post_script=LOD_SCRIPT)
+        os.replace(tmp, path)
+        print(f"✅ figure written to {path}")
+        return path
+
+    future = _writer.submit(write)
+    _pending.append(future)
+    return future
+
+
+def finish():
+    """Wait for every pending write_html(); re-raises the first failure. Runs at exit."""
+    while _pending:
+        _pending.pop(0).result()
+
+
+atexit.register(finish)
+
+
+def add_arguments(parser):
+    group = parser.add_argument_group('rendering')
+    group.add_argument('--html', metavar='DIR',
+                       help="write figures as static HTML into DIR (in the background) instead of opening them")
+    group.add_argument('--max-points', type=int, default=MAX_POINTS,
+                       help="points per trace in the overview; zooming shows up to this many from the detail level")
+    group.add_argument('--downsample', choices=METHODS, default='lttb',
+                       help="lttb keeps the visual shape, minmax keeps every bucket's extremes")
+
+
+def output(fig, args, name):
+    """Write `fig` to <--html>/<name>.html in the background, or show it."""
+    if args.html:
+        return write_html(fig, os.path.join(args.html, f'{name}.html'))
+    # the zoom handler only runs in written HTML; shown figures stay at the overview
+    fig.update_layout(meta=None)
+    fig.show()
@@ -0,0 +1,212 @@
+# replay.py
+# Replay a log file into ingest.py and report throughput and end-to-end latency.
+#
+#   python replay.py --tcp 127.0.0.1:9100 --stats 127.0.0.1:9180 --speedup 3600
+#   python replay.py --http 127.0.0.1:9180 --speedup 0 --loops 5      # as fast as possible
+#   python replay.py --udp 127.0.0.1:9101 --stats 127.0.0.1:9180 --source data/logs.store
+#   python replay.py --tcp 127.0.0.1:9100 --stats 127.0.0.1:9180 --format csv   # ingest.py --format csv
+#
+# Events are sent in timestamp order, paced so that --speedup seconds of log
+# time pass per wall-clock second (0 sends as fast as the transport accepts).
+# --loops repeats the file with timestamps shifted by its span each pass, so
+# per-minute counts keep moving forward. Events go out as JSON objects or, with
+# --format csv, as CSV lines in COLUMNS order (HTTP posts them as text/csv).
+# Every event is stamped with `sent_at` (a last CSV column) when its batch
+# leaves; once everything is sent the client polls the
+# ingester's GET /stats until the events it sent are accounted for and prints
+# the send rate, end-to-end events/s and the ingester's p50 / p99 latency over
+# this run (the client resets them through POST /stats/reset when it starts).
+import argparse
+import http.client
+import json
+import socket
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from log_store import default_source, load_logs
+from simulate_logs import COLUMNS
+
+TICK = 0.01
+HTTP_BATCH = 5000
+UDP_PAYLOAD = 8192
+DRAIN_TIMEOUT = 60.0
+
+
+def _host_port(address):
+    host, port = address.rsplit(':', 1)
+    return host, int(port)
+
+
+def event_lines(logs, shift, fmt='json'):
+    """One line per event (bytes, without the closing brace / newline), timestamps shifted by `shift`."""
+    frame = logs[COLUMNS].assign(timestamp=(logs['timestamp'] + shift).dt.strftime('%Y-%m-%d %H:%M:%S.%f'))
+    if fmt == 'csv':
+        return [line.encode() for line in frame.to_csv(index=False, header=False).splitlines()]
+    text = frame.to_json(orient='records', lines=True)
+    return [line[:-1].encode() for line in text.splitlines()]
+
+
+def stamp(fmt):
+    """The `sent_at` suffix that completes every line of a batch leaving now."""
+    if fmt == 'csv':
+        return f',{time.time():.6f}\n'.encode()
+    return f',"sent_at":{time.time():.6f}}}\n'.encode()
+
+
+# -----------------------------
+# Sinks: send(list of stamped lines)
+# -----------------------------
+def tcp_sink(address):
+    sock = socket.create_connection(_host_port(address))
+
+    def send(lines):
+        sock.sendall(b''.join(lines))
+    send.close = sock.close
+    return send
+
+
+def udp_sink(address):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    target = _host_port(address)
+
+    def send(lines):
+        datagram, size = [], 0
+        for line in lines:
+            if size + len(line) > UDP_PAYLOAD and datagram:
+                sock.sendto(b''.join(datagram), target)
+                datagram, size = [], 0
+            datagram.append(line)
+            size += len(line)
+        if datagram:
+            sock.sendto(b''.join(datagram), target)
+    send.close = sock.close
+    return send
+
+
+def http_sink(address, fmt='json'):
+    conn = http.client.HTTPConnection(*_host_port(address))
+    content_type = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+
+    def post(body):
+        while True:
+            conn.request('POST', '/events', body, {'Content-Type': content_type})
+            resp = conn.getresponse()
+            resp.read()
+            if resp.status != 503:
+                return
+            # ingester is backed up: honour Retry-After, scaled down for a local server
+            send.throttled += 1
+            time.sleep(float(resp.getheader('Retry-After', 1)) / 20)
+
+    def send(lines):
+        for i in range(0, len(lines), HTTP_BATCH):
+            post(b''.join(lines[i:i + HTTP_BATCH]))
+    send.throttled = 0
+    send.close = conn.close
+    return send
+
+
+def fetch_stats(address, reset=False):
+    """The ingester's /stats; reset=True also restarts its latency percentiles."""
+    conn = http.client.HTTPConnection(*_host_port(address), timeout=10)
+    conn.request(*(('POST', '/stats/reset') if reset else ('GET', '/stats')))
+    return json.loads(conn.getresponse().read())
+
+
+# -----------------------------
+# Replay
+# -----------------------------
+def replay(logs, send, speedup, loops, start=None, tick=TICK, fmt='json'):
+    """Send every event at its paced time; returns (events sent, seconds)."""
+    logs = logs.sort_values('timestamp', kind='mergesort').reset_index(drop=True)
+    if start is not None:
+        logs['timestamp'] += pd.Timestamp(start) - logs['timestamp'].iloc[0]
+    offsets = (logs['timestamp'] - logs['timestamp'].iloc[0]).dt.total_seconds().to_numpy()
+    span = pd.Timedelta(seconds=float(offsets[-1]) + 1)
+    sent = 0
+    started = time.time()
+    for loop in range(loops):
+        lines = event_lines(logs, span * loop, fmt)
+        due = offsets + span.total_seconds() * loop
+        pos = 0
+        while pos < len(lines):
+            if speedup > 0:
+                elapsed_log = (time.time() - started) * speedup
+                end = int(np.searchsorted(due, elapsed_log, side='right'))
+                if end == pos:
+                    time.sleep(min(tick, (due[pos] - elapsed_log) / speedup))
+                    continue
+            else:
+                end = min(pos + HTTP_BATCH, len(lines))
+            suffix = stamp(fmt)
+            send([line + suffix for line in lines[pos:end]])
+            sent += end - pos
+            pos = end
+    return sent, time.time() - started
+
+
+def wait_drained(stats_address, baseline, sent, timeout=DRAIN_TIMEOUT):
+    """Poll /stats until `sent` more events were accepted, rejected or dropped since `baseline`."""
+    deadline = time.time() + timeout
+    seen = lambda s: s['events'] + s['rejected'] + s.get('dropped', 0)  # noqa: E731
+    while True:
+        stats = fetch_stats(stats_address)
+        if seen(stats) - seen(baseline) >= sent or time.time() > deadline:
+            return stats
+        time.sleep(0.1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a log file into ingest.py and report throughput / latency.")
+    dst = parser.add_mutually_exclusive_group(required=True)
+    dst.add_argument('--tcp', metavar='HOST:PORT', help="ingest.py --tcp address")
+    dst.add_argument('--udp', metavar='HOST:PORT', help="ingest.py --udp address")
+    dst.add_argument('--http', metavar='HOST:PORT', help="ingest.py --http address")
+    parser.add_argument('--stats', metavar='HOST:PORT', help="ingest.py --http address for /stats (default: --http)")
+    parser.add_argument('--source', default=default_source('synthetic_logs_enhanced.csv'), help="log file to replay")
+    parser.add_argument('--format', choices=['json', 'csv'], default='json',
+                        help="event encoding; must match ingest.py --format for TCP / UDP")
+    parser.add_argument('--speedup', type=float, default=0.0,
+                        help="log seconds replayed per wall-clock second; 0 = as fast as possible")
+    parser.add_argument('--loops', type=int, default=1, help="times to replay the file")
+    parser.add_argument('--start', help="shift the file so its first event is at this time, e.g. 'now'"
+                                        " (a running ingester rejects events older than its retention)")
+    args = parser.parse_args()
+
+    logs = load_logs(args.source)
+    if args.tcp:
+        send = tcp_sink(args.tcp)
+    elif args.udp:
+        send = udp_sink(args.udp)
+    else:
+        send = http_sink(args.http, args.format)
+    stats_address = args.stats or args.http
+    before = fetch_stats(stats_address, reset=True) if stats_address else None
+
+    started = time.time()
+    sent, seconds = replay(logs, send, args.speedup, args.loops, args.start, fmt=args.format)
+    send.close()
+    report = {'sent': sent, 'seconds': round(seconds, 2), 'send_events_per_sec': round(sent / seconds, 1)}
+    if args.http:
+        report['throttled_posts'] = send.throttled
+    if stats_address:
+        stats = wait_drained(stats_address, before, sent)
+        ingested = stats['events'] - before['events']
+        report.update({
+            'ingested': ingested,
+            'late': stats['rejected_reasons'].get('late', 0) - before['rejected_reasons'].get('late', 0),
+            'end_to_end_events_per_sec': round(ingested / (time.time() - started), 1),
+            'rejected': stats['rejected'] - before['rejected'],
+            'dropped': stats.get('dropped', 0) - before.get('dropped', 0),
+            'latency_ms_p50': stats['latency_ms_p50'],
+            'latency_ms_p99': stats['latency_ms_p99'],
+            'alerts': stats['alerts'] - before['alerts'],
+        })
+    print(json.dumps(report), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
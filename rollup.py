@@ -0,0 +1,437 @@
+# rollup.py
+# Pre-aggregated rollup cube of the logs at 1-minute, 1-hour and 1-day grain.
+#
+#   python rollup.py build                      # (re)build data/rollup from the full log
+#   python rollup.py update                     # fold in rows added since the last build/update
+#   python rollup.py update --follow 30         # keep folding in new rows every 30 s
+#   python dashboard.py --rollup data/rollup    # dashboards read cells, not raw rows
+#
+# A cell is keyed by (bucket, ip_address, product_id, event_type, region,
+# device_type, anomaly_type) and holds additive measures: events, failed logins
+# and response-time count / sum / sum of squares / max. Counts per minute per
+# IP, per product, failed logins per IP and anomaly_type totals are all
+# re-aggregations of cells, and the dashboard thresholds (mean + 2 sigma) follow
+# exactly from the sums.
+#
+# Next to the full cells the cube keeps 1-minute projections for the
+# dashboard's queries (PROJECTIONS): per (minute, IP), per (minute, IP) with
+# failed logins only, and per (minute, product). They are far smaller than the
+# full cells, and load_rollup() reads one whenever it covers the requested
+# dimensions.
+#
+# Layout: <cube>/<table>/<period>/part-*.parquet, where a table is a grain
+# (full cells) or a projection and a period is a day for 1min cells, a month
+# for 1h and a year for 1d. Updates append a delta file to every period they
+# touch; a period is compacted back into one file once it has MAX_DELTAS of
+# them. Because every measure is a sum or a max, rows arriving late or out of
+# order merge exactly.
+#
+# <cube>/state.json is the manifest: the live part files and the position in
+# the source (a byte offset for a CSV log, the set of files already folded in
+# for a log_store directory). Parts are written first and only become live when
+# the manifest is replaced (one atomic rename), together with the source
+# position they cover, so a crash never folds rows twice and a reader never
+# sees a compacted period both merged and in deltas. Parts retired by
+# compaction are deleted after the switch; a reader that listed them just
+# before retries with the new manifest.
+import argparse
+import glob
+import io
+import json
+import os
+import shutil
+import time
+import uuid
+
+import numpy as np
+import pandas as pd
+
+from log_codec import compact_logs
+from log_store import default_source, is_store
+from log_stream import CHUNK_ROWS
+
+GRAINS = {'1min': '1Min', '1h': '1h', '1d': '1D'}
+PERIODS = {'1min': '%Y-%m-%d', '1h': '%Y-%m', '1d': '%Y'}
+DIMENSIONS = ['ip_address', 'product_id', 'event_type', 'region', 'device_type', 'anomaly_type']
+KEY = ['bucket'] + DIMENSIONS
+# projection -> (grain, dimensions, failed logins only)
+PROJECTIONS = {
+    'ip_1min': ('1min', ['ip_address'], False),
+    'failed_ip_1min': ('1min', ['ip_address'], True),
+    'product_1min': ('1min', ['product_id'], False),
+}
+TABLES = {**{grain: (grain, DIMENSIONS, False) for grain in GRAINS}, **PROJECTIONS}
+MEASURES = {
+    'events': 'sum',
+    'failed': 'sum',
+    'rt_count': 'sum',
+    'rt_sum': 'sum',
+    'rt_sumsq': 'sum',
+    'rt_max': 'max',
+}
+SOURCE_COLUMNS = ['timestamp', 'login_status', 'response_time'] + DIMENSIONS
+ROLLUP_DIR = 'data/rollup'
+STATE_FILE = 'state.json'
+MAX_DELTAS = 8
+READ_RETRIES = 5
+
+
+# -----------------------------
+# Cells
+# -----------------------------
+def _regroup(cells, freq=None, key=KEY):
+    """Merge duplicate keys, optionally coarsening the buckets to `freq`."""
+    if freq is not None:
+        cells = cells.assign(bucket=cells['bucket'].dt.floor(freq))
+    return cells.groupby(key, observed=True, dropna=False, sort=False).agg(MEASURES).reset_index()
+
+
+def rollup_cells(logs, grain='1min'):
+    """Cells of a (compact) log frame at `grain`."""
+    rt = logs['response_time'].astype(float)
+    frame = pd.DataFrame({
+        'bucket': logs['timestamp'].dt.floor(GRAINS[grain]),
+        **{d: logs[d] if d in logs.columns else None for d in DIMENSIONS},
+        'events': np.ones(len(logs), dtype=np.int64),
+        'failed': (logs['login_status'] == 'failed').astype(np.int64),
+        'rt_count': rt.notna().astype(np.int64),
+        'rt_sum': rt.fillna(0),
+        'rt_sumsq': rt.fillna(0) ** 2,
+        'rt_max': rt,
+    })
+    return _regroup(frame)
+
+
+def table_cells(cells_1min, table):
+    """1-minute cells re-aggregated to one table of the cube."""
+    grain, dims, failed = TABLES[table]
+    if failed:
+        cells_1min = cells_1min[cells_1min['failed'] > 0]
+    if grain == '1min' and dims == DIMENSIONS:
+        return cells_1min
+    return _regroup(cells_1min, None if grain == '1min' else GRAINS[grain], ['bucket'] + dims)
+
+
+def _plain(cells):
+    # dictionaries differ between files; group on plain values, store as categoricals
+    return cells.astype({d: object for d in DIMENSIONS[1:] if d in cells.columns})
+
+
+def _compact_dims(cells):
+    return cells.astype({d: 'category' for d in DIMENSIONS[1:] if d in cells.columns})
+
+
+# -----------------------------
+# Storage
+# -----------------------------
+def _path(cube_dir, part):
+    return os.path.join(cube_dir, *part.split('/'))
+
+
+def _write(cells, cube_dir, table, period):
+    """Write a part file (not live until it is in the manifest); returns its manifest entry."""
+    part = f'{table}/{period}/part-{uuid.uuid4().hex}.parquet'
+    path = _path(cube_dir, part)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    _compact_dims(cells).to_parquet(path + '.tmp', index=False)
+    os.replace(path + '.tmp', path)
+    return part
+
+
+def write_cells(cube_dir, cells_1min):
+    """Write 1-minute cells as delta parts of every table of the cube; returns the new parts."""
+    parts = []
+    for table, (grain, _, _) in TABLES.items():
+        cells = table_cells(cells_1min, table)
+        for period, part in cells.groupby(cells['bucket'].dt.strftime(PERIODS[grain]), sort=True):
+            parts.append(_write(part, cube_dir, table, period))
+    return parts
+
+
+def _live_parts(cube_dir, state):
+    if 'parts' not in state:  # cube written before the manifest listed its parts
+        return sorted(os.path.relpath(p, cube_dir).replace(os.sep, '/')
+                      for p in glob.glob(os.path.join(cube_dir, '*', '*', 'part-*.parquet')))
+    return state['parts']
+
+
+def _commit(cube_dir, state, added=(), removed=()):
+    """Make `added` live and `removed` dead, with `state`'s source position, in one manifest write."""
+    state['parts'] = sorted(set(_live_parts(cube_dir, state)) - set(removed) | set(added))
+    _save_state(cube_dir, state)
+
+
+def compact(cube_dir, state, max_deltas=MAX_DELTAS):
+    """Merge every period with at least `max_deltas` parts into one part."""
+    periods = {}
+    for part in _live_parts(cube_dir, state):
+        periods.setdefault(part.rsplit('/', 1)[0], []).append(part)
+    added, removed = [], []
+    for directory, parts in periods.items():
+        if len(parts) < max(max_deltas, 2):
+            continue
+        table, period = directory.split('/')
+        merged = _regroup(pd.concat([_plain(pd.read_parquet(_path(cube_dir, p))) for p in parts], ignore_index=True),
+                          key=['bucket'] + TABLES[table][1])
+        added.append(_write(merged, cube_dir, table, period))
+        removed += parts
+    if added:
+        _commit(cube_dir, state, added, removed)
+        for part in removed:
+            os.remove(_path(cube_dir, part))
+
+
+def _sweep(cube_dir, state):
+    """Delete part files the manifest does not list (left by a crash mid-update)."""
+    live = {_path(cube_dir, p) for p in _live_parts(cube_dir, state)}
+    for path in glob.glob(os.path.join(cube_dir, '*', '*', '*part-*.parquet*')):
+        if path not in live:
+            os.remove(path)
+
+
+def _table(cube_dir, state, grain, dims, failed):
+    """The smallest table holding `dims` at `grain`: a projection when the cube has one."""
+    tables = {p.split('/', 1)[0] for p in _live_parts(cube_dir, state)}
+    for name, (g, d, f) in PROJECTIONS.items():
+        if name in tables and g == grain and f == failed and set(dims) <= set(d):
+            return name
+    return grain
+
+
+def _period_parts(cube_dir, state, table, start, end):
+    fmt = PERIODS[TABLES[table][0]]
+    lo = pd.Timestamp(start).strftime(fmt) if start is not None else None
+    hi = pd.Timestamp(end).strftime(fmt) if end is not None else None
+    for part in _live_parts(cube_dir, state):
+        name, period, _ = part.split('/')
+        if name == table and (lo is None or period >= lo) and (hi is None or period <= hi):
+            yield _path(cube_dir, part)
+
+
+def load_rollup(cube_dir, grain='1min', start=None, end=None, dimensions=None, failed=False):
+    """Cells of one grain with bucket in [start, end), one row per key.
+
+    dimensions: keep only these key columns (cells are re-aggregated over
+    the rest), e.g. ['ip_address'] for per-bucket per-IP totals; read from a
+    projection when one covers them. failed=True: only cells with failed logins.
+    """
+    import pyarrow.dataset as ds
+    dims = DIMENSIONS if dimensions is None else list(dimensions)
+    columns = ['bucket'] + dims + list(MEASURES)
+    expr = ds.field('failed') > 0 if failed else None
+    if start is not None:
+        cond = ds.field('bucket') >= pd.Timestamp(start).to_pydatetime()
+        expr = cond if expr is None else expr & cond
+    if end is not None:
+        cond = ds.field('bucket') < pd.Timestamp(end).to_pydatetime()
+        expr = cond if expr is None else expr & cond
+    for attempt in range(READ_RETRIES):
+        state = _load_state(cube_dir) or {}
+        table = _table(cube_dir, state, grain, dims, failed)
+        files = list(_period_parts(cube_dir, state, table, start, end))
+        if not files:
+            return pd.DataFrame(columns=columns)
+        try:
+            cells = ds.dataset(files, format='parquet').to_table(columns=columns, filter=expr).to_pandas()
+            break
+        except FileNotFoundError:
+            # compacted away since the manifest was read
+            if attempt == READ_RETRIES - 1:
+                raise
+    if dims == TABLES[table][1] and len({os.path.dirname(f) for f in files}) == len(files):
+        return cells  # one compacted part per period: keys are already unique
+    return cells.groupby(['bucket'] + dims, observed=True, dropna=False, sort=False).agg(MEASURES).reset_index()
+
+
+def time_range(cube_dir):
+    """(first, last) bucket of the 1-day grain, or (None, None) for an empty cube."""
+    days = load_rollup(cube_dir, '1d', dimensions=[])
+    if days.empty:
+        return None, None
+    return days['bucket'].min(), days['bucket'].max()
+
+
+# -----------------------------
+# Queries
+# -----------------------------
+def counts(cells, key, measure='events'):
+    """Per-(bucket, key) totals of a measure, nonzero only (like thresholds.per_minute_counts)."""
+    if not set(DIMENSIONS).intersection(cells.columns) - {key}:
+        s = cells.set_index(['bucket', key])[measure]  # load_rollup() output: one row per (bucket, key)
+    else:
+        s = cells.groupby(['bucket', key], observed=True)[measure].sum()
+    return s[s > 0].rename_axis(['timestamp', key])
+
+
+def response_moments(cells):
+    """(mean, std) of response_time over the rows behind `cells` (sample std, like pandas)."""
+    n = cells['rt_count'].sum()
+    if n == 0:
+        return np.nan, np.nan
+    total = cells['rt_sum'].sum()
+    mean = total / n
+    var = (cells['rt_sumsq'].sum() - total * mean) / (n - 1) if n > 1 else np.nan
+    return mean, np.sqrt(max(var, 0))
+
+
+# -----------------------------
+# Maintenance
+# -----------------------------
+def _load_state(cube_dir):
+    path = os.path.join(cube_dir, STATE_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path) as fh:
+        return json.load(fh)
+
+
+def _save_state(cube_dir, state):
+    path = os.path.join(cube_dir, STATE_FILE)
+    with open(path + '.tmp', 'w') as fh:
+        json.dump(state, fh, indent=2)
+    os.replace(path + '.tmp', path)
+
+
+def _fold(cube_dir, chunks):
+    n, parts = 0, []
+    for chunk in chunks:
+        parts += write_cells(cube_dir, rollup_cells(compact_logs(chunk)))
+        n += len(chunk)
+    return n, parts
+
+
+def build(source, cube_dir=ROLLUP_DIR, chunksize=CHUNK_ROWS):
+    """Rebuild the cube from every row of `source`; returns the number of rows."""
+    if os.path.exists(cube_dir):
+        if _load_state(cube_dir) is None and os.listdir(cube_dir):
+            raise ValueError(f"{cube_dir} exists and is not a rollup cube; refusing to overwrite it")
+        shutil.rmtree(cube_dir)
+    os.makedirs(cube_dir)
+    state = {'source': source, 'parts': []}
+    if is_store(source):
+        state['files'] = _store_files(source)
+        chunks = _store_rows(state['files'], chunksize)
+    else:
+        # fold exactly the complete lines there are now; later ones are update()'s
+        state['csv_offset'] = _line_end(source)
+        chunks = _csv_head_rows(source, state['csv_offset'], chunksize)
+    n, parts = _fold(cube_dir, chunks)
+    _commit(cube_dir, state, parts)
+    compact(cube_dir, state, max_deltas=2)
+    return n
+
+
+def _store_files(store_dir):
+    return sorted(glob.glob(os.path.join(store_dir, '**', '*.parquet'), recursive=True))
+
+
+def _store_rows(files, chunksize):
+    import pyarrow.dataset as ds
+    if not files:
+        return []
+    # the cube's columns are all stored in the files; date / hour partitions are not needed
+    scanner = ds.dataset(files, format='parquet').scanner(columns=SOURCE_COLUMNS, batch_size=chunksize)
+    return (batch.to_pandas() for batch in scanner.to_batches() if batch.num_rows)
+
+
+def _new_store_rows(state, chunksize):
+    files = _store_files(state['source'])
+    new = sorted(set(files) - set(state['files']))
+    state['files'] = files
+    return _store_rows(new, chunksize)
+
+
+def _line_end(path):
+    """Byte offset just past the last newline of `path` (0 if there is none)."""
+    with open(path, 'rb') as fh:
+        end = fh.seek(0, os.SEEK_END)
+        while end > 0:
+            start = max(end - (1 << 16), 0)
+            fh.seek(start)
+            block = fh.read(end - start)
+            if b'\n' in block:
+                return start + block.rfind(b'\n') + 1
+            end = start
+    return 0
+
+
+class _Head(io.RawIOBase):
+    """The first `size` bytes of a binary file, as a stream."""
+
+    def __init__(self, fh, size):
+        self.fh, self.left = fh, size
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self.fh.read(min(len(buffer), self.left))
+        buffer[:len(data)] = data
+        self.left -= len(data)
+        return len(data)
+
+
+def _csv_head_rows(path, size, chunksize):
+    """Chunks of the log CSV's first `size` bytes, whatever is appended meanwhile."""
+    if not size:
+        return
+    with open(path, 'rb') as fh:
+        yield from pd.read_csv(io.BufferedReader(_Head(fh, size)), usecols=SOURCE_COLUMNS,
+                               parse_dates=['timestamp'], chunksize=chunksize)
+
+
+def _new_csv_rows(state, chunksize):
+    with open(state['source'], 'rb') as fh:
+        header = fh.readline()
+        fh.seek(state['csv_offset'])
+        data = fh.read()
+    data = data[:data.rfind(b'\n') + 1]  # leave a half-written last line for next time
+    state['csv_offset'] += len(data)
+    if not data:
+        return []
+    return pd.read_csv(io.BytesIO(header + data), usecols=SOURCE_COLUMNS, parse_dates=['timestamp'],
+                       chunksize=chunksize)
+
+
+def update(cube_dir=ROLLUP_DIR, chunksize=CHUNK_ROWS):
+    """Fold rows added to the cube's source since the last build/update; returns the number of rows."""
+    state = _load_state(cube_dir)
+    if state is None:
+        raise FileNotFoundError(f"no rollup cube at {cube_dir}; run `python rollup.py build` first")
+    _sweep(cube_dir, state)
+    if is_store(state['source']):
+        chunks = _new_store_rows(state, chunksize)
+    else:
+        chunks = _new_csv_rows(state, chunksize)
+    n, parts = _fold(cube_dir, chunks)
+    # the new parts and the source position they reach go live together
+    _commit(cube_dir, state, parts)
+    compact(cube_dir, state)
+    return n
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rollup cube of the logs at 1min / 1h / 1d grain.")
+    parser.add_argument('command', choices=['build', 'update'])
+    parser.add_argument('--source', default=default_source('synthetic_logs_enhanced.csv'),
+                        help="log CSV or log_store directory (build only; updates reuse the built source)")
+    parser.add_argument('--cube', default=ROLLUP_DIR, help="rollup cube directory")
+    parser.add_argument('--chunksize', type=int, default=CHUNK_ROWS)
+    parser.add_argument('--follow', type=float, metavar='SECONDS',
+                        help="with update: keep polling the source for new rows")
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        n = build(args.source, args.cube, args.chunksize)
+        print(f"✅ rollup cube built from {n:,} rows of {args.source} in {args.cube}")
+        return
+    while True:
+        n = update(args.cube, args.chunksize)
+        print(f"✅ {n:,} new rows folded into {args.cube}", flush=True)
+        if not args.follow:
+            break
+        time.sleep(args.follow)
+
+
+if __name__ == '__main__':
+    main()
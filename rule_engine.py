@@ -0,0 +1,69 @@
+# rule_engine.py
+# Column-wise attack classification rules.
+#
+# Each rule is a (name, recommendation, condition) record; `evaluate` turns every
+# condition into a boolean mask over the whole frame and gives each row the first
+# rule that matches, so RULES order is the priority order. Add a rule by adding a
+# record at the right position.
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from sql_scanner import sql_payload_flags
+
+Rule = namedtuple('Rule', ['name', 'recommendation', 'when'])
+
+DDOS_REQUESTS = 50
+SLOW_RESPONSE = 3.0
+BRUTE_FORCE_FAILURES = 5
+
+
+def text_flag(col, predicate):
+    """Evaluate a string predicate once per distinct value and broadcast it back."""
+    codes, uniques = pd.factorize(col, use_na_sentinel=False)
+    flags = np.fromiter((predicate(str(v)) for v in uniques), dtype=bool, count=len(uniques))
+    return flags[codes]
+
+
+def column(df, name, default=''):
+    if name in df.columns:
+        return df[name]
+    return pd.Series(default, index=df.index)
+
+
+RULES = [
+    Rule("DDoS Attack", "Rate-limit / Block IP",
+         lambda df: (df['total_requests'] > DDOS_REQUESTS).values
+         | text_flag(column(df, 'anomaly_type'), lambda v: 'ddos' in v.lower())),
+    Rule("High Response Time", "Investigate servers / slow endpoints",
+         lambda df: (df['response_time'] > SLOW_RESPONSE).values),
+    Rule("Brute Force Login", "Block IP & enforce 2FA",
+         lambda df: (df['failed_logins'] >= BRUTE_FORCE_FAILURES).values),
+    Rule("SQL Injection Attempt", "Sanitize inputs & block payloads",
+         lambda df: sql_payload_flags(column(df, 'product_id'))),
+    Rule("Account Takeover Attempt", "Force password reset",
+         lambda df: ((df['composite_score'] > 0.6) & (df['failed_logins'] > 0)).values),
+    Rule("Suspicious Behavior", "Monitor & escalate",
+         lambda df: (df['composite_score'] > 0.7).values),
+]
+
+
+def rule(name):
+    return next(r for r in RULES if r.name == name)
+
+
+def evaluate(df, rules=RULES):
+    """Return an (anomaly_name, recommendation) frame; None where no rule matches."""
+    n = len(df)
+    names = np.full(n, None, dtype=object)
+    recs = np.full(n, None, dtype=object)
+    free = np.ones(n, dtype=bool)
+    for rule in rules:
+        hit = np.asarray(rule.when(df), dtype=bool) & free
+        names[hit] = rule.name
+        recs[hit] = rule.recommendation
+        free &= ~hit
+        if not free.any():
+            break
+    return pd.DataFrame({'anomaly_name': names, 'recommendation': recs}, index=df.index)
@@ -1,90 +1,266 @@
 # data_generator.py
-import pandas as pd
-import random
-from datetime import datetime, timedelta
+#
+#   python simulate_logs.py                                   # data/simulated_logs.csv (5,000 rows in total)
+#   python simulate_logs.py --rows 100000000 --shards 32 --workers 8 --out data/sim_logs
+#   python simulate_logs.py --rows 10000000 --format store --workers 4 --out data/log_store
+#
+# Rows are generated in NumPy blocks of --block-rows as integer codes and turned
+# into strings only when a block is written, so memory stays at one block per
+# worker whatever the total row count. Every shard draws from its own child of
+# np.random.SeedSequence(--seed), so the output depends only on the seed,
+# --start, --shards and --block-rows, never on --workers.
+import argparse
 import os
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
 
-os.makedirs("data", exist_ok=True)
+from log_codec import int_to_ip
+from parallel import run_shards
 
 NUM_ROWS = 5000
 NUM_ANOMALY_USERS = 20
 ANOMALIES_PER_USER = (2, 6)
+# anomalous share of the rows generate_logs() produces with the defaults above
+ANOMALY_RATE = 0.067
+SPAN_DAYS = 7
+BLOCK_ROWS = 250_000
 
 REGIONS = ['North', 'South', 'East', 'West']
 DEVICE_TYPES = ['Mobile', 'Desktop', 'Tablet']
 EVENT_TYPES = ['view', 'click', 'purchase', 'login', 'download']
+EVENT_WEIGHTS = np.array([50, 30, 10, 5, 5]) / 100
 PRODUCT_IDS = [f'P{i:03d}' for i in range(1, 201)]
 USER_IDS = [f'U{i:04d}' for i in range(1, 401)]
+LOGIN_STATUS = ['success', 'failed']
+ANOMALY_TYPES = ['high_response', 'failed_login', 'mass_clicks', 'ip_abuse', 'ddos', 'sql_injection',
+                 'data_exfil', 'intrusion', 'config_change']
+LABELS = ['normal'] + ANOMALY_TYPES
+
+SQL_PAYLOADS = ["'; DROP TABLE logs;--", "' OR '1'='1"]
+PRODUCTS = PRODUCT_IDS + SQL_PAYLOADS
+# sql_injection rows pick one of P001, P002 and the two payloads
+SQL_PRODUCTS = np.array([0, 1, len(PRODUCT_IDS), len(PRODUCT_IDS) + 1])
+ABUSE_IP = 0xC0A80064   # 192.168.0.100
+DDOS_IP = 0xCB007101    # 203.0.113.1
+DDOS_BURST = (20, 45)
+
+COLUMNS = ['timestamp', 'user_id', 'ip_address', 'region', 'device_type', 'product_id',
+           'event_type', 'login_status', 'response_time', 'anomaly_type']
+CATEGORIES = {
+    'user_id': USER_IDS, 'region': REGIONS, 'device_type': DEVICE_TYPES, 'product_id': PRODUCTS,
+    'event_type': EVENT_TYPES, 'login_status': LOGIN_STATUS, 'anomaly_type': LABELS,
+}
+
+
+# -----------------------------
+# Vectorized row blocks
+# -----------------------------
+def _ips(rng, n):
+    """Random a.b.c.d addresses with every octet in 1..255, as uint32."""
+    octets = rng.integers(1, 256, (4, n), dtype=np.uint32)
+    return (octets[0] << 24) | (octets[1] << 16) | (octets[2] << 8) | octets[3]
+
+
+def _minutes(rng, n, start, span_minutes):
+    return start + rng.integers(0, span_minutes + 1, n) * np.timedelta64(1, 'm')
+
+
+def _normal_rows(rng, n, start, span_minutes):
+    event = rng.choice(len(EVENT_TYPES), n, p=EVENT_WEIGHTS)
+    is_login = event == EVENT_TYPES.index('login')
+    return {
+        'timestamp': _minutes(rng, n, start, span_minutes),
+        'user_id': rng.integers(0, len(USER_IDS), n),
+        'ip_address': _ips(rng, n),
+        'region': rng.integers(0, len(REGIONS), n),
+        'device_type': rng.integers(0, len(DEVICE_TYPES), n),
+        'product_id': rng.integers(0, len(PRODUCT_IDS), n),
+        'event_type': event,
+        'login_status': np.where(is_login, rng.integers(0, 2, n), 0),
+        'response_time': np.round(rng.uniform(0.1, 2.0, n), 2),
+        'anomaly_type': np.zeros(n, dtype=np.int64),
+    }
+
+
+def _incident_sizes(rng, kinds):
+    """Rows per incident: a DDoS burst expands to many rows, everything else to one."""
+    burst = rng.integers(DDOS_BURST[0], DDOS_BURST[1] + 1, len(kinds))
+    return np.where(kinds == LABELS.index('ddos'), burst, 1)
+
+
+def _anomaly_rows(rng, users, kinds, sizes, start, span_minutes):
+    """Rows for anomaly incidents of type `kinds` raised by user codes `users`."""
+    k = len(users)
+    rows = {
+        'timestamp': _minutes(rng, k, start, span_minutes),
+        'user_id': users,
+        'ip_address': _ips(rng, k),
+        'region': rng.integers(0, len(REGIONS), k),
+        'device_type': rng.integers(0, len(DEVICE_TYPES), k),
+        'product_id': rng.integers(0, len(PRODUCT_IDS), k),
+        'event_type': rng.integers(0, len(EVENT_TYPES), k),
+        'login_status': np.zeros(k, dtype=np.int64),
+        'response_time': np.round(rng.uniform(0.1, 2.0, k), 2),
+        'anomaly_type': kinds,
+    }
+
+    def kind(name):
+        return kinds == LABELS.index(name)
+
+    def set_event(mask, name):
+        rows['event_type'][mask] = EVENT_TYPES.index(name)
+
+    m = kind('high_response')
+    rows['response_time'][m] = np.round(rng.uniform(5.0, 12.0, m.sum()), 2)
+    for name in ('failed_login', 'intrusion'):
+        set_event(kind(name), 'login')
+        rows['login_status'][kind(name)] = LOGIN_STATUS.index('failed')
+    set_event(kind('mass_clicks'), 'click')
+    rows['ip_address'][kind('ip_abuse')] = ABUSE_IP
+    m = kind('sql_injection')
+    rows['product_id'][m] = rng.choice(SQL_PRODUCTS, m.sum())
+    set_event(m, 'purchase')
+    set_event(kind('data_exfil'), 'download')
+    set_event(kind('config_change'), 'purchase')
+
+    # expand DDoS incidents into bursts of quick views from one address
+    rows = {c: np.repeat(v, sizes) for c, v in rows.items()}
+    m = rows['anomaly_type'] == LABELS.index('ddos')
+    n = int(m.sum())
+    rows['timestamp'][m] += rng.integers(0, 61, n) * np.timedelta64(1, 's')
+    rows['ip_address'][m] = DDOS_IP
+    rows['event_type'][m] = EVENT_TYPES.index('view')
+    rows['login_status'][m] = 0
+    rows['response_time'][m] = np.round(rng.uniform(0.1, 1.0, n), 2)
+    return rows
+
+
+def _frame(parts, rng):
+    """Concatenate row blocks, shuffle them and decode the integer codes."""
+    order = rng.permutation(sum(len(p['timestamp']) for p in parts))
+    cols = {}
+    for c in COLUMNS:
+        values = np.concatenate([p[c] for p in parts])[order]
+        if c in CATEGORIES:
+            values = pd.Categorical.from_codes(values, CATEGORIES[c])
+        elif c == 'ip_address':
+            values = int_to_ip(values)
+        cols[c] = values
+    return pd.DataFrame(cols, columns=COLUMNS)
+
+
+def generate_block(rng, num_rows, anomaly_rate=ANOMALY_RATE, start=None, span_days=SPAN_DAYS,
+                   num_anomaly_users=NUM_ANOMALY_USERS):
+    """Exactly `num_rows` shuffled rows, Binomial(num_rows, anomaly_rate) of them anomalous."""
+    start = np.datetime64(pd.Timestamp(start), 'ns')
+    span_minutes = int(span_days * 24 * 60)
+    target = int(rng.binomial(num_rows, anomaly_rate))
+    # draw incidents until they cover the target row count, then cut the last one short
+    kinds, sizes, drawn = [np.zeros(0, dtype=np.int64)], [np.zeros(0, dtype=np.int64)], 0
+    while drawn < target:
+        more = rng.integers(1, len(LABELS), int((target - drawn) / 4) + 8)
+        kinds.append(more)
+        sizes.append(_incident_sizes(rng, more))
+        drawn += int(sizes[-1].sum())
+    kinds, sizes = np.concatenate(kinds), np.concatenate(sizes)
+    n = int(np.searchsorted(np.cumsum(sizes), target)) + 1 if target else 0
+    kinds, sizes = kinds[:n], sizes[:n].copy()
+    if n:
+        sizes[-1] -= int(sizes.sum()) - target
+    users = rng.integers(0, min(num_anomaly_users, len(USER_IDS)), n)
+    anomalies = _anomaly_rows(rng, users, kinds, sizes, start, span_minutes)
+    normal = _normal_rows(rng, num_rows - target, start, span_minutes)
+    return _frame([normal, anomalies], rng)
+
+
+def generate_logs(num_rows=NUM_ROWS, num_anomaly_users=NUM_ANOMALY_USERS, start_time=None, seed=None):
+    """Return a shuffled frame of `num_rows` normal rows plus 2-6 anomaly incidents per anomaly user."""
+    rng = np.random.default_rng(seed)
+    if start_time is None:
+        start_time = datetime.now() - timedelta(days=SPAN_DAYS)
+    start = np.datetime64(pd.Timestamp(start_time), 'ns')
+    span_minutes = SPAN_DAYS * 24 * 60
+    users = np.repeat(np.arange(num_anomaly_users),
+                      rng.integers(ANOMALIES_PER_USER[0], ANOMALIES_PER_USER[1] + 1, num_anomaly_users))
+    kinds = rng.integers(1, len(LABELS), len(users))
+    anomalies = _anomaly_rows(rng, users, kinds, _incident_sizes(rng, kinds), start, span_minutes)
+    normal = _normal_rows(rng, num_rows, start, span_minutes)
+    df = _frame([normal, anomalies], rng)
+    for c in CATEGORIES:
+        df[c] = df[c].astype(object)
+    return df
+
+
+# -----------------------------
+# Sharded output
+# -----------------------------
+def shard_sizes(num_rows, shards):
+    base, extra = divmod(num_rows, shards)
+    return [base + (i < extra) for i in range(shards)]
+
+
+def iter_shard_blocks(seed_seq, num_rows, block_rows=BLOCK_ROWS, **options):
+    """Yield one shard's rows as frames of at most `block_rows` rows."""
+    rng = np.random.default_rng(seed_seq)
+    for first in range(0, num_rows, block_rows):
+        yield generate_block(rng, min(block_rows, num_rows - first), **options)
+
+
+def _write_shard(shard, _resource, out, fmt, block_rows, options):
+    index, seed_seq, num_rows = shard
+    blocks = iter_shard_blocks(seed_seq, num_rows, block_rows, **options)
+    if fmt == 'store':
+        from log_store import write_store
+        write_store(blocks, out)
+        return num_rows
+    path = out if os.path.splitext(out)[1] == '.csv' else os.path.join(out, f'logs-{index:05d}.csv')
+    with open(path, 'w', newline='') as fh:
+        for i, block in enumerate(blocks):
+            block.to_csv(fh, header=(i == 0), index=False)
+    return num_rows
+
+
+def write_shards(out, num_rows, shards=1, workers=1, seed=None, fmt='csv', block_rows=BLOCK_ROWS, **options):
+    """Generate `num_rows` rows into `shards` CSV files (or one log store) using `workers` processes.
+
+    With one CSV shard `out` may be a .csv file path; otherwise it is a directory.
+    """
+    if fmt == 'store' or os.path.splitext(out)[1] != '.csv':
+        os.makedirs(out, exist_ok=True)
+    elif shards > 1:
+        raise ValueError("--shards > 1 needs a directory for --out")
+    elif os.path.dirname(out):
+        os.makedirs(os.path.dirname(out), exist_ok=True)
+    seeds = np.random.SeedSequence(seed).spawn(shards)
+    parts = [(i, s, n) for i, (s, n) in enumerate(zip(seeds, shard_sizes(num_rows, shards))) if n]
+    return sum(run_shards(_write_shard, parts, args=(out, fmt, block_rows, options), workers=workers))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic e-commerce logs with injected anomalies.")
+    parser.add_argument('--rows', type=int, default=NUM_ROWS,
+                        help="total rows, anomalies included (it used to count normal rows only)")
+    parser.add_argument('--anomaly-rate', type=float, default=ANOMALY_RATE, help="fraction of anomalous rows")
+    parser.add_argument('--days', type=float, default=SPAN_DAYS, help="time span the timestamps cover")
+    parser.add_argument('--start', help="first timestamp (default: --days before now)")
+    parser.add_argument('--seed', type=int, help="makes the output reproducible (together with --start)")
+    parser.add_argument('--shards', type=int, default=1, help="number of output files (CSV)")
+    parser.add_argument('--workers', type=int, default=1, help="processes writing shards in parallel")
+    parser.add_argument('--block-rows', type=int, default=BLOCK_ROWS, help="rows generated per NumPy block")
+    parser.add_argument('--format', choices=['csv', 'store'], default='csv',
+                        help="CSV shard files, or a log_store directory all shards append to")
+    parser.add_argument('--out', default='data/simulated_logs.csv',
+                        help="CSV file (one shard) or output directory")
+    args = parser.parse_args()
+
+    start = args.start or (datetime.now() - timedelta(days=args.days)).replace(second=0, microsecond=0)
+    n = write_shards(args.out, args.rows, shards=args.shards, workers=args.workers, seed=args.seed,
+                     fmt=args.format, block_rows=args.block_rows,
+                     anomaly_rate=args.anomaly_rate, start=start, span_days=args.days)
+    print(f"✅ Enhanced synthetic logs generated: {n:,} rows in {args.out}")
+
 
-def generate_ip():
-    return ".".join(str(random.randint(1, 255)) for _ in range(4))
-
-data = []
-start_time = datetime.now() - timedelta(days=7)
-
-# normal logs
-for _ in range(NUM_ROWS):
-    timestamp = start_time + timedelta(minutes=random.randint(0, 7*24*60))
-    user_id = random.choice(USER_IDS)
-    ip_address = generate_ip()
-    region = random.choice(REGIONS)
-    device_type = random.choice(DEVICE_TYPES)
-    product_id = random.choice(PRODUCT_IDS)
-    event_type = random.choices(EVENT_TYPES, weights=[50,30,10,5,5])[0]
-    login_status = random.choice(['success','failed']) if event_type=='login' else 'success'
-    response_time = round(random.uniform(0.1,2.0),2)
-    data.append([timestamp, user_id, ip_address, region, device_type, product_id, event_type, login_status, response_time, 'normal'])
-
-# anomalies
-anomaly_types = ['high_response','failed_login','mass_clicks','ip_abuse','ddos','sql_injection','data_exfil','intrusion','config_change']
-for i, user in enumerate(USER_IDS[:NUM_ANOMALY_USERS]):
-    for _ in range(random.randint(*ANOMALIES_PER_USER)):
-        timestamp = start_time + timedelta(minutes=random.randint(0, 7*24*60))
-        ip_address = generate_ip()
-        region = random.choice(REGIONS)
-        device_type = random.choice(DEVICE_TYPES)
-        product_id = random.choice(PRODUCT_IDS)
-        anomaly_type = random.choice(anomaly_types)
-
-        event_type = random.choice(EVENT_TYPES)
-        login_status = 'success'
-        response_time = round(random.uniform(0.1,2.0),2)
-
-        if anomaly_type == 'high_response':
-            response_time = round(random.uniform(5.0,12.0),2)
-        elif anomaly_type == 'failed_login':
-            event_type = 'login'
-            login_status = 'failed'
-            ip_address = generate_ip()
-        elif anomaly_type == 'mass_clicks':
-            event_type = 'click'
-        elif anomaly_type == 'ip_abuse':
-            ip_address = '192.168.0.100'
-        elif anomaly_type == 'ddos':
-            ip_address = '203.0.113.1'
-            # many quick events
-            for _ in range(random.randint(20,45)):
-                ts = timestamp + timedelta(seconds=random.randint(0,60))
-                data.append([ts, user, ip_address, region, device_type, product_id, 'view', 'success', round(random.uniform(0.1,1.0),2), 'ddos'])
-            continue
-        elif anomaly_type == 'sql_injection':
-            product_id = random.choice(["P001","P002","'; DROP TABLE logs;--", "' OR '1'='1"])
-            event_type = 'purchase'
-        elif anomaly_type == 'data_exfil':
-            event_type = 'download'
-        elif anomaly_type == 'intrusion':
-            event_type = 'login'
-            login_status = 'failed'
-            ip_address = generate_ip()
-        elif anomaly_type == 'config_change':
-            event_type = 'purchase'
-
-        data.append([timestamp, user, ip_address, region, device_type, product_id, event_type, login_status, response_time, anomaly_type])
-
-df = pd.DataFrame(data, columns=[
-    'timestamp','user_id','ip_address','region','device_type','product_id',
-    'event_type','login_status','response_time','anomaly_type'
-])
-df = df.sample(frac=1, random_state=42).reset_index(drop=True)
-df.to_csv('data/simulated_logs.csv', index=False)
-print("✅ Enhanced synthetic logs generated: data/simulated_logs.csv")
+if __name__ == "__main__":
+    main()
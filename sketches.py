@@ -0,0 +1,376 @@
+# sketches.py
+# Fixed-size sketches for high-cardinality keys (IPs, users, products): memory
+# does not grow with the number of distinct keys.
+#
+#   hll = HyperLogLog(precision=12).update(ips)          # hll.count() ~ distinct IPs
+#   distinct_per_bucket(minutes, users)                  # one HLL per bucket, vectorised
+#   cms = CountMinSketch.from_error(1e-4, 0.01).update(ips)
+#   cms.estimate(['203.0.113.1'])                        # count of any key
+#   top = SpaceSaving(k=100).update(ips)                 # top.top(): heaviest keys
+#   ws = WindowSketch('1Min', k=100).update(timestamps, ips)
+#   counts, summary = ws.result()                        # top-k per (minute, key), per-minute moments
+#
+# Error bounds (N = total count added, m = 2**precision):
+#   HyperLogLog   relative standard error 1.04 / sqrt(m): 3.3% at precision
+#                 10 (1 kB), 1.6% at 12 (4 kB), 0.8% at 14 (16 kB). Below
+#                 2.5 m it switches to linear counting, which is close to
+#                 exact for the small counts of a single minute.
+#   CountMinSketch  never underestimates; with width w and depth d an estimate
+#                 exceeds the true count by more than e / w * N with
+#                 probability at most exp(-d). from_error(eps, delta) picks
+#                 w = ceil(e / eps), d = ceil(ln(1 / delta)).
+#   SpaceSaving   k counters. Every key with a true count above N / k is
+#                 monitored; a monitored count overestimates by at most its
+#                 `error` (<= N / k), so count - error is a lower bound.
+#
+# Keys are hashed once with pandas' 64-bit hash_array (SipHash for strings,
+# stable across processes), so sketches built in different runs can be merged.
+# Batches are reduced to exact per-key counts before they reach SpaceSaving
+# and merged in the way Cafaro et al. show keeps its guarantees (a key missing
+# from one side counts as that side's minimum), so an update is vectorised and
+# only the batch, not the key space, is ever held exactly.
+import math
+
+import numpy as np
+import pandas as pd
+
+HLL_PRECISION = 12
+BUCKET_PRECISION = 10
+CMS_WIDTH = 2048
+CMS_DEPTH = 4
+TOP_K = 100
+WINDOW_TOP_K = 32
+WINDOW_GROUP = 64
+
+
+def hash64(values, unique=False):
+    """64-bit hash of every value (uint64 array); unique=True skips deduplicating first."""
+    values = np.asarray(values)
+    if values.dtype.kind == 'U':  # hash_array only takes strings as objects
+        values = values.astype(object)
+    return pd.util.hash_array(values, categorize=not unique)
+
+
+# -----------------------------
+# Distinct counts
+# -----------------------------
+def _register_ranks(hashes, precision):
+    """Register of each hash (its top bits) and rank (1 + leading zeros of the rest)."""
+    bits = min(64 - precision, 52)  # < 2**53: exact in a float64 for frexp
+    index = (hashes >> np.uint64(64 - precision)).astype(np.int64)
+    rest = hashes & np.uint64((1 << bits) - 1)
+    rank = bits + 1 - np.frexp(rest.astype(np.float64))[1]
+    return index, rank.astype(np.uint8)
+
+
+def _hll_estimate(registers):
+    """Distinct count estimate of every row of HLL registers (..., m)."""
+    m = registers.shape[-1]
+    alpha = 0.7213 / (1 + 1.079 / m)
+    raw = alpha * m * m / np.exp2(-registers.astype(np.float64)).sum(axis=-1)
+    zeros = (registers == 0).sum(axis=-1)
+    linear = m * np.log(m / np.maximum(zeros, 1))
+    return np.where((raw <= 2.5 * m) & (zeros > 0), linear, raw)
+
+
+def _check_precision(precision):
+    if not 7 <= precision <= 18:
+        raise ValueError(f"HyperLogLog precision must be in 7..18, got {precision}")
+
+
+class HyperLogLog:
+    """Approximate distinct count in 2**precision one-byte registers."""
+
+    def __init__(self, precision=HLL_PRECISION):
+        _check_precision(precision)
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+
+    @property
+    def nbytes(self):
+        return self.registers.nbytes
+
+    @property
+    def relative_error(self):
+        return 1.04 / math.sqrt(len(self.registers))
+
+    def update(self, values, hashes=None):
+        index, rank = _register_ranks(hash64(values) if hashes is None else hashes, self.precision)
+        np.maximum.at(self.registers, index, rank)
+        return self
+
+    def merge(self, other):
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def count(self):
+        return float(_hll_estimate(self.registers))
+
+
+def distinct_per_bucket(buckets, values, precision=BUCKET_PRECISION):
+    """Approximate distinct values per bucket, as a Series indexed by bucket (sorted).
+
+    One HyperLogLog per bucket, filled in one pass: 2**precision bytes per
+    bucket however many distinct values it holds.
+    """
+    _check_precision(precision)
+    codes, uniques = pd.factorize(np.asarray(buckets), sort=True)
+    m = 1 << precision
+    index, rank = _register_ranks(hash64(values), precision)
+    registers = np.zeros(len(uniques) * m, dtype=np.uint8)
+    np.maximum.at(registers, codes.astype(np.int64) * m + index, rank)
+    return pd.Series(_hll_estimate(registers.reshape(len(uniques), m)), index=uniques)
+
+
+# -----------------------------
+# Per-key counts
+# -----------------------------
+class CountMinSketch:
+    """Per-key (weighted) counts in a depth x width table; estimates are upper bounds.
+
+    conservative=True only raises a key's counters as far as its new
+    estimate needs (conservative update): a batch is first reduced to one
+    total per key, then each key's counters become at least its previous
+    estimate plus that total. Estimates stay upper bounds and never exceed
+    the plain sketch's, but sketches can no longer be merged exactly.
+    """
+
+    def __init__(self, width=CMS_WIDTH, depth=CMS_DEPTH, conservative=False):
+        self.width, self.depth, self.conservative = width, depth, conservative
+        self.table = np.zeros((depth, width))
+        self.total = 0.0
+
+    @classmethod
+    def from_error(cls, epsilon, delta, conservative=False):
+        """Overestimate at most epsilon * N with probability 1 - delta."""
+        return cls(math.ceil(math.e / epsilon), math.ceil(math.log(1 / delta)), conservative)
+
+    @property
+    def nbytes(self):
+        return self.table.nbytes
+
+    def columns(self, hashes):
+        """(depth, n) table columns of every hash (Kirsch-Mitzenmacher double hashing)."""
+        h1 = hashes & np.uint64(0xFFFFFFFF)
+        h2 = (hashes >> np.uint64(32)) | np.uint64(1)
+        rows = np.arange(self.depth, dtype=np.uint64)[:, None]
+        return ((h1 + rows * h2) % np.uint64(self.width)).astype(np.int64)
+
+    def update(self, keys, weights=None, hashes=None):
+        """Add 1 (or a non-negative weight) per key."""
+        hashes = hash64(keys) if hashes is None else hashes
+        weights = np.ones(len(hashes)) if weights is None else np.asarray(weights, dtype=np.float64)
+        self.total += float(weights.sum())
+        if self.conservative:
+            hashes, inverse = np.unique(hashes, return_inverse=True)
+            weights = np.bincount(inverse, weights, minlength=len(hashes))
+        flat = (self.columns(hashes) + np.arange(self.depth)[:, None] * self.width).ravel()
+        table = self.table.reshape(-1)
+        if self.conservative:
+            target = self.table.reshape(-1)[flat].reshape(self.depth, -1).min(axis=0) + weights
+            np.maximum.at(table, flat, np.tile(target, self.depth))
+        else:
+            table += np.bincount(flat, np.tile(weights, self.depth), minlength=table.size)
+        return self
+
+    def estimate(self, keys, hashes=None):
+        cols = self.columns(hash64(keys) if hashes is None else hashes)
+        return self.table[np.arange(self.depth)[:, None], cols].min(axis=0)
+
+    def error_bound(self):
+        """Overestimate that holds for a key with probability 1 - exp(-depth)."""
+        return math.e / self.width * self.total
+
+    def second_moment(self):
+        """Upper bound on the sum of squared per-key counts (collisions only add)."""
+        return float((self.table ** 2).sum(axis=1).min())
+
+    def merge(self, other):
+        self.table += other.table
+        self.total += other.total
+        return self
+
+
+class SpaceSaving:
+    """The k heaviest keys with overestimated counts and their maximum error (see the module header)."""
+
+    def __init__(self, k=TOP_K, counts=None, errors=None):
+        self.k = k
+        self.counts = pd.Series(dtype=np.float64) if counts is None else counts.astype(np.float64)
+        self.errors = pd.Series(0.0, index=self.counts.index) if errors is None else errors.astype(np.float64)
+        self.total = float(self.counts.sum())
+
+    def __len__(self):
+        return len(self.counts)
+
+    @property
+    def floor(self):
+        """Upper bound on the count of any key that is not monitored."""
+        return float(self.counts.min()) if len(self.counts) >= self.k else 0.0
+
+    def update(self, keys, weights=None):
+        codes, uniques = pd.factorize(keys)
+        counts = np.bincount(codes, None if weights is None else np.asarray(weights, dtype=np.float64),
+                             minlength=len(uniques))
+        return self.merge_counts(pd.Series(counts.astype(np.float64), index=uniques))
+
+    def merge_counts(self, batch):
+        """Fold in exact per-key counts (a Series indexed by key)."""
+        floor = self.floor
+        known = batch.index.isin(self.counts.index)
+        # a new key ends up at floor + its batch count, so only the batch's top k can stay
+        new = batch[~known]
+        if len(new) > self.k:
+            new = new.iloc[np.argsort(-new.to_numpy(), kind='stable')[:self.k]]
+        counts = pd.concat([self.counts + batch[known].reindex(self.counts.index, fill_value=0), new + floor])
+        errors = pd.concat([self.errors, pd.Series(floor, index=new.index)])
+        keep = np.argsort(-counts.to_numpy(), kind='stable')[:self.k]
+        self.counts, self.errors = counts.iloc[keep], errors.iloc[keep]
+        self.total += float(batch.sum())
+        return self
+
+    def error_bound(self):
+        return self.total / self.k
+
+    def top(self, n=None):
+        """Monitored keys, heaviest first."""
+        return self.counts.iloc[:n].rename('count')
+
+
+# -----------------------------
+# Windowed heavy hitters
+# -----------------------------
+class WindowSketch:
+    """Top-k keys per time window, with per-window event / distinct-key / second-moment summaries.
+
+    Rows must arrive in time order (a later batch may continue the newest
+    window of the previous one). A window costs k candidate rows once it is
+    closed; the open one also holds a depth x width Count-Min table and a
+    HyperLogLog. Candidate counts are the smaller of the SpaceSaving and
+    Count-Min estimates, so both bounds in the module header apply.
+    """
+
+    def __init__(self, window='1Min', k=WINDOW_TOP_K, width=CMS_WIDTH, depth=CMS_DEPTH, precision=BUCKET_PRECISION):
+        _check_precision(precision)
+        self.window, self.k, self.precision = window, k, precision
+        self.cms = CountMinSketch(width, depth)  # shape and hashing only; tables live per window
+        self._closed, self._summary = [], []
+        self._open = None  # (window ns, SpaceSaving, (cms table, hll registers, events), None)
+
+    def update(self, timestamps, keys):
+        w = pd.Series(timestamps).dt.floor(self.window).to_numpy(dtype='datetime64[ns]').view(np.int64)
+        if not len(w):
+            return self
+        if self._open is not None and (w < self._open[0]).any():
+            raise ValueError("rows for a window that is already closed; feed rows in time order")
+        codes, windows = pd.factorize(w, sort=True)
+        if self._open is not None and self._open[0] != windows[0]:
+            self._close()
+        key_codes, key_values = pd.factorize(keys)
+        key_values = np.asarray(key_values)
+        key_hashes = hash64(key_values, unique=True)
+        hashes = key_hashes[key_codes]
+        # exact (window, key) counts of the batch, window-major
+        pair, count = np.unique(codes.astype(np.int64) * len(key_values) + key_codes, return_counts=True)
+        pairs = pd.DataFrame({'window': pair // len(key_values), 'key': key_values[pair % len(key_values)],
+                              'hash': key_hashes[pair % len(key_values)], 'count': count.astype(np.float64),
+                              'error': 0.0})
+
+        # a window continued from the previous batch: SpaceSaving merge
+        carried = None
+        if self._open is not None and self._open[0] == windows[0]:
+            _, top, carried, _ = self._open
+            first = pairs['window'].to_numpy() == 0
+            top.merge_counts(pairs.loc[first].set_index('key')['count'])
+            pairs = pd.concat([pd.DataFrame({
+                'window': 0, 'key': top.counts.index.to_numpy(), 'hash': hash64(top.counts.index, unique=True),
+                'count': top.counts.to_numpy(), 'error': top.errors.to_numpy()}), pairs[~first]], ignore_index=True)
+        # exact top-k of every other window
+        window = pairs['window'].to_numpy()
+        order = np.lexsort((-pairs['count'].to_numpy(), window))
+        starts = np.searchsorted(window[order], window[order])
+        pairs = pairs.iloc[order[np.arange(len(order)) - starts < self.k]]
+
+        order = np.argsort(codes, kind='stable')
+        bounds = np.searchsorted(codes[order], np.arange(len(windows) + 1))
+        cand = np.searchsorted(pairs['window'].to_numpy(), np.arange(len(windows) + 1))
+        closed = []
+        for lo in range(0, len(windows), WINDOW_GROUP):
+            hi = min(lo + WINDOW_GROUP, len(windows))
+            rows = order[bounds[lo]:bounds[hi]]
+            tables, registers = self._tables(codes[rows] - lo, hashes[rows], hi - lo)
+            events = np.bincount(codes[rows] - lo, minlength=hi - lo)
+            if lo == 0 and carried is not None:
+                table, regs, n = carried
+                tables[0] += table
+                np.maximum(registers[0], regs, out=registers[0])
+                events[0] += n
+            part = pairs.iloc[cand[lo]:cand[hi]]
+            if hi == len(windows):
+                # the newest window stays open for the next batch
+                last = part['window'].to_numpy() == hi - 1
+                top = part[last]
+                self._open = (int(windows[-1]), SpaceSaving(self.k, top.set_index('key')['count'],
+                                                            top.set_index('key')['error']),
+                              (tables[-1].copy(), registers[-1].copy(), int(events[-1])), None)
+                part, tables, registers, events = part[~last], tables[:-1], registers[:-1], events[:-1]
+                hi -= 1
+            if hi > lo:
+                closed.append(self._finish(part, windows[lo:hi], lo, tables, registers, events))
+        self._closed.extend(closed)
+        return self
+
+    def _tables(self, codes, hashes, n):
+        cms, m = self.cms, 1 << self.precision
+        cols = cms.columns(hashes) + (np.arange(cms.depth)[:, None] + codes[None, :] * cms.depth) * cms.width
+        tables = np.bincount(cols.ravel(), minlength=n * cms.depth * cms.width).reshape(n, cms.depth, cms.width)
+        index, rank = _register_ranks(hashes, self.precision)
+        registers = np.zeros(n * m, dtype=np.uint8)
+        np.maximum.at(registers, codes.astype(np.int64) * m + index, rank)
+        return tables.astype(np.float64), registers.reshape(n, m)
+
+    def _finish(self, part, windows, lo, tables, registers, events):
+        """Candidates of closed windows with their Count-Min cap, plus the window summaries."""
+        i = part['window'].to_numpy() - lo
+        cols = self.cms.columns(part['hash'].to_numpy(dtype=np.uint64))
+        estimate = tables[i[None, :], np.arange(self.cms.depth)[:, None], cols].min(axis=0)
+        self._summary.append((windows, events, _hll_estimate(registers), (tables ** 2).sum(axis=2).min(axis=1)))
+        return windows[i], part['key'].to_numpy(), np.minimum(part['count'].to_numpy(), estimate)
+
+    def _close(self):
+        window, top, (table, registers, events), _ = self._open
+        self._open = None
+        part = pd.DataFrame({'window': 0, 'key': top.counts.index, 'hash': hash64(top.counts.index, unique=True),
+                             'count': top.counts.to_numpy()})
+        self._closed.append(self._finish(part, np.array([window]), 0, table[None], registers[None],
+                                         np.array([events])))
+
+    def result(self, name='key'):
+        """(counts, summary) after the last update.
+
+        counts: estimated count per (window, key) of every window's top-k,
+        indexed like thresholds.per_minute_counts(). summary: per window,
+        events (exact), distinct keys (HyperLogLog) and the sum of squared
+        per-key counts (Count-Min upper bound).
+        """
+        if self._open is not None:
+            self._close()
+        if not self._closed:
+            empty = pd.MultiIndex.from_arrays([pd.DatetimeIndex([]), []], names=['timestamp', name])
+            return (pd.Series([], index=empty, dtype=np.int64, name='count'),
+                    pd.DataFrame(columns=['events', 'distinct', 'f2']))
+        windows, keys, counts = (np.concatenate(a) for a in zip(*self._closed))
+        index = pd.MultiIndex.from_arrays([pd.to_datetime(windows), keys], names=['timestamp', name])
+        counts = pd.Series(np.rint(counts).astype(np.int64), index=index, name='count')
+        windows, events, distinct, f2 = (np.concatenate(a) for a in zip(*self._summary))
+        summary = pd.DataFrame({'events': events, 'distinct': distinct, 'f2': f2}, index=pd.to_datetime(windows))
+        return counts, summary
+
+    @staticmethod
+    def moments(summary):
+        """Mean and (ddof=1) std over all (window, key) counts, from result()'s summary."""
+        n, d, f2 = summary['events'].sum(), summary['distinct'].sum(), summary['f2'].sum()
+        if d <= 1:
+            return float('nan'), float('nan')
+        mean = n / d
+        return mean, math.sqrt(max(f2 - d * mean * mean, 0.0) / (d - 1))
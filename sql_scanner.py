@@ -0,0 +1,105 @@
+# sql_scanner.py
+# Shared SQL-injection payload scanner for log columns.
+#
+#   from sql_scanner import sql_payload_flags
+#   flags = sql_payload_flags(logs['product_id'])     # bool array, one per row
+#
+#   scanner = PayloadScanner(SIGNATURES + [Signature('xp_cmdshell', r'\bxp_cmdshell\b')])
+#   scanner.families("1 UNION/**/SELECT pwd FROM users--")   # ['union_select', 'comment', ...]
+#
+# The signatures are compiled once into a single case-insensitive alternation.
+# Values are normalised before matching (URL-decoded twice and HTML-unescaped),
+# so %27, %2527, &#39; and friends count as the quote they encode. Columns are
+# scanned per distinct value (category or factorize code) and the flags are
+# broadcast back by code; each distinct value's verdict is memoised in a
+# bounded LRU shared across calls, so low-cardinality columns such as
+# product_id cost one lookup per value per run, not one regex per row.
+import functools
+import html
+import re
+from collections import namedtuple
+from urllib.parse import unquote
+
+import numpy as np
+import pandas as pd
+
+Signature = namedtuple('Signature', ['family', 'pattern'])
+
+SIGNATURES = [
+    # any single quote, raw or encoded (the decoding below covers %27 / &#39;)
+    Signature('quote', r"'|\\x27|\\u0027|\bchar\s*\(\s*39\s*\)"),
+    Signature('tautology', r"\bor\b\s*'?\s*(\w+)\s*'?\s*=\s*'?\s*\1\b"),
+    Signature('union_select', r"\bunion\b(?:\s|/\*.*?\*/|\+)+(?:all\s+|distinct\s+)?select\b"),
+    Signature('stacked_query', r";\s*(?:drop|delete|insert|update|alter|create|truncate|exec(?:ute)?|shutdown)\b"),
+    Signature('drop_table', r"\bdrop\s+table\b"),
+    Signature('select_from', r"\bselect\b.+?\bfrom\b"),
+    Signature('comment', r"--|/\*|\*/|#\s*$"),
+    Signature('time_based', r"\b(?:sleep|benchmark|pg_sleep)\s*\(|\bwaitfor\s+delay\b"),
+]
+CACHE_SIZE = 65_536
+
+
+def normalise(value):
+    """Lower-cased value with URL (up to double) and HTML encoding removed."""
+    text = str(value)
+    for _ in range(2):
+        decoded = unquote(text)
+        if decoded == text:
+            break
+        text = decoded
+    return html.unescape(text).lower()
+
+
+class PayloadScanner:
+    """Compiled signature set with a bounded per-value verdict cache."""
+
+    def __init__(self, signatures=SIGNATURES, cache_size=CACHE_SIZE):
+        self.signatures = list(signatures)
+        # one named group per family; backreferences are renumbered per group
+        parts, offset = [], 0
+        for i, sig in enumerate(self.signatures):
+            inner = re.compile(sig.pattern)
+            shifted = re.sub(r'\\(\d+)', lambda m: f'\\{int(m.group(1)) + offset + 1}', sig.pattern)
+            parts.append(f'(?P<s{i}>{shifted})')
+            offset += inner.groups + 1
+        self._any = re.compile('|'.join(parts), re.IGNORECASE | re.DOTALL)
+        self._families = [re.compile(s.pattern, re.IGNORECASE | re.DOTALL) for s in self.signatures]
+        self.match = functools.lru_cache(maxsize=cache_size)(self._match)
+
+    def _match(self, value):
+        return self._any.search(normalise(value)) is not None
+
+    def families(self, value):
+        """Every signature family `value` matches (uncached; for reports and tuning)."""
+        text = normalise(value)
+        return [s.family for s, rx in zip(self.signatures, self._families) if rx.search(text)]
+
+    def scan(self, values):
+        """Bool array: does each element of `values` carry a payload? Missing values never do."""
+        values = pd.Series(values)
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            codes = values.cat.codes.to_numpy()
+            uniques = values.cat.categories
+        else:
+            codes, uniques = pd.factorize(values)
+        flags = np.fromiter((self.match(v) for v in uniques), dtype=bool, count=len(uniques))
+        # code -1 (missing) picks the trailing False
+        return np.append(flags, False)[codes]
+
+    def cache_info(self):
+        return self.match.cache_info()
+
+
+SCANNER = PayloadScanner()
+
+
+def sql_payload_flags(values):
+    """SCANNER.scan(): per-row payload flags of a column."""
+    return SCANNER.scan(values)
+
+
+def is_sql_payload(value):
+    """Flag of a single value (row-wise callers); None / NaN are clean."""
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return False
+    return SCANNER.match(value)
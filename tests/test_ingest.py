@@ -0,0 +1,46 @@
+# tests/test_ingest.py
+# ingest.MinuteCounts fed batch by batch against thresholds.per_minute_counts()
+# of the whole log.
+#
+#   python -m pytest tests
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from ingest import MinuteCounts, batch_pairs  # noqa: E402
+from thresholds import per_minute_counts  # noqa: E402
+
+LOGS = os.path.join(ROOT, 'synthetic_logs_enhanced.csv')
+
+
+def minutes_of(logs):
+    return logs['timestamp'].dt.floor('1Min').to_numpy().astype('datetime64[ns]').view(np.int64)
+
+
+def test_minute_counts_match_per_minute_counts():
+    logs = pd.read_csv(LOGS, parse_dates=['timestamp']).sort_values('timestamp', kind='mergesort')
+    # squeeze the month into a few hours so batches share minutes and keys
+    logs['timestamp'] = logs['timestamp'].iloc[0] + (logs['timestamp'] - logs['timestamp'].iloc[0]) / 200
+    counts = MinuteCounts()
+    for start in range(0, len(logs), 400):
+        batch = logs.iloc[start:start + 400]
+        pairs, sizes, _ = batch_pairs(minutes_of(batch), batch['ip_address'].to_numpy(dtype=object))
+        totals = counts.add(pairs, sizes)
+        assert (counts.get(pairs) == totals).all()
+
+    expected = per_minute_counts(logs, 'ip_address')
+    expected.index = expected.index.set_levels(expected.index.levels[0].as_unit('ns').asi8, level=0)
+    got = counts.series()
+    assert len(counts) == len(expected)
+    pd.testing.assert_series_equal(got.sort_index(), expected.sort_index(), check_names=False, check_index_type=False)
+
+    before = int(np.median(expected.index.get_level_values(0)))
+    dropped = counts.prune(before)
+    assert len(dropped) + len(counts) == len(expected)
+    assert (dropped.index.get_level_values(0) < before).all()
+    assert not len(counts.prune(before))
+    pd.testing.assert_series_equal(counts.between(before, np.inf).sort_index(), counts.series().sort_index())
@@ -0,0 +1,53 @@
+# tests/test_rollup.py
+# A rollup cube built while the log CSV grows, then updated, against a fresh
+# build of the finished file.
+#
+#   python -m pytest tests
+import os
+import sys
+
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+import rollup  # noqa: E402
+
+LOGS = os.path.join(ROOT, 'synthetic_logs_enhanced.csv')
+
+
+def cells(cube_dir, grain):
+    c = rollup.load_rollup(cube_dir, grain)
+    c = c.astype({k: object for k in rollup.DIMENSIONS})
+    return c.sort_values(rollup.KEY).reset_index(drop=True)
+
+
+def test_rows_appended_during_build_are_folded_once(tmp_path, monkeypatch):
+    with open(LOGS, 'rb') as fh:
+        lines = fh.readlines()
+    source = str(tmp_path / 'logs.csv')
+    with open(source, 'wb') as fh:
+        fh.writelines(lines[:2001])
+        fh.write(lines[2001][:20])  # a line still being written
+
+    # the writer carries on while the build folds its first chunk
+    fold = rollup.compact_logs
+    appended = []
+
+    def compact_and_append(chunk):
+        if not appended:
+            with open(source, 'ab') as fh:
+                fh.write(lines[2001][20:])
+                fh.writelines(lines[2002:4000])
+            appended.append(True)
+        return fold(chunk)
+    monkeypatch.setattr(rollup, 'compact_logs', compact_and_append)
+    assert rollup.build(source, str(tmp_path / 'inc'), chunksize=1000) == 2000
+    monkeypatch.setattr(rollup, 'compact_logs', fold)
+
+    with open(source, 'ab') as fh:
+        fh.writelines(lines[4000:])
+    assert rollup.update(str(tmp_path / 'inc'), chunksize=1000) == len(lines) - 2001
+    rollup.build(LOGS, str(tmp_path / 'full'))
+    for grain in rollup.GRAINS:
+        pd.testing.assert_frame_equal(cells(str(tmp_path / 'inc'), grain), cells(str(tmp_path / 'full'), grain),
+                                      check_exact=False)
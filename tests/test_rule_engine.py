@@ -0,0 +1,83 @@
+# tests/test_rule_engine.py
+# rule_engine.evaluate() against the original row-wise classify() of
+# block_suspicious_ips.py, frozen here as it was before the rule engine.
+#
+#   python -m pytest tests
+#
+# Features are the per-IP aggregates the scoring script joins onto every row of
+# synthetic_logs_enhanced.csv; composite_score, which needs the Keras models,
+# is a seeded uniform draw. No IP there reaches the brute-force count, so a
+# second test pins every rule at its thresholds on hand-made rows.
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from rule_engine import evaluate  # noqa: E402
+
+LOGS = os.path.join(ROOT, 'synthetic_logs_enhanced.csv')
+
+
+def original_classify(row):
+    tr = row['total_requests']
+    rt = row['response_time']
+    fl = row['failed_logins']
+    sql_flag = 1 if any(["'" in str(row.get('product_id','')) or "drop table" in str(row.get('product_id','')).lower()]) else 0
+    if tr > 50 or 'ddos' in str(row.get('anomaly_type','')).lower():
+        return "DDoS Attack", "Rate-limit / Block IP"
+    if rt > 3.0:
+        return "High Response Time", "Investigate servers / slow endpoints"
+    if fl >= 5:
+        return "Brute Force Login", "Block IP & enforce 2FA"
+    if sql_flag > 0:
+        return "SQL Injection Attempt", "Sanitize inputs & block payloads"
+    if row['composite_score'] > 0.6 and fl > 0:
+        return "Account Takeover Attempt", "Force password reset"
+    if row['composite_score'] > 0.7:
+        return "Suspicious Behavior", "Monitor & escalate"
+    return None, None
+
+
+def scored_logs():
+    logs = pd.read_csv(LOGS, parse_dates=['timestamp'])
+    ip_agg = logs.groupby('ip_address').agg(
+        total_requests=('event_type', 'count'),
+        failed_logins=('login_status', lambda x: (x == 'failed').sum()),
+    ).reset_index()
+    logs = logs.merge(ip_agg, on='ip_address', how='left')
+    logs['composite_score'] = np.random.default_rng(0).random(len(logs))
+    return logs
+
+
+def assert_same_labels(frame):
+    expected = frame.apply(original_classify, axis=1, result_type='expand')
+    expected.columns = ['anomaly_name', 'recommendation']
+    got = evaluate(frame)
+    # unmatched rows are None in one and NaN in the other depending on pandas version
+    pd.testing.assert_frame_equal(got.astype(object).fillna(''), expected.astype(object).fillna(''))
+    return expected
+
+
+def test_evaluate_matches_original_classify():
+    expected = assert_same_labels(scored_logs())
+    assert set(expected['anomaly_name'].dropna()) >= {
+        "DDoS Attack", "High Response Time", "SQL Injection Attempt", "Account Takeover Attempt",
+        "Suspicious Behavior"}
+
+
+def test_evaluate_matches_original_classify_at_thresholds():
+    frame = pd.DataFrame({
+        'total_requests': [50, 51, 1, 1, 1, 1, 1, 1, 1, 1, 1],
+        'response_time': [0.5, 0.5, 3.0, 3.01, 0.5, 0.5, 0.5, 0.5, 0.5, 0.5, 0.5],
+        'failed_logins': [0, 0, 0, 0, 4, 5, 0, 1, 1, 0, 0],
+        'product_id': ['P001', 'P001', 'P001', 'P001', 'P001', 'P001', "x'; DROP TABLE logs;--", 'P001', 'P001',
+                       'P001', None],
+        'anomaly_type': ['normal', 'normal', 'normal', 'normal', 'normal', 'normal', 'normal', 'normal', 'normal',
+                         'DDoS', None],
+        'composite_score': [0.1, 0.1, 0.1, 0.1, 0.1, 0.1, 0.1, 0.6, 0.61, 0.7, 0.71],
+    })
+    expected = assert_same_labels(frame)
+    assert expected['anomaly_name'].nunique() == 6
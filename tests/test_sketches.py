@@ -0,0 +1,53 @@
+# tests/test_sketches.py
+# sketches.WindowSketch fed in chunks against the same rows in one batch, and
+# the public sketch API on plain NumPy string arrays.
+#
+#   python -m pytest tests
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from sketches import CountMinSketch, HyperLogLog, WindowSketch, hash64  # noqa: E402
+
+LOGS = os.path.join(ROOT, 'synthetic_logs_enhanced.csv')
+
+
+def sketch(timestamps, keys, chunk):
+    ws = WindowSketch('1Min', k=8)
+    for start in range(0, len(keys), chunk):
+        ws.update(timestamps[start:start + chunk], keys[start:start + chunk])
+    return ws.result('ip_address')
+
+
+def test_window_sketch_chunked_matches_single_batch():
+    logs = pd.read_csv(LOGS, parse_dates=['timestamp']).sort_values('timestamp', kind='mergesort')
+    ts, ips = logs['timestamp'].reset_index(drop=True), logs['ip_address'].to_numpy()
+    counts, summary = sketch(ts, ips, len(ips))
+    assert summary['events'].sum() == len(ips)
+    # some of the 1000-row chunks end on a minute boundary
+    for chunk in (1000, 337):
+        got_counts, got_summary = sketch(ts, ips, chunk)
+        pd.testing.assert_series_equal(got_counts.sort_index(), counts.sort_index())
+        pd.testing.assert_frame_equal(got_summary, summary)
+
+
+def test_window_sketch_keeps_every_window_of_separate_batches():
+    ws = WindowSketch('1Min', k=4)
+    for minute in range(3):
+        ws.update(pd.Series([pd.Timestamp('2025-01-01') + pd.Timedelta(minutes=minute)] * 2), np.array(['a', 'b']))
+    counts, summary = ws.result()
+    assert len(summary) == 3
+    assert counts.sum() == 6
+
+
+def test_sketches_accept_numpy_string_arrays():
+    keys = np.array(['1.2.3.4', '1.2.3.4', '5.6.7.8'])
+    assert (hash64(keys) == hash64(keys.astype(object))).all()
+    assert round(HyperLogLog().update(keys).count()) == 2
+    assert CountMinSketch(64, 2).update(keys).estimate(['1.2.3.4'])[0] >= 2
+    counts, _ = WindowSketch().update(pd.Series(pd.to_datetime(['2025-01-01'] * 3)), keys).result()
+    assert counts.to_dict() == {(pd.Timestamp('2025-01-01'), '1.2.3.4'): 2, (pd.Timestamp('2025-01-01'), '5.6.7.8'): 1}
@@ -0,0 +1,187 @@
+# thresholds.py
+# Attack categories and threshold rules of the anomaly dashboard, shared with
+# the real-time detector so both flag the same things.
+#
+# dashboard_thresholds() is the original rule: mean + SIGMAS * std of each
+# category's values over the whole log. AdaptiveThresholds keeps the same rule
+# up to date as logs arrive, from online_stats moments instead of the full
+# history:
+#
+#   adaptive = AdaptiveThresholds(halflife=6 * 3600)
+#   flags = adaptive_flags(threshold_values(logs), adaptive, step='1h')
+#
+# Values are judged against the thresholds learned from everything before them
+# (a step at a time in batch runs, a batch or a closed minute at a time in
+# streaming ones) and then learned, clipped at the threshold they were judged
+# against so an attack does not raise the bar for itself. With a halflife, the
+# moments are decayed over event time (an EWMA), so the thresholds follow
+# daily / weekly drift; halflife=None weighs all history equally. With
+# halflife=None and the whole log as one step the thresholds are exactly
+# dashboard_thresholds().
+#
+# Two refinements change the alerts and are off by default:
+#   warmup=N         product spikes get a per-product threshold once a
+#                    product has N weight (WARMUP is a sensible value)
+#   count_floor=True the std of the per-minute counts is floored at
+#                    sqrt(mean), the Poisson noise of a count; without it,
+#                    clipping can shrink the std of a mostly constant count
+#                    to 0 and put the threshold on the mean itself
+# quantile=q replaces mean + SIGMAS * std with the q-quantile of a
+# QuantileSketch of the same values (the upper edge of its bucket); values
+# are not clipped then, since a quantile already ignores the top 1 - q and
+# clipping at it would pin it where it started.
+import numpy as np
+import pandas as pd
+
+from online_stats import Moments, QuantileSketch
+
+SIGMAS = 2
+HALFLIFE = 6 * 3600.0
+WARMUP = 30
+
+HIGH_RESPONSE = 'High Response Time'
+DDOS = 'DDoS'
+FAILED_LOGIN = 'Failed Login'
+PRODUCT_SPIKE = 'Product Spike'
+
+
+def mean_plus_sigmas(values, sigmas=SIGMAS):
+    return values.mean() + sigmas * values.std()
+
+
+def per_minute_counts(logs, key):
+    return logs.groupby([pd.Grouper(key='timestamp', freq='1Min'), key], observed=True).size()
+
+
+def dashboard_thresholds(logs):
+    """Threshold of every dashboard attack type, learned from a log frame."""
+    failed = logs[logs['login_status'] == 'failed']
+    return {
+        HIGH_RESPONSE: mean_plus_sigmas(logs['response_time']),
+        DDOS: mean_plus_sigmas(per_minute_counts(logs, 'ip_address')),
+        FAILED_LOGIN: mean_plus_sigmas(per_minute_counts(failed, 'ip_address')),
+        PRODUCT_SPIKE: mean_plus_sigmas(per_minute_counts(logs, 'product_id')),
+    }
+
+
+# -----------------------------
+# Adaptive thresholds
+# -----------------------------
+CATEGORIES = [HIGH_RESPONSE, DDOS, FAILED_LOGIN, PRODUCT_SPIKE]
+
+
+def epoch_seconds(timestamps):
+    return pd.Series(timestamps).to_numpy(dtype='datetime64[ns]').astype(np.int64) / 1e9
+
+
+def halflife_seconds(text):
+    """'6h', '2d', ... -> seconds; 'none' -> None (all history weighs the same)."""
+    return None if str(text).lower() == 'none' else pd.Timedelta(text).total_seconds()
+
+
+def threshold_values(logs):
+    """The values each category's threshold is applied to, as {category: Series}.
+
+    Every Series is indexed (time, key) and in time order: counts as in
+    per_minute_counts(), response times by (timestamp, row label).
+    """
+    failed = logs[logs['login_status'] == 'failed']
+    order = logs['timestamp'].sort_values(kind='mergesort')
+    return {
+        HIGH_RESPONSE: pd.Series(logs['response_time'].loc[order.index].to_numpy(),
+                                 index=pd.MultiIndex.from_arrays([order.to_numpy(), order.index])),
+        DDOS: per_minute_counts(logs, 'ip_address'),
+        FAILED_LOGIN: per_minute_counts(failed, 'ip_address'),
+        PRODUCT_SPIKE: per_minute_counts(logs, 'product_id'),
+    }
+
+
+class AdaptiveThresholds:
+    """dashboard_thresholds() maintained online; see the module header."""
+
+    def __init__(self, halflife=HALFLIFE, sigmas=SIGMAS, quantile=None, warmup=None, count_floor=False):
+        self.halflife, self.sigmas, self.quantile, self.warmup = halflife, sigmas, quantile, warmup
+        self.count_floor = count_floor
+        stats = (lambda: QuantileSketch(halflife=halflife)) if quantile else (lambda: Moments(halflife))
+        self.stats = {category: stats() for category in CATEGORIES}
+        self.products = stats()
+
+    def _threshold(self, stats, keys=None, counts=True):
+        if self.quantile:
+            return stats.quantile(self.quantile, keys, upper=True)
+        mean, std = stats.mean(keys), stats.std(keys)
+        if counts and self.count_floor:
+            std = np.fmax(std, np.sqrt(np.maximum(mean, 0)))
+        return mean + self.sigmas * std
+
+    def _weight(self, stats, keys=None):
+        return stats.count(keys) if self.quantile else stats.weight(keys)
+
+    def threshold(self, category, keys=None):
+        """Current threshold of a category (NaN before it has two values).
+
+        With `keys` one threshold per key; with a `warmup`, product spikes
+        use the product's own once it has `warmup` weight, the category's before.
+        """
+        overall = self._threshold(self.stats[category], counts=category != HIGH_RESPONSE)
+        if keys is None or category != PRODUCT_SPIKE or self.warmup is None:
+            return overall if keys is None else np.full(len(keys), overall)
+        own = self._threshold(self.products, keys)
+        return np.where(self._weight(self.products, keys) >= self.warmup, own, overall)
+
+    def current(self):
+        """{category: threshold}, like dashboard_thresholds()."""
+        return {category: self.threshold(category) for category in CATEGORIES}
+
+    def learn(self, category, values, times, keys=None, clip=None):
+        """Add values (clipped at `clip`, scalar or per value, where given)."""
+        values = np.asarray(values, dtype=np.float64)
+        if clip is not None:
+            clip = np.asarray(clip, dtype=np.float64)
+            values = np.where(np.isnan(clip), values, np.fmin(values, clip))
+        self.stats[category].update(None, values, times)
+        if category == PRODUCT_SPIKE and keys is not None and self.warmup is not None:
+            self.products.update(keys, values, times)
+        return self
+
+    def judge(self, category, values, times, keys=None):
+        """Thresholds for values not learned yet, then learn them; returns the thresholds.
+
+        A category with fewer than two values so far learns first, so the
+        first step is judged against its own statistics, as in the batch rule.
+        """
+        ones = np.ones(len(values))
+        if not self._weight(self.stats[category]) > 1:
+            self.learn(category, values, times, keys)
+            return self.threshold(category, keys) * ones
+        limits = self.threshold(category, keys) * ones
+        self.learn(category, values, times, keys, clip=None if self.quantile else limits)
+        return limits
+
+    def fit(self, values):
+        """Learn threshold_values() output, judged as it goes but not reported (seeding from a baseline)."""
+        for category, series in values.items():
+            self.judge(category, *_arrays(category, series))
+        return self
+
+
+def _arrays(category, series):
+    """values, epoch-second times and (product spikes only) keys of a threshold_values() Series."""
+    keys = series.index.get_level_values(1).to_numpy(dtype=object) if category == PRODUCT_SPIKE else None
+    return series.to_numpy(), epoch_seconds(series.index.get_level_values(0)), keys
+
+
+def adaptive_flags(values, adaptive, step='1h'):
+    """Per-category (flags, thresholds) arrays for threshold_values() output, judged a `step` at a time."""
+    out = {}
+    width = pd.Timedelta(step).total_seconds()
+    for category, series in values.items():
+        vals, ts, keys = _arrays(category, series)
+        limits = np.full(len(vals), np.nan)
+        if len(vals):
+            cuts = np.flatnonzero(np.diff(np.floor(ts / width))) + 1
+            for lo, hi in zip(np.r_[0, cuts], np.r_[cuts, len(vals)]):
+                part = None if keys is None else keys[lo:hi]
+                limits[lo:hi] = adaptive.judge(category, vals[lo:hi], ts[lo:hi], part)
+        out[category] = (vals > limits, limits)
+    return out
@@ -0,0 +1,185 @@
+# trending.py
+# Per-product spike detection used by trending_recommendation.py
+#
+# The detector works on sparse (bucket, product) event counts: only cells with
+# at least one event are stored, so memory follows the number of active
+# (bucket, product) pairs rather than buckets x catalog size. As in the dense
+# matrix, the time axis is every bucket with at least one event. Per-product
+# moments come from bincounts over those cells, with the empty buckets
+# contributing zeros implicitly. An empty bucket can never be a spike (its
+# z-score is -mean/std <= 0), so spikes are counted on the stored cells only.
+#
+# adaptive_spike_counts() is the prequential variant: each bucket is judged
+# against per-product moments of the buckets before it (optionally decayed by
+# a halflife), so a product's spikes are not measured against a mean and std
+# that the same spikes, or traffic from days ago, pushed up.
+#
+# sharded_spike_counts() splits the sparse path by product over a process pool
+# (trending_recommendation.py --workers).
+#
+# product_minute_counts() / spike_counts() keep the original dense
+# implementation as the reference the sparse path is checked against.
+import heapq
+
+import numpy as np
+import pandas as pd
+
+from online_stats import Moments
+from parallel import resolve_workers, run_shards, shard_ids
+from thresholds import epoch_seconds
+
+Z_THRESHOLD = 3
+WINDOWS = ['1Min', '5Min', '1h']
+
+
+# -----------------------------
+# Sparse path
+# -----------------------------
+def bucket_counts(logs, window='1Min'):
+    """Event counts per (bucket, product_id), nonzero cells only."""
+    counts = logs.groupby([pd.Grouper(key='timestamp', freq=window), 'product_id'], observed=True).size()
+    return counts[counts > 0]
+
+
+class BucketCounter:
+    """bucket_counts() over log chunks; a bucket may span several chunks."""
+
+    def __init__(self, window='1Min'):
+        self.window = window
+        self._counts = None
+
+    def update(self, chunk):
+        counts = bucket_counts(chunk, self.window)
+        self._counts = counts if self._counts is None else self._counts.add(counts, fill_value=0)
+        return self
+
+    def result(self):
+        if self._counts is None:
+            return pd.Series(dtype='int64')
+        return self._counts.astype('int64')
+
+
+def n_buckets(counts):
+    """Buckets with at least one event of any product: the rows of the dense matrix."""
+    return counts.index.get_level_values(0).nunique()
+
+
+def sparse_spike_counts(counts, total_buckets):
+    """Per-product number of buckets more than Z_THRESHOLD sigmas above the product's mean.
+
+    `counts` is a bucket_counts() Series; `total_buckets` is the length of
+    the time axis (n_buckets()), including buckets where the product had no
+    events.
+    Returns an int64 Series indexed by product_id in sorted order, like the
+    columns of the dense matrix.
+    """
+    products = counts.index.get_level_values(-1)
+    codes, uniques = pd.factorize(products, sort=True)
+    c = counts.to_numpy(dtype=np.int64)
+    n = total_buckets
+    s1 = np.bincount(codes, weights=c, minlength=len(uniques))
+    s2 = np.bincount(codes, weights=c * c, minlength=len(uniques))
+    spikes = np.zeros(len(uniques), dtype=np.int64)
+    if n > 1:
+        mean = s1 / n
+        # sample std (ddof=1) from the moments; n*s2 - s1^2 is exact for integer counts
+        var = np.maximum(n * s2 - s1 * s1, 0) / (n * (n - 1))
+        std = np.sqrt(var)
+        std[std == 0] = 1
+        z = (c - mean[codes]) / std[codes]
+        spikes = np.bincount(codes, weights=z > Z_THRESHOLD, minlength=len(uniques)).astype(np.int64)
+    index = pd.Index(np.asarray(uniques), name=None)
+    return pd.Series(spikes, index=index, dtype='int64')
+
+
+def _spike_shard(counts, _resource, total_buckets):
+    return sparse_spike_counts(counts, total_buckets)
+
+
+def sharded_spike_counts(counts, total_buckets, workers):
+    """sparse_spike_counts() with products hash-sharded over a process pool.
+
+    Every product's cells land in one shard and the time axis length is
+    passed to each, so per-product statistics are unchanged; results are
+    sorted by product like a serial run.
+    """
+    workers = resolve_workers(workers)
+    if workers == 1:
+        return sparse_spike_counts(counts, total_buckets)
+    shard = shard_ids(counts.index.get_level_values(-1), workers)
+    parts = [counts[shard == i] for i in range(workers)]
+    parts = [p for p in parts if len(p)] or [counts]
+    return pd.concat(run_shards(_spike_shard, parts, args=(total_buckets,))).sort_index()
+
+
+def adaptive_spike_counts(counts, halflife=None, step='1h'):
+    """sparse_spike_counts() with every bucket judged against the buckets before it.
+
+    Per-product moments are online_stats.Moments over the stored cells,
+    padded with zeros up to the (decayed) number of buckets seen, so empty
+    buckets count as 0 exactly as in the dense matrix. Buckets are judged a
+    `step` at a time and then learned; the first step only seeds the moments.
+    With a halflife (seconds of bucket time) old buckets fade out, so a
+    product's spikes are measured against its recent level rather than its
+    whole history.
+    """
+    counts = counts.sort_index(level=0, sort_remaining=False, kind='mergesort')
+    times = epoch_seconds(counts.index.get_level_values(0))
+    codes, uniques = pd.factorize(counts.index.get_level_values(-1), sort=True)
+    products = np.asarray(uniques, dtype=object)[codes]
+    c = counts.to_numpy(dtype=np.float64)
+    moments = Moments(halflife)
+    decay = (lambda dt: np.ones_like(dt)) if halflife is None else (lambda dt: np.exp2(-dt / halflife))
+    axis, axis_time = 0.0, None  # decayed number of buckets, as of axis_time
+    spikes = np.zeros(len(uniques), dtype=np.int64)
+
+    width = pd.Timedelta(step).total_seconds()
+    cuts = np.flatnonzero(np.diff(np.floor(times / width))) + 1
+    for lo, hi in zip(np.r_[0, cuts], np.r_[cuts, len(c)]):
+        now = times[lo]
+        if axis_time is not None:
+            mean, std = moments.padded(products[lo:hi], axis * decay(now - axis_time), now)
+            std[std == 0] = 1
+            z = (c[lo:hi] - mean) / std
+            spikes += np.bincount(codes[lo:hi], weights=z > Z_THRESHOLD, minlength=len(uniques)).astype(np.int64)
+        moments.update(products[lo:hi], c[lo:hi], times[lo:hi])
+        buckets = np.unique(times[lo:hi])
+        end = buckets[-1]
+        axis = (axis * decay(end - axis_time) if axis_time is not None else 0.0) + decay(end - buckets).sum()
+        axis_time = end
+    return pd.Series(spikes, index=pd.Index(np.asarray(uniques), name=None), dtype='int64')
+
+
+def product_spikes(logs, window='1Min'):
+    """sparse_spike_counts() straight from a log frame."""
+    counts = bucket_counts(logs, window)
+    return sparse_spike_counts(counts, n_buckets(counts))
+
+
+def top_k(spikes, k):
+    """The k products with the most spikes (> 0), largest first; ties keep index order."""
+    values = spikes.to_numpy()
+    best = heapq.nlargest(k, (i for i in np.flatnonzero(values > 0)), key=values.__getitem__)
+    return spikes.iloc[best]
+
+
+# -----------------------------
+# Dense reference
+# -----------------------------
+def product_minute_counts(logs):
+    """Dense minute x product matrix of event counts."""
+    return logs.groupby([pd.Grouper(key='timestamp', freq='1Min'), 'product_id']).size().unstack(fill_value=0)
+
+
+def spike_counts(product_counts, _resource=None):
+    """Number of minutes each product's count sits more than Z_THRESHOLD sigmas above its mean."""
+    # Use z-score threshold per product to find spikes (more robust)
+    spikes = {}
+    for product in product_counts.columns:
+        series = product_counts[product]
+        mean = series.mean()
+        std = series.std() if series.std() > 0 else 1
+        z = (series - mean) / std
+        spikes[product] = (z > Z_THRESHOLD).sum()  # count times z>3
+    return pd.Series(spikes, dtype='int64')
+
@@ -1,33 +1,64 @@
 # trending_products.py
+import argparse
 import pandas as pd
 import plotly.express as px
 
-logs = pd.read_csv('data/simulated_logs.csv', parse_dates=['timestamp'])
-product_counts = logs.groupby([pd.Grouper(key='timestamp', freq='1Min'), 'product_id']).size().unstack(fill_value=0)
+from log_store import default_source, load_logs
+from log_stream import CHUNK_ROWS, iter_log_chunks
+from thresholds import HALFLIFE, halflife_seconds
+from trending import (WINDOWS, BucketCounter, adaptive_spike_counts, bucket_counts, n_buckets, sharded_spike_counts,
+                      top_k)
 
-# Use z-score threshold per product to find spikes (more robust)
-spikes = {}
-for product in product_counts.columns:
-    series = product_counts[product]
-    mean = series.mean()
-    std = series.std() if series.std() > 0 else 1
-    z = (series - mean) / std
-    spikes[product] = (z > 3).sum()  # count times z>3
+SOURCE = default_source('data/simulated_logs.csv')
+TOP_K = 20
 
-trending_products = pd.Series(spikes).sort_values(ascending=False)
-trending_products = trending_products[trending_products > 0]
 
-print("Trending / booming products detected:")
-print(trending_products.head(20))
+def main():
+    parser = argparse.ArgumentParser(description="Detect trending products from per-window spikes.")
+    parser.add_argument("--window", default='1Min', choices=WINDOWS,
+                        help="bucket size the per-product z-scores are computed over")
+    parser.add_argument("--stream", action="store_true",
+                        help="read the log in chunks and keep only the per-bucket product counts")
+    parser.add_argument("--chunksize", type=int, default=CHUNK_ROWS, help="rows per chunk in --stream mode")
+    parser.add_argument("--adaptive", action="store_true",
+                        help="judge each bucket against the (decayed) buckets before it instead of the whole log")
+    parser.add_argument("--halflife", default=f'{HALFLIFE / 3600:g}h',
+                        help="--adaptive: log time over which a bucket's weight halves ('none' = no decay)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="processes for the per-product z-scores (0 = one per CPU); output matches a serial run")
+    args = parser.parse_args()
+    if args.adaptive and args.workers != 1:
+        parser.error("--workers shards the static z-scores; drop it with --adaptive")
 
-top_trending = trending_products.head(5).index.tolist()
-pd.DataFrame({'recommended_products': top_trending}).to_csv('data/recommendations.csv', index=False)
-print("✅ Top 5 recommended products saved to data/recommendations.csv")
+    if args.stream:
+        counter = BucketCounter(args.window)
+        for chunk in iter_log_chunks(SOURCE, args.chunksize, usecols=['timestamp', 'product_id']):
+            counter.update(chunk)
+        counts = counter.result()
+    else:
+        counts = bucket_counts(load_logs(SOURCE, columns=['product_id']), args.window)
+    if args.adaptive:
+        spikes = adaptive_spike_counts(counts, halflife_seconds(args.halflife))
+    else:
+        spikes = sharded_spike_counts(counts, n_buckets(counts), args.workers)
 
-trending_df = trending_products.reset_index()
-trending_df.columns = ['product_id', 'spike_count']
+    trending_products = top_k(spikes, TOP_K)
 
-fig = px.bar(trending_df.head(10), x='product_id', y='spike_count', color='spike_count', text='spike_count', title='Top Trending / Booming Products')
-fig.update_traces(textposition='outside')
-fig.update_layout(yaxis=dict(dtick=1), xaxis=dict(title='Product ID'), yaxis_title="Spike Count", title_x=0.5)
-fig.show()
+    print("Trending / booming products detected:")
+    print(trending_products.head(20))
+
+    top_trending = trending_products.head(5).index.tolist()
+    pd.DataFrame({'recommended_products': top_trending}).to_csv('data/recommendations.csv', index=False)
+    print("✅ Top 5 recommended products saved to data/recommendations.csv")
+
+    trending_df = trending_products.reset_index()
+    trending_df.columns = ['product_id', 'spike_count']
+
+    fig = px.bar(trending_df.head(10), x='product_id', y='spike_count', color='spike_count', text='spike_count', title='Top Trending / Booming Products')
+    fig.update_traces(textposition='outside')
+    fig.update_layout(yaxis=dict(dtick=1), xaxis=dict(title='Product ID'), yaxis_title="Spike Count", title_x=0.5)
+    fig.show()
+
+
+if __name__ == "__main__":
+    main()